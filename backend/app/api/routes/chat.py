@@ -1,40 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List
-import json
+from sqlalchemy.orm import Session, selectinload, undefer
+from typing import Dict, Iterator, List, Optional
+from contextlib import aclosing
 import asyncio
-from app.db.database import get_db
+import json
+from app.db.database import SessionLocal, get_db
 from app.db import models
+from app.db.pagination import approximate_count, keyset_page, set_page_headers
 from app.api.schemas import (
     ChatRequest, ChatResponse,
-    ConversationCreate, ConversationResponse,
+    ConversationCreate, ConversationResponse, ConversationSummaryResponse,
     MessageResponse,
     LLMProvidersResponse,
     AgentConfig
 )
 from app.services.agent_service import agent_service
-from app.services.llm_factory import llm_factory
+from app.services.streaming import event_log_store, sse_writer
+from app.services.llm_factory import get_model_catalog, llm_factory
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import span, start_trace
 from loguru import logger
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+_STREAM_DISCONNECTS = metrics.counter("chat_stream_disconnects", "客户端在回答完成前断开且未重连的流式对话数")
+_STREAM_RESUMES = metrics.counter("chat_stream_resumes", "流式对话续传请求数")
+
+
+def _save_assistant_message(
+    db: Session,
+    conversation_id: int,
+    content: str,
+    intermediate_steps: List[Dict],
+    thinking: str,
+    partial: bool = False
+):
+    """保存助手回复，包含推理过程和工具调用"""
+    meta_info = {
+        "intermediate_steps": intermediate_steps,
+        "thinking": thinking  # 保存推理过程
+    }
+    if partial:
+        meta_info["partial"] = True  # 客户端中途断开，回复不完整
+    
+    assistant_message = models.Message(
+        conversation_id=conversation_id,
+        role="assistant",
+        content=content,
+        meta_info=meta_info
+    )
+    db.add(assistant_message)
+    db.commit()
+
 
 
 
-@router.get("/conversations", response_model=List[ConversationResponse])
-def get_conversations(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    """获取对话列表"""
-    conversations = db.query(models.Conversation).order_by(
-        models.Conversation.updated_at.desc()
-    ).offset(skip).limit(limit).all()
+@router.get("/conversations", response_model=List[ConversationSummaryResponse])
+def get_conversations(
+    response: Response,
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
+    db: Session = Depends(get_db)
+):
+    """获取对话列表（按更新时间倒序，下一页游标在 X-Next-Cursor 响应头中返回）"""
+    query = db.query(models.Conversation)
+    conversations, next_cursor = keyset_page(
+        query, models.Conversation.updated_at, models.Conversation.id, limit, cursor=cursor, skip=skip
+    )
+    set_page_headers(response, next_cursor, approximate_count(db, query, "conversations") if include_count else None)
     return conversations
 
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 def get_conversation(conversation_id: int, db: Session = Depends(get_db)):
-    """获取对话详情"""
-    conversation = db.query(models.Conversation).filter(
+    """获取对话详情（包含全部消息；长对话请使用分页的消息接口或导出接口）"""
+    conversation = db.query(models.Conversation).options(
+        selectinload(models.Conversation.messages).options(undefer(models.Message.meta_info))
+    ).filter(
         models.Conversation.id == conversation_id
     ).first()
     if not conversation:
@@ -42,6 +88,75 @@ def get_conversation(conversation_id: int, db: Session = Depends(get_db)):
     return conversation
 
 
+def _message_query(db: Session, conversation_id: int, include_meta: bool):
+    """对话消息查询（meta_info 为延迟加载列，只在需要时一并读取）"""
+    if not db.query(models.Conversation.id).filter(models.Conversation.id == conversation_id).first():
+        raise HTTPException(status_code=404, detail="对话不存在")
+    query = db.query(models.Message).filter(models.Message.conversation_id == conversation_id)
+    if include_meta:
+        query = query.options(undefer(models.Message.meta_info))
+    return query
+
+
+def _message_dict(message: models.Message, include_meta: bool) -> Dict:
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "role": message.role,
+        "content": message.content,
+        "meta_info": message.meta_info if include_meta else None,
+        "created_at": message.created_at.isoformat() if message.created_at else None
+    }
+
+
+@router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
+def get_messages(
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_meta: bool = False,
+    db: Session = Depends(get_db)
+):
+    """分页获取对话消息（最新的在前，更早消息的游标在 X-Next-Cursor 响应头中返回）
+
+    include_meta=false（默认）时不读取 meta_info（推理过程、工具调用等）。
+    """
+    query = _message_query(db, conversation_id, include_meta)
+    messages, next_cursor = keyset_page(query, models.Message.created_at, models.Message.id, limit, cursor=cursor)
+    set_page_headers(response, next_cursor)
+    return [_message_dict(message, include_meta) for message in messages]
+
+
+@router.get("/conversations/{conversation_id}/messages/export")
+def export_messages(conversation_id: int, include_meta: bool = True, db: Session = Depends(get_db)):
+    """按时间顺序导出对话的全部消息（NDJSON，每行一条消息）
+
+    通过服务端游标分批读取（yield_per），内存占用不随对话长度增长。
+    """
+    _message_query(db, conversation_id, include_meta)  # 对话不存在时返回 404
+
+    def generate() -> Iterator[str]:
+        # 响应流式发送期间请求的数据库会话可能已关闭，使用独立的会话
+        export_db = SessionLocal()
+        try:
+            query = export_db.query(models.Message).filter(
+                models.Message.conversation_id == conversation_id
+            ).order_by(models.Message.created_at, models.Message.id)
+            if include_meta:
+                query = query.options(undefer(models.Message.meta_info))
+            for message in query.yield_per(settings.MESSAGE_EXPORT_BATCH_SIZE):
+                yield json.dumps(_message_dict(message, include_meta), ensure_ascii=False) + "\n"
+        finally:
+            export_db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.ndjson"'}
+    )
+
+
 @router.delete("/conversations/{conversation_id}")
 def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     """删除对话"""
@@ -57,25 +172,36 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/stream")
-async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
-    """流式处理聊天请求"""
+async def chat_stream(request: ChatRequest, http_request: Request, db: Session = Depends(get_db)):
+    """流式处理聊天请求
+
+    Agent 在后台运行，事件写入本轮的事件日志，响应只是日志的订阅者。
+    第一个事件（stream_id，同时在 X-Stream-Id 响应头中返回）用于断线后续传；
+    断开后宽限期内没有重连时取消Agent并保存已生成的部分回复。
+    """
     async def generate():
+        """产生事件字典，写入事件日志后由 sse_writer 合并文本块并编码为 SSE 帧"""
+        # 需要返回耗时明细时，记录本次请求各阶段的耗时
+        trace = start_trace() if settings.TIMING_SSE_EVENT else None
         try:
             # 获取或创建对话
+            with span("chat.load_conversation"):
+                if request.conversation_id:
+                    conversation = db.query(models.Conversation).filter(
+                        models.Conversation.id == request.conversation_id
+                    ).first()
+                else:
+                    # 创建新对话
+                    conversation = models.Conversation(title=request.message[:50])
+                    db.add(conversation)
+                    db.commit()
+                    db.refresh(conversation)
             if request.conversation_id:
-                conversation = db.query(models.Conversation).filter(
-                    models.Conversation.id == request.conversation_id
-                ).first()
                 if not conversation:
-                    yield f"data: {json.dumps({'type': 'error', 'message': '对话不存在'}, ensure_ascii=False)}\n\n"
+                    yield {'type': 'error', 'message': '对话不存在'}
                     return
             else:
-                # 创建新对话
-                conversation = models.Conversation(title=request.message[:50])
-                db.add(conversation)
-                db.commit()
-                db.refresh(conversation)
-                yield f"data: {json.dumps({'type': 'conversation_id', 'conversation_id': conversation.id}, ensure_ascii=False)}\n\n"
+                yield {'type': 'conversation_id', 'conversation_id': conversation.id}
             
             # 获取历史消息
             #history = []
@@ -90,13 +216,14 @@ async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
             #     })
             
             # 保存用户消息
-            user_message = models.Message(
-                conversation_id=conversation.id,
-                role="user",
-                content=request.message
-            )
-            db.add(user_message)
-            db.commit()
+            with span("chat.save_user_message"):
+                user_message = models.Message(
+                    conversation_id=conversation.id,
+                    role="user",
+                    content=request.message
+                )
+                db.add(user_message)
+                db.commit()
             
             # 构建AgentConfig配置
             agent_config = AgentConfig(
@@ -114,61 +241,118 @@ async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
             final_response = ""
             intermediate_steps = []
             thinking_content = ""  # 收集推理过程
+            finished = False  # 是否已保存完整回复或已返回错误
             
-            async for chunk in agent_service.chat_stream(
-                message=request.message,
-                config=agent_config
-            ):
-                if chunk.get("type") == "thinking":
-                    # 推理过程
-                    thinking_chunk = chunk.get('content', '')
-                    thinking_content += thinking_chunk  # 累积推理过程
-                    yield f"data: {json.dumps({'type': 'thinking', 'content': thinking_chunk}, ensure_ascii=False)}\n\n"
-                elif chunk.get("type") == "tool":
-                    # 工具调用
-                    tool_info = chunk.get("tool_info", {})
-                    intermediate_steps.append(tool_info)
-                    yield f"data: {json.dumps({'type': 'tool', 'tool_info': tool_info}, ensure_ascii=False)}\n\n"
-                elif chunk.get("type") == "content":
-                    # 最终答案内容
-                    content = chunk.get("content", "")
-                    final_response += content
-                    yield f"data: {json.dumps({'type': 'content', 'content': content}, ensure_ascii=False)}\n\n"
-                elif chunk.get("type") == "done":
-                    # 完成
-                    # 保存助手回复，包含推理过程和工具调用
-                    assistant_message = models.Message(
-                        conversation_id=conversation.id,
-                        role="assistant",
-                        content=final_response,
-                        meta_info={
-                            "intermediate_steps": intermediate_steps,
-                            "thinking": thinking_content  # 保存推理过程
-                        }
-                    )
-                    db.add(assistant_message)
-                    db.commit()
-                    
-                    yield f"data: {json.dumps({'type': 'done', 'conversation_id': conversation.id}, ensure_ascii=False)}\n\n"
-                elif chunk.get("type") == "error":
-                    yield f"data: {json.dumps({'type': 'error', 'message': chunk.get('message', '')}, ensure_ascii=False)}\n\n"
-                    return
+            try:
+                async with aclosing(agent_service.chat_stream(
+                    message=request.message,
+                    config=agent_config
+                )) as agent_stream:
+                    async for chunk in agent_stream:
+                        if chunk.get("type") == "thinking":
+                            # 推理过程
+                            thinking_chunk = chunk.get('content', '')
+                            thinking_content += thinking_chunk  # 累积推理过程
+                            yield {'type': 'thinking', 'content': thinking_chunk}
+                        elif chunk.get("type") == "tool":
+                            # 工具调用
+                            tool_info = chunk.get("tool_info", {})
+                            intermediate_steps.append(tool_info)
+                            yield {'type': 'tool', 'tool_info': tool_info}
+                        elif chunk.get("type") == "content":
+                            # 最终答案内容
+                            content = chunk.get("content", "")
+                            final_response += content
+                            yield {'type': 'content', 'content': content}
+                        elif chunk.get("type") == "done":
+                            # 完成
+                            with span("chat.save_assistant_message"):
+                                _save_assistant_message(
+                                    db, conversation.id, final_response, intermediate_steps, thinking_content
+                                )
+                            finished = True
+                            
+                            # 各阶段耗时明细（在 done 之前发送，确保客户端能收到）
+                            if trace:
+                                yield {'type': 'timing', 'timing': trace.as_dict()}
+                            
+                            yield {'type': 'done', 'conversation_id': conversation.id}
+                        elif chunk.get("type") == "error":
+                            finished = True
+                            yield {'type': 'error', 'message': chunk.get('message', '')}
+                            return
+            except (asyncio.CancelledError, GeneratorExit):
+                # 客户端断开且未在宽限期内重连：关闭 agent_stream 时Agent任务已被取消，这里保存已生成的部分回复
+                if not finished:
+                    _STREAM_DISCONNECTS.inc()
+                    logger.info(f"Client disconnected from conversation {conversation.id} before the answer finished")
+                    if final_response or thinking_content or intermediate_steps:
+                        try:
+                            _save_assistant_message(
+                                db, conversation.id, final_response, intermediate_steps, thinking_content,
+                                partial=True
+                            )
+                        except Exception as e:
+                            logger.error(f"Failed to save partial assistant message: {e}")
+                raise
                     
         except Exception as e:
             logger.error(f"Error in stream chat: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)}, ensure_ascii=False)}\n\n"
+            yield {'type': 'error', 'message': str(e)}
+    
+    # 预计无法按时获得 LLM 调用名额时直接返回 429，而不是开始一个注定超时的流
+    llm_factory.check_admission(
+        request.llm_config.provider if request.llm_config else None,
+        request.llm_config.model if request.llm_config else None
+    )
     
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    log = event_log_store.start(generate())
+    return StreamingResponse(
+        sse_writer.stream(log.subscribe(), is_disconnected=http_request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": log.stream_id}
+    )
 
 
-@router.get("/llm-providers", response_model=LLMProvidersResponse)
-def get_llm_providers():
-    """获取可用的LLM提供商和模型列表"""
-    providers = llm_factory.get_available_providers()
-    default_config = llm_factory.get_default_config()
-    
-    return LLMProvidersResponse(
-        providers=providers,
-        default=default_config
+@router.get("/stream/{stream_id}")
+async def resume_chat_stream(
+    stream_id: str,
+    http_request: Request,
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[int] = None
+):
+    """续传流式回答：回放 Last-Event-ID（或 after 参数）之后的事件，然后跟随实时输出
+
+    回答仍在生成时只会重新订阅，不会重新调用 LLM；回答结束后事件日志保留 SSE_EVENT_LOG_TTL 秒。
+    """
+    if after is None:
+        try:
+            after = int(last_event_id) if last_event_id else 0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID 格式错误")
+
+    events = await event_log_store.resume(stream_id, after)
+    if events is None:
+        raise HTTPException(status_code=404, detail="流不存在或已过期")
+
+    _STREAM_RESUMES.inc()
+    logger.info(f"Resuming stream {stream_id} after event {after}")
+    return StreamingResponse(
+        sse_writer.stream(events, is_disconnected=http_request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": stream_id}
     )
 
+
+@router.get("/llm-providers", response_model=LLMProvidersResponse)
+def get_llm_providers(if_none_match: Optional[str] = Header(None)):
+    """获取可用的LLM提供商和模型列表（预先序列化的响应，带 ETag，未修改时返回 304）"""
+    catalog = get_model_catalog()
+    headers = {
+        "ETag": catalog.etag,
+        "Cache-Control": f"private, max-age={settings.LLM_PROVIDERS_MAX_AGE}, must-revalidate"
+    }
+    if if_none_match and catalog.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalog.providers_body, media_type="application/json", headers=headers)
+
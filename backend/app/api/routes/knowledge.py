@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.db.database import get_db
 from app.db import models
+from app.db.pagination import approximate_count, keyset_page, set_page_headers
 from app.api.schemas import (
     KnowledgeBaseCreate, KnowledgeBaseResponse,
     DocumentCreate, DocumentResponse,
@@ -14,6 +15,7 @@ from app.api.schemas import (
 )
 from app.services.knowledge_service import knowledge_service
 from app.services.llm_factory import llm_factory
+from app.llm.admission import LLMOverloadedError
 from loguru import logger
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
@@ -58,11 +60,20 @@ def create_knowledge_base(kb: KnowledgeBaseCreate, db: Session = Depends(get_db)
 
 
 @router.get("/bases", response_model=List[KnowledgeBaseResponse])
-def get_knowledge_bases(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    """获取知识库列表"""
-    bases = db.query(models.KnowledgeBase).order_by(
-        models.KnowledgeBase.created_at.desc()
-    ).offset(skip).limit(limit).all()
+def get_knowledge_bases(
+    response: Response,
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
+    db: Session = Depends(get_db)
+):
+    """获取知识库列表（下一页游标在 X-Next-Cursor 响应头中返回）"""
+    query = db.query(models.KnowledgeBase)
+    bases, next_cursor = keyset_page(
+        query, models.KnowledgeBase.created_at, models.KnowledgeBase.id, limit, cursor=cursor, skip=skip
+    )
+    set_page_headers(response, next_cursor, approximate_count(db, query, "knowledge_bases") if include_count else None)
     return bases
 
 
@@ -144,17 +155,27 @@ def add_document(kb_id: int, doc: DocumentCreate, db: Session = Depends(get_db))
 
 
 @router.get("/bases/{kb_id}/documents", response_model=List[DocumentResponse])
-def get_documents(kb_id: int, skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    """获取知识库中的文档列表"""
+def get_documents(
+    kb_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
+    db: Session = Depends(get_db)
+):
+    """获取知识库中的文档列表（下一页游标在 X-Next-Cursor 响应头中返回）"""
     kb = db.query(models.KnowledgeBase).filter(
         models.KnowledgeBase.id == kb_id
     ).first()
     if not kb:
         raise HTTPException(status_code=404, detail="知识库不存在")
     
-    documents = db.query(models.Document).filter(
-        models.Document.knowledge_base_id == kb_id
-    ).order_by(models.Document.created_at.desc()).offset(skip).limit(limit).all()
+    query = db.query(models.Document).filter(models.Document.knowledge_base_id == kb_id)
+    documents, next_cursor = keyset_page(
+        query, models.Document.created_at, models.Document.id, limit, cursor=cursor, skip=skip
+    )
+    set_page_headers(response, next_cursor, approximate_count(db, query, "documents") if include_count else None)
     
     return documents
 
@@ -220,6 +241,7 @@ def search_role_presets(request: RolePresetSearchRequest, db: Session = Depends(
             db_session=db,
             query=request.query,
             category=request.category,
+            tags=request.tags,
             top_k=request.top_k
         )
         
@@ -235,33 +257,39 @@ def search_role_presets(request: RolePresetSearchRequest, db: Session = Depends(
 
 @router.get("/prompts", response_model=List[RolePresetResponse])
 def get_all_role_presets(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
     category: Optional[str] = None,
     tags: Optional[str] = None,
     title: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
     db: Session = Depends(get_db)
 ):
-    """获取所有角色预设（支持条件查询）"""
+    """获取所有角色预设（支持条件查询，下一页游标在 X-Next-Cursor 响应头中返回）"""
     try:
         # 解析tags参数（逗号分隔的字符串）
         tags_list = None
         if tags:
             tags_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
         
-        # 如果有查询条件，使用过滤方法
-        if category or tags_list or title:
-            results = knowledge_service.filter_role_presets(
-                db_session=db,
-                category=category,
-                tags=tags_list,
-                title_query=title,
-                skip=skip,
-                limit=limit
-            )
-        else:
-            results = knowledge_service.get_all_role_presets(db_session=db, skip=skip, limit=limit)
+        results, next_cursor = knowledge_service.list_role_presets(
+            db_session=db,
+            category=category,
+            tags=tags_list,
+            title_query=title,
+            limit=limit,
+            cursor=cursor,
+            skip=skip
+        )
+        total = None
+        if include_count:
+            total = knowledge_service.count_role_presets(db, category=category, tags=tags_list, title_query=title)
+        set_page_headers(response, next_cursor, total)
         return results
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting role presets: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -356,6 +384,8 @@ async def generate_prompt(request: PromptGenerateRequest):
             content=content.strip()
         )
         
+    except LLMOverloadedError:
+        raise  # 由全局异常处理返回 429
     except Exception as e:
         logger.error(f"Error generating prompt: {e}")
         import traceback
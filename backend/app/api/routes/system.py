@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from app.db.pool import pool_stats
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+
+@router.get("/db-pool")
+def get_db_pool_stats():
+    """获取数据库连接池状态（使用中、排队中、等待时间分布）"""
+    return pool_stats()
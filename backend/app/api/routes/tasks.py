@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.database import get_db
 from app.db import models
+from app.db.pagination import approximate_count, keyset_page, set_page_headers
 from app.api.schemas import (
     TaskCreate, TaskResponse,
     TaskPlanRequest, TaskPlanResponse,
@@ -92,18 +93,22 @@ async def plan_existing_task(task_id: int, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[TaskResponse])
 def get_tasks(
+    response: Response,
     skip: int = 0, 
     limit: int = 20, 
     status: str = None,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
     db: Session = Depends(get_db)
 ):
-    """获取任务列表"""
+    """获取任务列表（下一页游标在 X-Next-Cursor 响应头中返回）"""
     query = db.query(models.Task)
     
     if status:
         query = query.filter(models.Task.status == status)
     
-    tasks = query.order_by(models.Task.created_at.desc()).offset(skip).limit(limit).all()
+    tasks, next_cursor = keyset_page(query, models.Task.created_at, models.Task.id, limit, cursor=cursor, skip=skip)
+    set_page_headers(response, next_cursor, approximate_count(db, query, "tasks") if include_count else None)
     return tasks
 
 
@@ -26,17 +26,21 @@ class ConversationCreate(BaseModel):
     title: str
 
 
-class ConversationResponse(BaseModel):
+class ConversationSummaryResponse(BaseModel):
+    """对话列表项（不包含消息）"""
     id: int
     title: str
     created_at: datetime
     updated_at: datetime
-    messages: List[MessageResponse] = []
     
     class Config:
         from_attributes = True
 
 
+class ConversationResponse(ConversationSummaryResponse):
+    messages: List[MessageResponse] = []
+
+
 # LLM配置
 class LLMConfig(BaseModel):
     provider: Optional[str] = None  # 'openai' 或 'dashscope'
@@ -0,0 +1,278 @@
+"""跨 worker 共享缓存 - 基于 Redis 的键值缓存（同步与异步客户端共用配置）
+
+- 连接池：同步客户端（线程池中的检索、Embedding 等）和异步客户端（事件循环中）各有一个连接池，延迟创建
+- 命名空间：键为 "{CACHE_KEY_PREFIX}:{namespace}:{key}"；需要整体失效的数据用版本号（bump）拼进键中
+- 序列化：bytes 原样保存，其他值用 orjson 编码；超过 CACHE_COMPRESS_MIN_BYTES 的值用 zlib 压缩
+- 防击穿：get_or_set 在进程内合并同一个键的并发加载（single-flight），跨 worker 用 Redis 的 SET NX 加载锁，
+  没拿到锁的 worker 等待其他 worker 写入结果；TTL 加随机抖动，避免大量键同时过期
+- 降级：Redis 不可用时直接调用加载函数，并在 CACHE_RETRY_INTERVAL 内不再访问 Redis
+- 读写接口都是同步的（未命中时可能等待其他 worker 最多 CACHE_LOCK_WAIT 秒），只能在线程中调用，
+  不要直接在事件循环中调用；异步组件直接使用 async_client
+"""
+import random
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, TypeVar
+import orjson
+from loguru import logger
+from app.core.config import settings
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+_MISSING = object()
+_POLL_INTERVAL = 0.05  # 等待其他 worker 加载时的轮询间隔（秒）
+_TTL_JITTER = 0.1  # TTL 随机抖动比例
+
+# 只删除自己持有的加载锁（比较与删除在 Redis 中原子执行，避免删掉锁过期后其他 worker 新加的锁）
+_UNLOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# 编码标记（第一个字节）：小写为原始数据，大写为 zlib 压缩后的数据
+_RAW, _RAW_ZLIB, _JSON, _JSON_ZLIB = b"r", b"R", b"j", b"J"
+
+_CACHE_REQUESTS = metrics.counter(
+    "shared_cache_requests_total", "共享缓存访问次数（result: hit/miss/wait_hit/error）", labelnames=("namespace", "result")
+)
+_CACHE_LOAD_SECONDS = metrics.histogram("shared_cache_load_seconds", "共享缓存未命中时加载函数的耗时")
+
+
+def encode_value(value: Any) -> bytes:
+    """编码缓存值（较大的值压缩）"""
+    if isinstance(value, (bytes, bytearray)):
+        kind, data = _RAW, bytes(value)
+    else:
+        kind, data = _JSON, orjson.dumps(value)
+    if len(data) >= settings.CACHE_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            kind, data = kind.upper(), compressed
+    return kind + data
+
+
+def decode_value(raw: bytes) -> Any:
+    """解码 encode_value 的结果"""
+    kind, data = raw[:1], raw[1:]
+    if kind in (_RAW_ZLIB, _JSON_ZLIB):
+        data = zlib.decompress(data)
+    if kind in (_RAW, _RAW_ZLIB):
+        return data
+    if kind in (_JSON, _JSON_ZLIB):
+        return orjson.loads(data)
+    raise ValueError(f"Unknown cache encoding: {kind!r}")
+
+
+def _jittered(ttl: float) -> int:
+    return max(1, int(ttl * random.uniform(1 - _TTL_JITTER, 1 + _TTL_JITTER)))
+
+
+@dataclass
+class _Flight:
+    """进程内正在进行的一次加载"""
+    event: threading.Event = field(default_factory=threading.Event)
+    value: Any = _MISSING
+
+
+class SharedCache:
+    """Redis 共享缓存"""
+
+    def __init__(self, url: str, prefix: str, enabled: bool = True):
+        self.url = url
+        self.prefix = prefix
+        self.enabled = enabled
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+        self._down_until = 0.0  # Redis 出错后暂停访问的截止时间
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+
+    # ---------- 客户端 ----------
+
+    @property
+    def client(self):
+        """同步客户端（连接池）"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import redis
+                    pool = redis.ConnectionPool.from_url(
+                        self.url,
+                        max_connections=settings.REDIS_MAX_CONNECTIONS,
+                        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+                    )
+                    self._client = redis.Redis(connection_pool=pool)
+        return self._client
+
+    @property
+    def async_client(self):
+        """异步客户端（连接池，绑定到首次使用时的事件循环；供事件日志等异步组件直接使用）"""
+        if self._async_client is None:
+            import redis.asyncio as redis_asyncio
+            pool = redis_asyncio.ConnectionPool.from_url(
+                self.url,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+            )
+            self._async_client = redis_asyncio.Redis(connection_pool=pool)
+        return self._async_client
+
+    async def aclose(self):
+        """关闭连接池（应用退出时调用）"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._down_until
+
+    def _failed(self, namespace: str, operation: str, error: Exception):
+        _CACHE_REQUESTS.labels(namespace, "error").inc()
+        if time.monotonic() >= self._down_until:
+            logger.warning(
+                f"Shared cache {operation} failed ({namespace}), bypassing Redis for "
+                f"{settings.CACHE_RETRY_INTERVAL}s: {error}"
+            )
+        self._down_until = time.monotonic() + settings.CACHE_RETRY_INTERVAL
+
+    # ---------- 同步接口 ----------
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """读取缓存值，未命中或 Redis 不可用时返回 default"""
+        value = self._get(namespace, self.key(namespace, key))
+        return default if value is _MISSING else value
+
+    def _get(self, namespace: str, full_key: str) -> Any:
+        if not self.available:
+            return _MISSING
+        try:
+            raw = self.client.get(full_key)
+        except Exception as e:
+            self._failed(namespace, "get", e)
+            return _MISSING
+        return _MISSING if raw is None else decode_value(raw)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        """写入缓存值（ttl 秒后过期）"""
+        self._set(namespace, self.key(namespace, key), value, ttl)
+
+    def _set(self, namespace: str, full_key: str, value: Any, ttl: float):
+        if not self.available:
+            return
+        try:
+            self.client.set(full_key, encode_value(value), ex=_jittered(ttl))
+        except Exception as e:
+            self._failed(namespace, "set", e)
+
+    def delete(self, namespace: str, *keys: str):
+        """删除缓存值"""
+        if not self.available or not keys:
+            return
+        try:
+            self.client.delete(*(self.key(namespace, key) for key in keys))
+        except Exception as e:
+            self._failed(namespace, "delete", e)
+
+    def version(self, namespace: str, key: str) -> int:
+        """数据版本号（拼进缓存键中，bump 后旧版本的缓存不再被读取）"""
+        if not self.available:
+            return 0
+        try:
+            return int(self.client.get(self.key(namespace, f"{key}:version")) or 0)
+        except Exception as e:
+            self._failed(namespace, "version", e)
+            return 0
+
+    def bump(self, namespace: str, key: str):
+        """递增数据版本号（数据修改后调用）"""
+        if not self.available:
+            return
+        try:
+            self.client.incr(self.key(namespace, f"{key}:version"))
+        except Exception as e:
+            self._failed(namespace, "bump", e)
+
+    def get_or_set(self, namespace: str, key: str, ttl: float, load: Callable[[], T]) -> T:
+        """读取缓存值，未命中时调用 load() 并写入缓存（load 抛出异常时不写入）"""
+        full_key = self.key(namespace, key)
+        value = self._get(namespace, full_key)
+        if value is not _MISSING:
+            _CACHE_REQUESTS.labels(namespace, "hit").inc()
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+        if not leader:
+            # 本进程中已有线程在加载同一个键
+            flight.event.wait(settings.CACHE_LOCK_TIMEOUT)
+            if flight.value is not _MISSING:
+                _CACHE_REQUESTS.labels(namespace, "wait_hit").inc()
+                return flight.value
+            return load()
+
+        try:
+            flight.value = self._load_locked(namespace, full_key, ttl, load)
+            return flight.value
+        finally:
+            flight.event.set()
+            with self._flights_lock:
+                self._flights.pop(full_key, None)
+
+    def _load_locked(self, namespace: str, full_key: str, ttl: float, load: Callable[[], T]) -> T:
+        """持有跨 worker 加载锁时加载；锁被其他 worker 持有时等待其结果"""
+        lock_key = full_key + ":lock"
+        token = uuid.uuid4().hex
+        locked = False
+        if self.available:
+            try:
+                locked = bool(self.client.set(lock_key, token, nx=True, px=int(settings.CACHE_LOCK_TIMEOUT * 1000)))
+            except Exception as e:
+                self._failed(namespace, "lock", e)
+            if not locked and self.available:
+                deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(_POLL_INTERVAL)
+                    value = self._get(namespace, full_key)
+                    if value is not _MISSING:
+                        _CACHE_REQUESTS.labels(namespace, "wait_hit").inc()
+                        return value
+
+        _CACHE_REQUESTS.labels(namespace, "miss").inc()
+        try:
+            start = time.perf_counter()
+            value = load()
+            _CACHE_LOAD_SECONDS.observe(time.perf_counter() - start)
+            self._set(namespace, full_key, value, ttl)
+            return value
+        finally:
+            if locked:
+                self._unlock(namespace, lock_key, token)
+
+    def _unlock(self, namespace: str, lock_key: str, token: str):
+        try:
+            self.client.eval(_UNLOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            self._failed(namespace, "unlock", e)
+
+
+# 全局实例
+shared_cache = SharedCache(settings.REDIS_URL, settings.CACHE_KEY_PREFIX, enabled=settings.SHARED_CACHE_ENABLED)
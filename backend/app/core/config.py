@@ -25,10 +25,51 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
-    
+
+    # 数据库连接池（SQLAlchemy 引擎与 checkpoint 异步连接池共用一套配置）
+    DB_POOL_MAX_SIZE: int = 20  # 每个worker的连接总预算，按比例分给两个连接池（即各连接池可保留的最大连接数）
+    DB_POOL_MIN_SIZE: int = 2  # 每个连接池启动时预热的连接数（其余连接按需建立，建立后保留复用）
+    DB_POOL_CHECKPOINT_SHARE: float = 0.5  # 分给 checkpoint 异步连接池的预算比例
+    DB_POOL_TIMEOUT: float = 10.0  # 获取连接的最长等待时间（秒），超时即视为连接池耗尽
+    DB_POOL_MAX_LIFETIME: float = 1800.0  # 连接最长存活时间（秒），超过后回收重建
+    DB_POOL_MAX_IDLE: float = 600.0  # 空闲连接最长保留时间（秒，仅异步连接池）
+    DB_POOL_MAX_WAITING: int = 0  # 异步连接池最大排队数，0 表示不限制
+    DB_POOL_PREWARM: bool = True  # 启动时预热连接池
+
+    # 启动预热（后台执行，必需阶段完成前 /health 返回 503，失败的阶段在后台重试）
+    WARMUP_ENABLED: bool = True  # 预热 checkpoint、连接池和工具（必需），以及 Embedding 模型、ChromaDB 连接等（可选，不阻塞就绪）
+    WARMUP_TIMEOUT: float = 300.0  # 必需阶段每次尝试的最长时间（秒），超时视为失败并重试
+    WARMUP_RETRY_INTERVAL: float = 5.0  # 必需阶段失败后首次重试的等待时间（秒），之后每次翻倍
+    WARMUP_RETRY_MAX_INTERVAL: float = 60.0  # 必需阶段重试的最长等待时间（秒）
+
+    # 流式输出（SSE）
+    SSE_COALESCE_WINDOW: float = 0.05  # 合并相邻文本块的时间窗口（秒）
+    SSE_COALESCE_MAX_CHARS: int = 1024  # 单帧合并的最大字符数，超过立即发送
+    SSE_DISCONNECT_CHECK_INTERVAL: float = 1.0  # 检查客户端是否断开的间隔（秒）
+    SSE_EVENT_LOG_MAX_EVENTS: int = 2000  # 每轮对话事件日志保留的最大项数（相邻文本事件合并为一项，每项最多 SSE_COALESCE_MAX_CHARS 个字符）
+    SSE_EVENT_LOG_TTL: float = 300.0  # 回答结束后事件日志保留的时间（秒），期间可续传
+    SSE_RESUME_GRACE_PERIOD: float = 30.0  # 客户端全部断开后等待重连的时间（秒），超时取消Agent
+    SSE_EVENT_LOG_REDIS: bool = False  # 同时把事件日志写入 Redis，支持在其他 worker 上续传
+
+    # 耗时追踪（各阶段耗时通过 /metrics 导出）
+    TIMING_ENABLED: bool = True  # 记录对话链路各阶段耗时
+    TIMING_SSE_EVENT: bool = False  # 在流式响应结束前发送 timing 事件（按阶段的耗时明细）
+
     # Redis
     REDIS_URL: str
-    
+
+    # 跨 worker 共享缓存（Redis，不可用时自动降级为直接计算）
+    SHARED_CACHE_ENABLED: bool = True  # 是否启用共享缓存
+    CACHE_KEY_PREFIX: str = "agentmind"  # 缓存键前缀（多套环境共用一个 Redis 时区分）
+    REDIS_MAX_CONNECTIONS: int = 50  # 每个worker的 Redis 连接池大小（同步、异步客户端各一个）
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # Redis 连接与读写超时（秒），超时视为缓存不可用
+    CACHE_COMPRESS_MIN_BYTES: int = 1024  # 超过该大小的缓存值用 zlib 压缩
+    CACHE_LOCK_TIMEOUT: float = 10.0  # 未命中时加载锁的有效期（秒），防止同一个键被多个 worker 同时加载
+    CACHE_LOCK_WAIT: float = 5.0  # 等待其他 worker 加载结果的最长时间（秒），超时后自行加载
+    CACHE_RETRY_INTERVAL: float = 5.0  # Redis 出错后暂停访问的时间（秒）
+    CACHE_EMBEDDING_TTL: float = 86400.0  # 查询向量缓存有效期（秒）
+    CACHE_SEARCH_TTL: float = 300.0  # 知识库检索结果缓存有效期（秒），数据修改后立即失效
+
     # ChromaDB
     CHROMA_HOST: str = "chromadb"
     CHROMA_PORT: int = 8000
@@ -41,6 +82,31 @@ class Settings(BaseSettings):
     
     # LLM提供商选择: openai 或 dashscope
     LLM_PROVIDER: str = "dashscope"
+    LLM_PROVIDERS_MAX_AGE: int = 60  # 提供商列表响应的浏览器缓存时间（秒），过期后用 ETag 重新验证
+    
+    # 假模型（离线基准测试用，LLM_PROVIDER=fake 或请求中 provider=fake 时使用）
+    FAKE_LLM_ENABLED: bool = False  # 是否允许使用 fake 提供商
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0  # 输出速率（token/秒）
+    FAKE_LLM_FIRST_TOKEN_LATENCY: float = 0.2  # 首个 token 前的延迟（秒）
+    FAKE_LLM_RESPONSE_TOKENS: int = 200  # 每次回答的 token 数
+    FAKE_LLM_TOOL_CALL_PATTERN: str = "none"  # none / single / parallel / sequential
+    
+    # LLM 准入控制（按提供商/模型限流，models.json 中的 limits 优先，未配置时使用以下默认值）
+    LLM_ADMISSION_ENABLED: bool = True  # 是否启用准入控制
+    LLM_DEFAULT_REQUESTS_PER_SECOND: float = 0.0  # 每秒调用数（<=0 不限速）
+    LLM_DEFAULT_BURST: int = 10  # 令牌桶容量
+    LLM_DEFAULT_MAX_CONCURRENCY: int = 0  # 最大并发调用数（<=0 不限制）
+    LLM_DEFAULT_MAX_QUEUE_WAIT: float = 10.0  # 排队截止时间（秒），预计超过时返回 429
+    
+    # LLM 路由（对冲请求与熔断，备用模型在 models.json 的 routing.fallbacks 中配置）
+    LLM_HEDGING_ENABLED: bool = True  # 是否启用主备对冲/故障转移
+    LLM_HEDGE_DELAY: float = 3.0  # 主模型首块超过该时间（秒）未到达时向备用模型发请求（routing.hedge_delay 优先）
+    LLM_BREAKER_WINDOW: float = 60.0  # 熔断统计的滚动窗口（秒）
+    LLM_BREAKER_MIN_REQUESTS: int = 5  # 窗口内至少有这么多请求才会判断熔断
+    LLM_BREAKER_ERROR_RATE: float = 0.5  # 错误率达到该值时熔断
+    LLM_BREAKER_SLOW_TTFT: float = 10.0  # 首块耗时超过该值（秒）视为慢响应
+    LLM_BREAKER_SLOW_RATE: float = 0.5  # 慢响应比例达到该值时熔断
+    LLM_BREAKER_COOLDOWN: float = 30.0  # 熔断后的冷却时间（秒），之后放行探测请求
     
     # OpenAI/LLM（可选，用于多模型切换）
     OPENAI_API_KEY: str = ""
@@ -58,6 +124,37 @@ class Settings(BaseSettings):
     BAIDU_API_KEY: str = ""  # 百度API Key（可选，使用网页搜索不需要API Key）
     BAIDU_ENABLED: bool = True  # 是否启用百度搜索
     
+    # 工具运行时（执行器与并发限制）
+    TOOL_THREAD_POOL_SIZE: int = 8  # 同步 I/O 工具（ChromaDB、Tavily）线程池大小
+    TOOL_PROCESS_POOL_SIZE: int = 2  # CPU 密集型工具（HTML/PDF 解析）进程池大小
+    TOOL_HTTP_MAX_CONNECTIONS: int = 50  # 工具共享 HTTP 客户端的最大连接数
+    TOOL_DEFAULT_CONCURRENCY: int = 8  # 未单独配置的工具的最大并发数
+    TOOL_DEFAULT_TIMEOUT: float = 30.0  # 未单独配置的工具的超时时间（秒）
+    
+    # Agent 并行工具调用
+    AGENT_PARALLEL_TOOL_CALLS: bool = True  # 提示模型在一轮中并行发起多个工具调用
+    AGENT_MAX_PARALLEL_TOOL_CALLS: int = 4  # 同一步内同时执行的最大工具调用数
+    AGENT_TOOL_CALL_TIMEOUT: float = 60.0  # 单个工具调用的截止时间（秒）
+    
+    # 系统提示词预算（各模型的预算在 models.json 的 prompt_budget 中配置）
+    PROMPT_BUDGET_DEFAULT_TOKENS: int = 4000  # 未配置时系统提示词的 token 预算
+    PROMPT_TOKENIZER_ENCODING: str = "cl100k_base"  # 计数使用的 tiktoken 编码（启动预热时加载，离线部署见 env.template 中的 TIKTOKEN_CACHE_DIR）
+    
+    # 对话消息导出
+    MESSAGE_EXPORT_BATCH_SIZE: int = 500  # NDJSON 导出时每批从服务端游标读取的消息数
+    
+    # 文档入库（切分与向量化）
+    INGEST_PROCESS_POOL_SIZE: int = 4  # 文档切分进程池大小（0 表示在当前进程中切分）
+    INGEST_BATCH_CHARS: int = 2_000_000  # 每个切分任务的字符数（超大文档按此分段）
+    INGEST_EMBED_BATCH_SIZE: int = 256  # 每次向量化并写入 ChromaDB 的分块数
+    
+    # 进程内向量索引（预设路由）的存储格式：float32 / float16 / int8 / binary（二值码 + 重排）
+    VECTOR_INDEX_QUANTIZATION: str = "float32"
+    VECTOR_INDEX_RESCORE_FACTOR: int = 10  # 需要重排时粗排候选数 = top_k × 该倍数
+    
+    # 角色预设缓存（渲染好的提示词块与预设路由的向量矩阵，本进程修改预设时立即更新）
+    ROLE_PRESET_CACHE_TTL: float = 300.0  # 缓存有效期（秒），多 worker 部署时其他进程依靠过期刷新
+    
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
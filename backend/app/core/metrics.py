@@ -0,0 +1,248 @@
+"""轻量级指标收集 - 进程内直方图、计数器与仪表盘，支持标签和 Prometheus 文本格式导出
+
+瞬时状态（如连接池占用）可以注册采集函数，导出前调用以更新对应的仪表盘。
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from loguru import logger
+
+# 默认耗时桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """固定桶直方图（线程安全）"""
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict:
+        """获取累计分布快照"""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total_count = self._count
+
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = total_count
+
+        return {
+            "buckets": cumulative,
+            "count": total_count,
+            "sum": round(total_sum, 6),
+        }
+
+
+class Counter:
+    """单调递增计数器（线程安全）"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """可增可减的瞬时值（线程安全）"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class MetricFamily:
+    """带标签的指标族 - 每组标签值对应一个子指标"""
+
+    def __init__(self, factory, name: str, description: str, labelnames: Sequence[str]):
+        self._factory = factory
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Union[Histogram, Counter, Gauge]] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str, **kwargs: str) -> Union[Histogram, Counter, Gauge]:
+        """获取（或创建）指定标签值的子指标"""
+        key = tuple(str(v) for v in values) if values else tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._factory()
+                    self._children[key] = child
+        return child
+
+    def children(self) -> List[Tuple[Dict[str, str], Union[Histogram, Counter, Gauge]]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in items]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """指标注册表 - 按名称获取或创建指标（单例使用）"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Union[Histogram, MetricFamily]] = {}
+        self._counters: Dict[str, Union[Counter, MetricFamily]] = {}
+        self._gauges: Dict[str, Union[Gauge, MetricFamily]] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, collect: Callable[[], None]):
+        """注册采集函数，每次导出前调用（用于更新瞬时状态的仪表盘）"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Optional[Sequence[float]] = None,
+        labelnames: Sequence[str] = ()
+    ) -> Union[Histogram, MetricFamily]:
+        """获取或创建直方图（指定 labelnames 时返回指标族，通过 labels() 取子指标）"""
+        with self._lock:
+            if name not in self._histograms:
+                bucket_bounds = buckets or DEFAULT_BUCKETS
+                if labelnames:
+                    self._histograms[name] = MetricFamily(
+                        lambda: Histogram(name, description, bucket_bounds), name, description, labelnames
+                    )
+                else:
+                    self._histograms[name] = Histogram(name, description, bucket_bounds)
+            return self._histograms[name]
+
+    def counter(self, name: str, description: str = "", labelnames: Sequence[str] = ()) -> Union[Counter, MetricFamily]:
+        """获取或创建计数器（指定 labelnames 时返回指标族）"""
+        with self._lock:
+            if name not in self._counters:
+                if labelnames:
+                    self._counters[name] = MetricFamily(
+                        lambda: Counter(name, description), name, description, labelnames
+                    )
+                else:
+                    self._counters[name] = Counter(name, description)
+            return self._counters[name]
+
+    def gauge(self, name: str, description: str = "", labelnames: Sequence[str] = ()) -> Union[Gauge, MetricFamily]:
+        """获取或创建仪表盘（指定 labelnames 时返回指标族）"""
+        with self._lock:
+            if name not in self._gauges:
+                if labelnames:
+                    self._gauges[name] = MetricFamily(
+                        lambda: Gauge(name, description), name, description, labelnames
+                    )
+                else:
+                    self._gauges[name] = Gauge(name, description)
+            return self._gauges[name]
+
+    @staticmethod
+    def _series(metric: Union[Histogram, Counter, Gauge, MetricFamily]) -> List[Tuple[Dict[str, str], Union[Histogram, Counter, Gauge]]]:
+        if isinstance(metric, MetricFamily):
+            return metric.children()
+        return [({}, metric)]
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        lines: List[str] = []
+        for name, metric in histograms:
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in self._series(metric):
+                snapshot = histogram.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+        for name, metric in counters:
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, counter in self._series(metric):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(counter.value)}")
+
+        for name, metric in gauges:
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, gauge in self._series(metric):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(gauge.value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例
+metrics = MetricsRegistry()
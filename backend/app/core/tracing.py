@@ -0,0 +1,149 @@
+"""请求耗时追踪 - 按阶段记录对话链路中各环节的耗时
+
+- span(name)：同步/异步上下文管理器，记录一个阶段的耗时
+- traced(name)：函数装饰器，等价于用 span 包住整个函数
+- record(name, seconds)：直接记录一个已测得的耗时（如首 token 时间）
+
+所有阶段耗时都写入 chat_stage_duration_seconds{stage=...} 直方图（由 /metrics 导出）；
+调用 start_trace() 后，同一请求上下文（包括其创建的任务）中的阶段还会记录到 RequestTrace，
+用于在流式响应末尾发送 timing 事件。TIMING_ENABLED=false 时 span 返回共享的空实现，几乎没有开销。
+"""
+import asyncio
+import functools
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import DEFAULT_BUCKETS, metrics
+
+_STAGE_SECONDS = metrics.histogram(
+    "chat_stage_duration_seconds",
+    "对话链路各阶段耗时（秒）",
+    buckets=DEFAULT_BUCKETS + (60.0, 120.0),
+    labelnames=("stage",)
+)
+
+
+class RequestTrace:
+    """单个请求的阶段耗时记录"""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []  # (阶段, 相对开始时间, 耗时)，单位秒
+
+    def add(self, name: str, start: float, duration: float):
+        self.spans.append((name, start - self.started, duration))
+
+    def as_dict(self) -> Dict:
+        """按阶段汇总（毫秒），同时保留按时间排序的明细"""
+        stages: Dict[str, Dict] = {}
+        for name, _, duration in self.spans:
+            stage = stages.setdefault(name, {"count": 0, "total_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += duration * 1000
+        for stage in stages.values():
+            stage["total_ms"] = round(stage["total_ms"], 2)
+
+        return {
+            "total_ms": round((perf_counter() - self.started) * 1000, 2),
+            "stages": stages,
+            "spans": [
+                {"stage": name, "start_ms": round(offset * 1000, 2), "duration_ms": round(duration * 1000, 2)}
+                for name, offset, duration in sorted(self.spans, key=lambda s: s[1])
+            ]
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def start_trace() -> RequestTrace:
+    """为当前请求上下文开始记录阶段明细"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record(name: str, duration: float, start: Optional[float] = None):
+    """记录一个阶段耗时（秒）"""
+    if not settings.TIMING_ENABLED:
+        return
+    _STAGE_SECONDS.labels(name).observe(duration)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, start if start is not None else perf_counter() - duration, duration)
+
+
+class _Span:
+    """阶段计时上下文（同时支持 with 和 async with）"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, perf_counter() - self.start, self.start)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class _NoopSpan:
+    """关闭计时时使用的空实现"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """记录一个阶段的耗时"""
+    if not settings.TIMING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def traced(name: str) -> Callable:
+    """函数装饰器：把整个函数调用记录为一个阶段"""
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from app.db.database import Base
 
@@ -14,6 +15,11 @@ class Conversation(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    
+    # 复合索引：键集分页按 (排序列, id) 倒序扫描
+    __table_args__ = (
+        Index("ix_conversations_updated_at_id", "updated_at", "id"),
+    )
 
 
 class Message(Base):
@@ -24,10 +30,14 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
     role = Column(String(20), nullable=False)  # user, assistant, system
     content = Column(Text, nullable=False)
-    meta_info = Column(JSON, nullable=True)  # 存储额外信息，如检索的知识等
+    meta_info = deferred(Column(JSON, nullable=True))  # 存储额外信息（推理过程、工具调用等），体积较大，访问时才加载
     created_at = Column(DateTime, default=datetime.utcnow)
     
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at", "id"),
+    )
 
 
 class KnowledgeBase(Base):
@@ -42,6 +52,10 @@ class KnowledgeBase(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     documents = relationship("Document", back_populates="knowledge_base", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_knowledge_bases_created_at_id", "created_at", "id"),
+    )
 
 
 class Document(Base):
@@ -58,6 +72,10 @@ class Document(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
+    
+    __table_args__ = (
+        Index("ix_documents_knowledge_base_id_created_at", "knowledge_base_id", "created_at", "id"),
+    )
 
 
 class Task(Base):
@@ -72,6 +90,11 @@ class Task(Base):
     result = Column(JSON, nullable=True)  # 存储执行结果
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        Index("ix_tasks_status_created_at", "status", "created_at", "id"),
+    )
 
 
 class RolePreset(Base):
@@ -83,6 +106,14 @@ class RolePreset(Base):
     title = Column(String(200), nullable=False)
     prompt_content = Column(Text, nullable=False)  # 完整的提示词内容
     category = Column(String(50), nullable=False, default="general", index=True)  # 分类：tech, business, analysis, creative, general
-    tags = Column(JSON, nullable=True)  # 标签列表，存储为JSON数组
+    tags = Column(JSONB, nullable=True)  # 标签列表，存储为JSONB数组（GIN索引支持 @> 包含查询）
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_role_presets_created_at_id", "created_at", "id"),
+        Index("ix_role_presets_category_created_at", "category", "created_at", "id"),
+        Index("ix_role_presets_tags_gin", "tags", postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+        # 标题模糊查询（ILIKE '%关键词%'）使用的三元组索引，需要 pg_trgm 扩展
+        Index("ix_role_presets_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
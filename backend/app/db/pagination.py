@@ -0,0 +1,128 @@
+"""键集（游标）分页 - 按 (排序列, id) 倒序翻页，深层页与第一页代价相同
+
+- 游标是上一页最后一行的 (排序列, id)，编码为 URL 安全的 base64 字符串，通过 X-Next-Cursor 响应头返回；
+  没有下一页时不返回该响应头
+- 查询条件为 (排序列, id) < (游标值)，配合 (过滤列, 排序列, id) 复合索引只扫描需要的行
+- 多取一行判断是否还有下一页，不需要 COUNT；需要总数时用 approximate_count 读取统计信息中的估算行数
+- 兼容旧的 skip 参数：没有游标且 skip > 0 时仍使用 OFFSET
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from loguru import logger
+from sqlalchemy import text, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+APPROXIMATE_COUNT_HEADER = "X-Total-Count-Approximate"
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """把 (排序列, id) 编码为游标"""
+    if isinstance(sort_value, datetime):
+        sort_value = {"dt": sort_value.isoformat()}
+    payload = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """解码游标，格式不正确时返回 400"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(payload)
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["dt"])
+        return sort_value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def keyset_page(
+    query: Query,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[List[Any], Optional[str]]:
+    """按 (sort_column, id_column) 倒序取一页
+
+    Args:
+        query: 已加过滤条件的查询
+        sort_column: 排序列（如 created_at）
+        id_column: 主键列，排序值相同时保证顺序稳定
+        limit: 每页行数
+        cursor: 上一页返回的游标
+        skip: 没有游标时的偏移量（兼容旧接口）
+
+    Returns:
+        (本页的行, 下一页的游标或 None)
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if not cursor and skip > 0:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def set_page_headers(response: Response, next_cursor: Optional[str], approximate_total: Optional[int] = None):
+    """写入分页相关的响应头"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if approximate_total is not None:
+        response.headers[APPROXIMATE_COUNT_HEADER] = str(approximate_total)
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <查询>，与普通查询一样编译执行（参数经过类型的 bind processor，如 JSONB、IN 展开）"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def approximate_count(db: Session, query: Query, table_name: str) -> int:
+    """表的估算行数
+
+    没有过滤条件时，PostgreSQL 读取 pg_class.reltuples（由 VACUUM/ANALYZE 维护，不扫描表）；
+    有过滤条件时用 EXPLAIN 的估算行数。其他数据库、表尚未 ANALYZE 或估算失败时退回精确的 COUNT。
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        try:
+            # 在保存点中执行，失败时不影响当前事务中后续的 COUNT
+            with db.begin_nested():
+                estimate = _estimate_rows(db, query, table_name)
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        except Exception as e:
+            logger.warning(f"Failed to estimate row count of {table_name}, falling back to COUNT: {e}")
+    return query.order_by(None).count()
+
+
+def _estimate_rows(db: Session, query: Query, table_name: str) -> Optional[float]:
+    if query.whereclause is None:
+        return db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {"table": table_name}
+        ).scalar()
+    plan = db.execute(_Explain(query.order_by(None).statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
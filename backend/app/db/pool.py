@@ -0,0 +1,235 @@
+"""数据库连接池 - 统一 SQLAlchemy 引擎与 checkpoint 异步连接池的配置、预热和监控"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+# 连接等待时间直方图（秒）与超时次数，pool 标签为 sqlalchemy / checkpoint
+_POOL_WAIT = metrics.histogram("db_pool_wait_seconds", "连接池获取连接的等待时间", labelnames=("pool",))
+_POOL_TIMEOUTS = metrics.counter("db_pool_timeouts_total", "连接池获取连接超时次数", labelnames=("pool",))
+_SYNC_WAIT = _POOL_WAIT.labels("sqlalchemy")
+_ASYNC_WAIT = _POOL_WAIT.labels("checkpoint")
+_SYNC_TIMEOUTS = _POOL_TIMEOUTS.labels("sqlalchemy")
+_ASYNC_TIMEOUTS = _POOL_TIMEOUTS.labels("checkpoint")
+
+# 连接池占用情况（导出 /metrics 时由 _collect_pool_gauges 更新）
+_POOL_SIZE = metrics.gauge("db_pool_connections", "连接池当前的连接数", labelnames=("pool",))
+_POOL_IN_USE = metrics.gauge("db_pool_connections_in_use", "连接池中正在使用的连接数", labelnames=("pool",))
+_POOL_WAITING = metrics.gauge("db_pool_requests_waiting", "正在等待连接的请求数", labelnames=("pool",))
+_POOL_MAX = metrics.gauge("db_pool_max_connections", "连接池最大连接数", labelnames=("pool",))
+
+
+def pool_budget() -> Dict[str, Tuple[int, int]]:
+    """按统一预算拆分两个连接池的 (min_size, max_size)"""
+    total = max(2, settings.DB_POOL_MAX_SIZE)
+    async_max = min(total - 1, max(1, round(total * settings.DB_POOL_CHECKPOINT_SHARE)))
+    sync_max = total - async_max
+    return {
+        "sqlalchemy": (min(settings.DB_POOL_MIN_SIZE, sync_max), sync_max),
+        "checkpoint": (min(settings.DB_POOL_MIN_SIZE, async_max), async_max),
+    }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """带监控的 SQLAlchemy 连接池 - 记录等待中的请求数和获取连接耗时"""
+
+    _waiting = 0
+    _waiting_lock = threading.Lock()
+
+    def connect(self):
+        with InstrumentedQueuePool._waiting_lock:
+            InstrumentedQueuePool._waiting += 1
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            _SYNC_TIMEOUTS.inc()
+            logger.warning(
+                f"SQLAlchemy connection pool exhausted (size={self.size()}, in_use={self.checkedout()}, "
+                f"timeout={settings.DB_POOL_TIMEOUT}s), consider raising DB_POOL_MAX_SIZE"
+            )
+            raise
+        finally:
+            with InstrumentedQueuePool._waiting_lock:
+                InstrumentedQueuePool._waiting -= 1
+            _SYNC_WAIT.observe(time.perf_counter() - start)
+
+
+class InstrumentedAsyncConnectionPool(AsyncConnectionPool):
+    """带监控的 psycopg 异步连接池 - 记录获取连接耗时和超时"""
+
+    async def getconn(self, timeout: Optional[float] = None):
+        start = time.perf_counter()
+        try:
+            return await super().getconn(timeout=timeout)
+        except PoolTimeout:
+            _ASYNC_TIMEOUTS.inc()
+            stats = self.get_stats()
+            logger.warning(
+                f"Checkpoint connection pool exhausted (size={stats.get('pool_size')}, "
+                f"waiting={stats.get('requests_waiting')}), consider raising DB_POOL_MAX_SIZE"
+            )
+            raise
+        finally:
+            _ASYNC_WAIT.observe(time.perf_counter() - start)
+
+
+def engine_pool_kwargs() -> Dict:
+    """SQLAlchemy create_engine 的连接池参数
+
+    QueuePool 在归还时会关闭溢出（overflow）连接，因此整个预算都作为常驻连接（pool_size），
+    不使用溢出；连接按需建立，min_size 只决定启动时预热的连接数。
+    """
+    _, max_size = pool_budget()["sqlalchemy"]
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": max_size,
+        "max_overflow": 0,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": int(settings.DB_POOL_MAX_LIFETIME),
+    }
+
+
+def checkpoint_conninfo() -> str:
+    """checkpoint 连接字符串（确保包含 sslmode 参数）"""
+    db_uri = settings.DATABASE_URL
+    if '?sslmode=' not in db_uri and '?' not in db_uri:
+        db_uri = f"{db_uri}?sslmode=disable"
+    elif '?sslmode=' not in db_uri and '?' in db_uri:
+        db_uri = f"{db_uri}&sslmode=disable"
+    return db_uri
+
+
+_async_pool: Optional[InstrumentedAsyncConnectionPool] = None
+_async_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_async_pool() -> InstrumentedAsyncConnectionPool:
+    """获取 checkpoint 使用的异步连接池（单例，首次调用时打开）"""
+    global _async_pool, _async_pool_lock
+    if _async_pool is not None:
+        return _async_pool
+
+    if _async_pool_lock is None:
+        _async_pool_lock = asyncio.Lock()
+
+    async with _async_pool_lock:
+        if _async_pool is None:
+            db_uri = checkpoint_conninfo()
+            min_size, max_size = pool_budget()["checkpoint"]
+            pool = InstrumentedAsyncConnectionPool(
+                conninfo=db_uri,
+                min_size=min_size,
+                max_size=max_size,
+                timeout=settings.DB_POOL_TIMEOUT,
+                max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+                max_idle=settings.DB_POOL_MAX_IDLE,
+                max_waiting=settings.DB_POOL_MAX_WAITING,
+                name="checkpoint",
+                open=False
+            )
+            await pool.open()
+            _async_pool = pool
+            logger.info(
+                f"Created PostgreSQL async connection pool (min={min_size}, max={max_size}) "
+                f"with DB: {db_uri.split('@')[1] if '@' in db_uri else '***'}"
+            )
+    return _async_pool
+
+
+def _warm_up_engine(count: int):
+    """预先建立 SQLAlchemy 连接池的常驻连接"""
+    from app.db.database import engine
+
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.pool.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+async def warm_up_pools():
+    """预热两个连接池，使首个请求不再承担建连开销"""
+    sync_min, _ = pool_budget()["sqlalchemy"]
+
+    async def warm_async():
+        pool = await get_async_pool()
+        await pool.wait(timeout=settings.DB_POOL_TIMEOUT)
+
+    results = await asyncio.gather(
+        asyncio.to_thread(_warm_up_engine, max(1, sync_min)),
+        warm_async(),
+        return_exceptions=True
+    )
+    for name, result in zip(("sqlalchemy", "checkpoint"), results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to warm up {name} connection pool: {result}")
+        else:
+            logger.info(f"Warmed up {name} connection pool")
+
+
+async def close_pools():
+    """关闭连接池（应用退出时调用）"""
+    global _async_pool
+    from app.db.database import engine
+
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    engine.dispose()
+
+
+def pool_stats() -> Dict:
+    """获取两个连接池的实时状态和等待时间分布"""
+    from app.db.database import engine
+
+    sync_pool = engine.pool
+    sync_stats = {
+        "size": sync_pool.checkedin() + sync_pool.checkedout(),
+        "in_use": sync_pool.checkedout(),
+        "waiting": InstrumentedQueuePool._waiting,
+        "max_size": pool_budget()["sqlalchemy"][1],
+        "timeouts": _SYNC_TIMEOUTS.value,
+        "wait_seconds": _SYNC_WAIT.snapshot(),
+    }
+
+    async_stats: Dict = {"open": _async_pool is not None}
+    if _async_pool is not None:
+        raw = _async_pool.get_stats()
+        async_stats.update({
+            "size": raw.get("pool_size", 0),
+            "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+            "waiting": raw.get("requests_waiting", 0),
+            "max_size": raw.get("pool_max", 0),
+            "timeouts": _ASYNC_TIMEOUTS.value,
+            "wait_seconds": _ASYNC_WAIT.snapshot(),
+        })
+
+    return {
+        "sqlalchemy": sync_stats,
+        "checkpoint": async_stats,
+    }
+
+
+def _collect_pool_gauges():
+    """导出指标前更新连接池占用情况的仪表盘"""
+    stats = pool_stats()
+    for pool, pool_stat in stats.items():
+        if "size" not in pool_stat:
+            continue  # checkpoint 连接池尚未打开
+        _POOL_SIZE.labels(pool).set(pool_stat["size"])
+        _POOL_IN_USE.labels(pool).set(pool_stat["in_use"])
+        _POOL_WAITING.labels(pool).set(pool_stat["waiting"])
+        _POOL_MAX.labels(pool).set(pool_stat["max_size"])
+
+
+metrics.add_collector(_collect_pool_gauges)
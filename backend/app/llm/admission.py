@@ -0,0 +1,278 @@
+"""LLM 准入控制 - 按 (提供商, 模型) 限制调用速率与并发
+
+- 令牌桶限制每秒发起的调用数（允许一定突发），信号量限制同时进行的调用数
+- 排队严格先进先出：有人排队时，新请求不会绕过队列直接获得名额
+- 根据排队长度、令牌余量和近期调用耗时估算等待时间，超过排队截止时间时立即拒绝（LLMOverloadedError，
+  路由层转换为 429 + Retry-After），已排队的请求等待超过截止时间同样会被拒绝
+- 限制作用在 LLMFactory 创建的模型实例内部（异步生成与流式调用），流式调用在整个输出期间占用并发名额
+- 限制配置随 models.json 重新加载：配置版本变化时原地更新限制器的限制，进行中与排队中的调用不受影响
+"""
+import asyncio
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from time import monotonic, perf_counter
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple, Type
+from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import Field
+from app.core.metrics import metrics
+
+_QUEUE_DEPTH = metrics.gauge(
+    "llm_admission_queue_depth", "等待 LLM 调用名额的请求数", labelnames=("provider", "model")
+)
+_IN_FLIGHT = metrics.gauge(
+    "llm_admission_in_flight", "进行中的 LLM 调用数", labelnames=("provider", "model")
+)
+_WAIT_SECONDS = metrics.histogram(
+    "llm_admission_wait_seconds", "LLM 调用排队等待时间（秒）", labelnames=("provider", "model")
+)
+_REJECTED = metrics.counter(
+    "llm_admission_rejected_total", "因排队超限被拒绝的 LLM 调用数", labelnames=("provider", "model", "reason")
+)
+
+# 调用耗时的指数滑动平均系数（用于估算并发名额的释放速度）
+_DURATION_EWMA_ALPHA = 0.2
+
+
+class LLMOverloadedError(Exception):
+    """LLM 调用无法在排队截止时间内获得名额"""
+
+    def __init__(self, provider: str, model: str, retry_after: float):
+        self.provider = provider
+        self.model = model
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"模型 {provider}/{model} 当前请求过多，请 {self.retry_after} 秒后重试")
+
+
+@dataclass(frozen=True)
+class LLMLimits:
+    """单个 (提供商, 模型) 的调用限制"""
+    requests_per_second: float  # 令牌桶填充速率（<=0 不限速）
+    burst: int  # 令牌桶容量（允许的突发调用数）
+    max_concurrency: int  # 最大并发调用数（<=0 不限制）
+    max_queue_wait: float  # 排队截止时间（秒）
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], defaults: "LLMLimits") -> "LLMLimits":
+        """从 models.json 的 limits 配置创建，未配置的项使用 defaults"""
+        return cls(
+            requests_per_second=float(data.get("requests_per_second", defaults.requests_per_second)),
+            burst=int(data.get("burst", defaults.burst)),
+            max_concurrency=int(data.get("max_concurrency", defaults.max_concurrency)),
+            max_queue_wait=float(data.get("max_queue_wait", defaults.max_queue_wait)),
+        )
+
+
+class AdmissionLimiter:
+    """单个 (提供商, 模型) 的令牌桶 + 并发限制，等待者先进先出"""
+
+    def __init__(self, provider: str, model: str, limits: LLMLimits):
+        self.provider = provider
+        self.model = model
+        self.limits = limits
+        self._tokens = float(max(1, limits.burst))
+        self._refilled_at = monotonic()
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._queued = 0
+        self._avg_duration = 0.0  # 近期调用耗时（秒），尚无样本时为 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._queue_gauge = _QUEUE_DEPTH.labels(provider, model)
+        self._in_flight_gauge = _IN_FLIGHT.labels(provider, model)
+        self._wait_histogram = _WAIT_SECONDS.labels(provider, model)
+
+    def update_limits(self, limits: LLMLimits):
+        """更新限制（配置重新加载后调用），令牌余量不超过新的桶容量"""
+        self._refill()
+        self.limits = limits
+        self._tokens = min(self._tokens, float(max(1, limits.burst)))
+
+    # ---------- 令牌桶 ----------
+
+    def _refill(self):
+        if self.limits.requests_per_second <= 0:
+            return
+        now = monotonic()
+        self._tokens = min(
+            float(max(1, self.limits.burst)),
+            self._tokens + (now - self._refilled_at) * self.limits.requests_per_second
+        )
+        self._refilled_at = now
+
+    def _token_delay(self) -> float:
+        """距离下一个令牌可用的时间（秒）"""
+        if self.limits.requests_per_second <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.limits.requests_per_second
+
+    def _has_slot(self) -> bool:
+        return self.limits.max_concurrency <= 0 or self._in_flight < self.limits.max_concurrency
+
+    def _admit(self):
+        if self.limits.requests_per_second > 0:
+            self._tokens -= 1
+        self._in_flight += 1
+        self._in_flight_gauge.set(self._in_flight)
+
+    # ---------- 准入 ----------
+
+    def estimate_wait(self) -> float:
+        """估算新请求排到队尾后需要等待的时间（秒）"""
+        position = self._queued + 1
+        rate_wait = 0.0
+        if self.limits.requests_per_second > 0:
+            self._refill()
+            rate_wait = max(0.0, (position - self._tokens) / self.limits.requests_per_second)
+
+        concurrency_wait = 0.0
+        if self.limits.max_concurrency > 0:
+            free = self.limits.max_concurrency - self._in_flight
+            if position > free:
+                rounds = math.ceil((position - free) / self.limits.max_concurrency)
+                concurrency_wait = rounds * self._avg_duration
+        return max(rate_wait, concurrency_wait)
+
+    def check(self):
+        """预计等待超过排队截止时间时立即拒绝"""
+        estimate = self.estimate_wait()
+        if estimate > self.limits.max_queue_wait:
+            _REJECTED.labels(self.provider, self.model, "estimate").inc()
+            raise LLMOverloadedError(self.provider, self.model, estimate - self.limits.max_queue_wait)
+
+    async def acquire(self):
+        """获取一个调用名额（排队等待，超过截止时间抛出 LLMOverloadedError）"""
+        self.check()
+        started = perf_counter()
+        if not self._queued and self._has_slot() and self._token_delay() == 0:
+            self._admit()
+            self._wait_histogram.observe(0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued += 1
+        self._queue_gauge.set(self._queued)
+        self._dispatch()
+        try:
+            async with asyncio.timeout(self.limits.max_queue_wait):
+                await waiter
+        except TimeoutError:
+            if not waiter.done() or waiter.cancelled():
+                _REJECTED.labels(self.provider, self.model, "deadline").inc()
+                raise LLMOverloadedError(self.provider, self.model, self.estimate_wait())
+            # 截止时间到达的同时获得了名额，照常执行
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self._queued -= 1
+            self._queue_gauge.set(self._queued)
+            self._wait_histogram.observe(perf_counter() - started)
+
+    def release(self, duration: Optional[float] = None):
+        """归还调用名额，并唤醒排在最前面的等待者"""
+        self._in_flight -= 1
+        self._in_flight_gauge.set(self._in_flight)
+        if duration is not None:
+            self._avg_duration = (
+                duration if self._avg_duration == 0
+                else self._avg_duration + _DURATION_EWMA_ALPHA * (duration - self._avg_duration)
+            )
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """在名额内执行一次调用"""
+        await self.acquire()
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.release(perf_counter() - started)
+
+    def _dispatch(self):
+        """按先后顺序把名额分配给等待者"""
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.done():  # 已取消或超时
+                self._waiters.popleft()
+                continue
+            if not self._has_slot():
+                return
+            delay = self._token_delay()
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            self._waiters.popleft()
+            self._admit()
+            waiter.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+class LLMAdmission:
+    """准入限制器注册表 - 每个 (提供商, 模型) 一个限制器"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], AdmissionLimiter] = {}
+        self._versions: Dict[Tuple[str, str], Any] = {}  # 读取限制时的配置版本
+
+    def get(
+        self, provider: str, model: str, load_limits: Callable[[], LLMLimits], version: Any = None
+    ) -> AdmissionLimiter:
+        """获取限制器（首次创建或配置版本变化时调用 load_limits 读取限制配置）"""
+        key = (provider, model)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = AdmissionLimiter(provider, model, load_limits())
+            self._versions[key] = version
+        elif self._versions.get(key) != version:
+            limiter.update_limits(load_limits())
+            self._versions[key] = version
+        return limiter
+
+
+class AdmissionControlledChatModel(BaseChatModel):
+    """在模型的异步调用外层加上准入控制（与具体模型类组合使用，见 admission_controlled）
+
+    同步调用（_generate / _stream）不经过限制器。
+    """
+
+    admission_limiter: Optional[AdmissionLimiter] = Field(default=None, exclude=True)
+
+    async def _agenerate(self, *args, **kwargs):
+        if self.admission_limiter is None:
+            return await super()._agenerate(*args, **kwargs)
+        async with self.admission_limiter.slot():
+            return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        if self.admission_limiter is None:
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+            return
+        async with self.admission_limiter.slot():
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+
+_CONTROLLED_CLASSES: Dict[Type[BaseChatModel], Type[BaseChatModel]] = {}
+
+
+def admission_controlled(model_cls: Type[BaseChatModel]) -> Type[BaseChatModel]:
+    """返回带准入控制的模型类（model_cls 的子类，接受 admission_limiter 参数）"""
+    controlled = _CONTROLLED_CLASSES.get(model_cls)
+    if controlled is None:
+        controlled = type(f"AdmissionControlled{model_cls.__name__}", (AdmissionControlledChatModel, model_cls), {})
+        _CONTROLLED_CLASSES[model_cls] = controlled
+    return controlled
+
+
+# 全局实例
+llm_admission = LLMAdmission()
@@ -0,0 +1,208 @@
+"""
+脚本化的假聊天模型 - 用于离线基准测试和本地调试
+
+按固定速率逐个输出确定的 token，并可按配置的模式发起工具调用，
+不访问任何外部服务，便于单独测量 Agent 流水线自身的开销。
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Sequence
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# 回答文本的基础片段（每个 token 固定 TOKEN_CHARS 个字符，便于按字符数折算 token 数）
+_ANSWER_TEXT = (
+    "根据检索到的信息，这个问题可以从以下几个方面来理解。首先需要明确问题的背景和约束条件，"
+    "然后分析各个方案的优缺点，最后结合实际情况给出建议。总体来看，选择合适的方案需要综合考虑"
+    "性能、成本、可维护性以及团队的经验。"
+)
+TOKEN_CHARS = 2
+
+# 工具调用模式
+TOOL_CALL_PATTERNS = ("none", "single", "parallel", "sequential")
+
+
+class ScriptedFakeChatModel(BaseChatModel):
+    """脚本化的假聊天模型
+
+    - tool_call_pattern:
+        none        直接回答
+        single      第一轮调用一个工具，拿到结果后回答
+        parallel    第一轮同时调用 tool_calls_per_turn 个工具，拿到结果后回答
+        sequential  连续 tool_rounds 轮各调用一个工具，之后回答
+    - 工具按 bind_tools 绑定的顺序轮流选择（可用 tool_names 限定）
+    """
+
+    model_name: str = "fake-scripted"
+    tokens_per_second: float = 50.0  # 输出速率，<= 0 表示不限速
+    first_token_latency: float = 0.0  # 首个 token 之前的额外延迟（秒）
+    response_tokens: int = 200  # 每次回答的 token 数
+    tool_call_pattern: str = "none"
+    tool_calls_per_turn: int = 2  # parallel 模式每轮的工具调用数
+    tool_rounds: int = 2  # sequential 模式的工具调用轮数
+    tool_names: Optional[List[str]] = None  # 只调用这些工具（默认使用全部绑定的工具）
+    tool_query: str = "基准测试查询"  # 工具调用的输入参数
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "tokens_per_second": self.tokens_per_second,
+            "response_tokens": self.response_tokens,
+            "tool_call_pattern": self.tool_call_pattern,
+        }
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Any] = None, **kwargs: Any):
+        """与真实模型一样，把工具定义作为调用参数绑定"""
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    # ---------- 脚本 ----------
+
+    def _completed_tool_rounds(self, messages: List[BaseMessage]) -> int:
+        """统计本轮用户消息之后已经发起过的工具调用轮数"""
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.tool_calls:
+                rounds += 1
+        return rounds
+
+    def _planned_tool_calls(self, messages: List[BaseMessage], tools: List[Dict]) -> List[Dict]:
+        """根据调用模式决定本次是否发起工具调用"""
+        if self.tool_names:
+            tools = [t for t in tools if t["function"]["name"] in self.tool_names]
+        if not tools or self.tool_call_pattern == "none":
+            return []
+
+        completed = self._completed_tool_rounds(messages)
+        if self.tool_call_pattern == "sequential":
+            if completed >= self.tool_rounds:
+                return []
+            count = 1
+        else:
+            if completed >= 1:
+                return []
+            count = self.tool_calls_per_turn if self.tool_call_pattern == "parallel" else 1
+
+        tool_calls = []
+        for i in range(count):
+            function = tools[(completed + i) % len(tools)]["function"]
+            properties = function.get("parameters", {}).get("properties", {})
+            arg_name = next(iter(properties), "query")
+            tool_calls.append({
+                "name": function["name"],
+                "args": {arg_name: self.tool_query},
+                "id": f"call_{completed}_{i}",
+                "type": "tool_call",
+            })
+        return tool_calls
+
+    def _answer_tokens(self) -> List[str]:
+        """生成确定的回答 token 序列"""
+        text = _ANSWER_TEXT * (self.response_tokens * TOKEN_CHARS // len(_ANSWER_TEXT) + 1)
+        return [text[i * TOKEN_CHARS:(i + 1) * TOKEN_CHARS] for i in range(self.response_tokens)]
+
+    def _token_interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    # ---------- 生成 ----------
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tool_calls = self._planned_tool_calls(messages, kwargs.get("tools") or [])
+        if tool_calls:
+            message = AIMessage(content="", tool_calls=tool_calls)
+        else:
+            tokens = self._answer_tokens()
+            time.sleep(self.first_token_latency + self._token_interval() * len(tokens))
+            message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tool_calls = self._planned_tool_calls(messages, kwargs.get("tools") or [])
+        if tool_calls:
+            message = AIMessage(content="", tool_calls=tool_calls)
+        else:
+            tokens = self._answer_tokens()
+            await asyncio.sleep(self.first_token_latency + self._token_interval() * len(tokens))
+            message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tool_calls = self._planned_tool_calls(messages, kwargs.get("tools") or [])
+        if tool_calls:
+            yield self._tool_call_chunk(tool_calls)
+            return
+
+        interval = self._token_interval()
+        time.sleep(self.first_token_latency)
+        for token in self._answer_tokens():
+            if interval:
+                time.sleep(interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tool_calls = self._planned_tool_calls(messages, kwargs.get("tools") or [])
+        if tool_calls:
+            yield self._tool_call_chunk(tool_calls)
+            return
+
+        # 按绝对时间排布 token，避免 sleep 误差在高并发下累积
+        interval = self._token_interval()
+        loop = asyncio.get_running_loop()
+        start = loop.time() + self.first_token_latency
+        for i, token in enumerate(self._answer_tokens()):
+            delay = start + interval * (i + 1) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    @staticmethod
+    def _tool_call_chunk(tool_calls: List[Dict]) -> ChatGenerationChunk:
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {
+                    "name": call["name"],
+                    "args": json.dumps(call["args"], ensure_ascii=False),
+                    "id": call["id"],
+                    "index": i,
+                    "type": "tool_call_chunk",
+                }
+                for i, call in enumerate(tool_calls)
+            ]
+        ))
+
@@ -0,0 +1,293 @@
+"""LLM 路由 - 对冲请求（hedged request）、故障转移与按提供商的熔断
+
+- HedgedChatModel 先把请求发给主模型；对冲延迟内没有收到首个输出块时，再向备用模型（models.json 的 routing 配置）
+  发出同样的请求，谁先输出就采用谁，另一个立即取消
+- 主模型在输出首个块之前失败（包括准入排队超限）时，立即转到备用模型
+- 每个提供商一个熔断器：滚动窗口内错误率或慢响应（首块耗时）比例过高时熔断，冷却期内请求直接走备用模型，
+  冷却结束后放行一个探测请求，成功则恢复
+"""
+import asyncio
+from collections import deque
+from time import monotonic, perf_counter
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from loguru import logger
+from app.core.config import settings
+from app.core.metrics import metrics
+
+_BREAKER_STATE = metrics.gauge(
+    "llm_circuit_breaker_state", "LLM 提供商熔断器状态（0 关闭，1 熔断，2 半开）", labelnames=("provider",)
+)
+_ROUTING = metrics.counter(
+    "llm_routing_total", "LLM 路由结果", labelnames=("primary", "outcome")
+)
+
+_CLOSED, _OPEN, _HALF_OPEN = 0, 1, 2
+
+
+class CircuitBreaker:
+    """按提供商的熔断器（滚动窗口统计错误率和慢响应比例）"""
+
+    def __init__(
+        self,
+        name: str,
+        window: float,
+        min_requests: int,
+        error_rate: float,
+        slow_threshold: float,
+        slow_rate: float,
+        cooldown: float
+    ):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_threshold = slow_threshold
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self._samples: Deque[Tuple[float, bool, bool]] = deque()  # (时间, 是否出错, 是否慢)
+        self._state = _CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._gauge = _BREAKER_STATE.labels(name)
+
+    @property
+    def state(self) -> str:
+        return ("closed", "open", "half_open")[self._state]
+
+    def allow(self) -> bool:
+        """是否允许向该提供商发请求（熔断冷却结束后只放行一个探测请求）"""
+        if self._state == _CLOSED:
+            return True
+        if self._state == _OPEN and monotonic() - self._opened_at >= self.cooldown:
+            self._set_state(_HALF_OPEN)
+            self._probing = False
+        if self._state == _HALF_OPEN and (not self._probing or monotonic() - self._probe_started >= self.cooldown):
+            # 探测请求没有结果（如被取消）时，冷却时间后再放行一个
+            self._probing = True
+            self._probe_started = monotonic()
+            return True
+        return False
+
+    def record_success(self, latency: float):
+        """记录一次成功（latency 为首个输出块的耗时）"""
+        if self._state == _HALF_OPEN:
+            logger.info(f"Circuit breaker {self.name} closed after successful probe")
+            self._samples.clear()
+            self._set_state(_CLOSED)
+        self._add(error=False, slow=latency >= self.slow_threshold)
+
+    def record_failure(self):
+        """记录一次失败"""
+        if self._state == _HALF_OPEN:
+            self._trip()
+            return
+        self._add(error=True, slow=False)
+
+    def _add(self, error: bool, slow: bool):
+        now = monotonic()
+        self._samples.append((now, error, slow))
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+        if self._state != _CLOSED or len(self._samples) < self.min_requests:
+            return
+        total = len(self._samples)
+        errors = sum(1 for _, e, _ in self._samples if e)
+        slow_count = sum(1 for _, _, s in self._samples if s)
+        if errors / total >= self.error_rate or slow_count / total >= self.slow_rate:
+            logger.warning(
+                f"Circuit breaker {self.name} opened: {errors}/{total} errors, {slow_count}/{total} slow "
+                f"in the last {self.window:g}s"
+            )
+            self._trip()
+
+    def _trip(self):
+        self._opened_at = monotonic()
+        self._probing = False
+        self._set_state(_OPEN)
+
+    def _set_state(self, state: int):
+        self._state = state
+        self._gauge.set(state)
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """获取提供商的熔断器（进程内共享）"""
+    breaker = _BREAKERS.get(provider)
+    if breaker is None:
+        breaker = _BREAKERS[provider] = CircuitBreaker(
+            provider,
+            window=settings.LLM_BREAKER_WINDOW,
+            min_requests=settings.LLM_BREAKER_MIN_REQUESTS,
+            error_rate=settings.LLM_BREAKER_ERROR_RATE,
+            slow_threshold=settings.LLM_BREAKER_SLOW_TTFT,
+            slow_rate=settings.LLM_BREAKER_SLOW_RATE,
+            cooldown=settings.LLM_BREAKER_COOLDOWN
+        )
+    return breaker
+
+
+class _Attempt:
+    """向某个模型发出的一次流式请求（首个输出块在独立任务中获取，便于和其他请求竞速）"""
+
+    def __init__(self, label: str, provider: str, stream: AsyncIterator[ChatGenerationChunk]):
+        self.label = label
+        self.breaker = get_circuit_breaker(provider)
+        self.stream = stream
+        self.started = perf_counter()
+        self.first: Optional[asyncio.Future] = asyncio.ensure_future(stream.__anext__())  # 取得结果后置为 None
+
+    async def close(self):
+        if self.first is not None and not self.first.done():
+            self.first.cancel()
+            try:
+                await self.first
+            except BaseException:
+                pass
+        await self.stream.aclose()
+
+
+class HedgedChatModel(BaseChatModel):
+    """主/备模型对冲请求的组合模型（异步流式调用；同步调用只使用主模型）"""
+
+    primary: BaseChatModel
+    secondary: BaseChatModel
+    primary_provider: str
+    secondary_provider: str
+    hedge_delay: float = 3.0  # 主模型首块超过该时间（秒）未到达时发出对冲请求
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "primary": self.primary_provider,
+            "secondary": self.secondary_provider,
+            "hedge_delay": self.hedge_delay
+        }
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any):
+        # 回调中的 ls_model_name 等标识使用主模型的，按模型统计的指标（提示词用量等）才有意义
+        return self.primary._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        formatted_tools = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=formatted_tools, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return self.primary._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        route = self.primary_provider
+        primary = ("primary", self.primary_provider, self.primary)
+        secondary = ("secondary", self.secondary_provider, self.secondary)
+        backups = [secondary]
+        outcome: Optional[str] = None  # 每个请求只计一次路由结果
+        if not get_circuit_breaker(self.primary_provider).allow():
+            backups = []
+            if get_circuit_breaker(self.secondary_provider).allow():
+                outcome = "breaker_open"
+                logger.info(f"Provider {self.primary_provider} circuit open, routing to {self.secondary_provider}")
+                primary = secondary
+            # 主备都在熔断中时仍然尝试主模型，而不是直接拒绝
+
+        def start(label: str, provider: str, model: BaseChatModel) -> _Attempt:
+            return _Attempt(label, provider, model._astream(messages, stop=stop, **kwargs))
+
+        def take_backup() -> Optional[Tuple[str, str, BaseChatModel]]:
+            # 真正要发出请求时才询问熔断器，避免占用半开状态的探测名额
+            while backups:
+                candidate = backups.pop(0)
+                if get_circuit_breaker(candidate[1]).allow():
+                    return candidate
+            return None
+
+        attempts = [start(*primary)]
+        winner: Optional[_Attempt] = None
+        first_chunk: Optional[ChatGenerationChunk] = None
+        last_error: Optional[BaseException] = None
+
+        try:
+            while winner is None:
+                pending = {a.first: a for a in attempts if a.first is not None}
+                if not pending:
+                    _ROUTING.labels(route, "error").inc()
+                    raise last_error
+                timeout = self.hedge_delay if backups else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 主模型首块超时：发出对冲请求
+                    backup = take_backup()
+                    if backup is not None:
+                        logger.info(f"No first token from {attempts[0].label} within {self.hedge_delay}s, hedging")
+                        attempts.append(start(*backup))
+                        outcome = outcome or "hedge"
+                    continue
+
+                for attempt in attempts:
+                    if attempt.first not in done:
+                        continue
+                    future, attempt.first = attempt.first, None
+                    try:
+                        first_chunk = future.result()
+                    except StopAsyncIteration:
+                        first_chunk = None
+                    except Exception as e:
+                        last_error = e
+                        attempt.breaker.record_failure()
+                        logger.warning(f"LLM {attempt.label} request failed before first token: {e}")
+                        backup = take_backup()
+                        if backup is not None:
+                            # 首块之前失败：立即转到备用模型
+                            attempts.append(start(*backup))
+                            outcome = "failover"
+                        continue
+                    winner = attempt
+                    break
+
+            winner.breaker.record_success(perf_counter() - winner.started)
+            for attempt in attempts:
+                if attempt is not winner and attempt.first is not None:
+                    # 输掉竞速的请求：按已等待的时间计入慢响应统计
+                    attempt.breaker.record_success(perf_counter() - attempt.started)
+            if outcome == "hedge":
+                outcome = f"hedge_{winner.label}_won"
+            _ROUTING.labels(route, outcome or winner.label).inc()
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.close()
+
+            if first_chunk is None:
+                return
+            yield first_chunk
+            try:
+                async for chunk in winner.stream:
+                    yield chunk
+            except Exception:
+                winner.breaker.record_failure()
+                raise
+        finally:
+            for attempt in attempts:
+                await attempt.close()
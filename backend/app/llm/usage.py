@@ -0,0 +1,72 @@
+"""LLM 用量统计 - 从提供商返回的用量信息中读取提示词 token 数与前缀缓存命中的 token 数
+
+系统提示词的静态部分在最前面（见 PromptBuilder.build_agent_system_prompt），提供商（DashScope、OpenAI）
+会自动缓存相同的提示词前缀，命中部分在用量信息中单独列出：
+- langchain 标准字段：AIMessage.usage_metadata["input_token_details"]["cache_read"]
+- OpenAI 兼容字段：token_usage["prompt_tokens_details"]["cached_tokens"]（位于 llm_output 或 generation_info）
+命中的 token 数写入 /metrics，命中率 = llm_prompt_cache_hit_tokens_total / llm_prompt_tokens_total
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from langchain_core.outputs import LLMResult
+from app.core.metrics import metrics
+
+_PROMPT_TOKENS = metrics.counter(
+    "llm_prompt_tokens_total", "LLM 调用的提示词 token 数（提供商返回）", labelnames=("model",)
+)
+_CACHE_HIT_TOKENS = metrics.counter(
+    "llm_prompt_cache_hit_tokens_total", "命中提供商前缀缓存的提示词 token 数", labelnames=("model",)
+)
+
+
+@dataclass
+class PromptUsage:
+    """一次 LLM 调用的提示词用量"""
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+
+def _from_token_usage(token_usage: Dict[str, Any]) -> PromptUsage:
+    """解析 OpenAI 兼容格式的 token_usage（DashScope 的用量信息字段相同）"""
+    details = token_usage.get("prompt_tokens_details") or {}
+    return PromptUsage(
+        prompt_tokens=int(token_usage.get("prompt_tokens", token_usage.get("input_tokens", 0)) or 0),
+        cached_tokens=int(details.get("cached_tokens", token_usage.get("cached_tokens", 0)) or 0)
+    )
+
+
+def prompt_usage(response: LLMResult) -> Optional[PromptUsage]:
+    """从 LLM 调用结果中读取提示词用量，提供商没有返回用量信息时返回 None"""
+    usage = PromptUsage()
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage_metadata:
+                usage.prompt_tokens += usage_metadata.get("input_tokens", 0)
+                usage.cached_tokens += (usage_metadata.get("input_token_details") or {}).get("cache_read", 0)
+                found = True
+                continue
+            token_usage = (generation.generation_info or {}).get("token_usage")
+            if token_usage:
+                parsed = _from_token_usage(token_usage)
+                usage.prompt_tokens += parsed.prompt_tokens
+                usage.cached_tokens += parsed.cached_tokens
+                found = True
+    if found:
+        return usage
+
+    token_usage = (response.llm_output or {}).get("token_usage")
+    if token_usage:
+        return _from_token_usage(token_usage)
+    return None
+
+
+def record_prompt_usage(response: LLMResult, model: str) -> Optional[PromptUsage]:
+    """读取提示词用量并写入指标"""
+    usage = prompt_usage(response)
+    if usage is not None and usage.prompt_tokens:
+        _PROMPT_TOKENS.labels(model).inc(usage.prompt_tokens)
+        if usage.cached_tokens:
+            _CACHE_HIT_TOKENS.labels(model).inc(usage.cached_tokens)
+    return usage
@@ -1,12 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from loguru import logger
+import asyncio
 import sys
 
+from app.core.cache import shared_cache
 from app.core.config import settings
-from app.db.database import engine, Base
-from app.api.routes import chat, knowledge, tasks
+from app.core.metrics import metrics
+from app.db.pool import close_pools
+from app.llm.admission import LLMOverloadedError
+from app.services.warmup import run_warmup, warmup_state
+from app.services.tools.runtime import tool_runtime
+from app.services.chunking import text_chunker
+from app.api.routes import chat, knowledge, tasks, system
 
 
 # 配置日志
@@ -24,17 +32,19 @@ async def lifespan(app: FastAPI):
     # 启动时
     logger.info("Starting Agent System API...")
     
-    # 创建数据库表
-    try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {e}")
+    # 后台预热（建表、连接池、checkpoint、Embedding 模型、工具），不阻塞启动
+    warmup_task = asyncio.create_task(run_warmup())
     
     yield
     
     # 关闭时
     logger.info("Shutting down Agent System API...")
+    if not warmup_task.done():
+        warmup_task.cancel()
+    await tool_runtime.shutdown()
+    text_chunker.shutdown()
+    await close_pools()
+    await shared_cache.aclose()
 
 
 # 创建FastAPI应用
@@ -51,12 +61,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Stream-Id", "X-Next-Cursor", "X-Total-Count-Approximate"],
 )
 
 # 注册路由
 app.include_router(chat.router, prefix="/api")
 app.include_router(knowledge.router, prefix="/api")
 app.include_router(tasks.router, prefix="/api")
+app.include_router(system.router, prefix="/api")
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    """LLM 调用排队超限：返回 429，并通过 Retry-After 告知客户端何时重试"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/")
@@ -71,13 +93,32 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查"""
+    """健康检查（必需的预热阶段完成前或失败时返回 503，作为就绪检查）"""
+    if not warmup_state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "unavailable" if warmup_state.failed else "starting",
+                "service": "agent-system-api",
+                "warmup": warmup_state.as_dict()
+            }
+        )
     return {
         "status": "healthy",
-        "service": "agent-system-api"
+        "service": "agent-system-api",
+        "warmup": warmup_state.as_dict()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus 指标（各阶段耗时、连接池等待等）"""
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,9 +1,10 @@
 """Agent 相关模块"""
 from .role_preset_retriever import RolePresetRetriever
 from .prompt_builder import PromptBuilder
+from .tool_middleware import ParallelToolCallMiddleware
 
 __all__ = [
     "RolePresetRetriever",
-    "PromptBuilder"
+    "PromptBuilder",
+    "ParallelToolCallMiddleware"
 ]
-
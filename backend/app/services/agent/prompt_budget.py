@@ -0,0 +1,183 @@
+"""提示词预算 - 统计系统提示词各部分的 token 数，并按优先级裁剪到模型的预算内
+
+- token 计数使用 tiktoken（编码器只加载一次，计数结果按文本缓存）；编码文件不可用时退化为按字符估算。
+  首次加载会从网络下载编码文件，由启动预热在线程中完成；离线部署需预先下载到 TIKTOKEN_CACHE_DIR
+- 每个部分有优先级：超出预算时从优先级最低的部分开始裁剪，必需部分（priority=None）不裁剪
+- 裁剪方式：tail 保留开头（如角色预设），head 按行保留最近的内容（如对话历史）；
+  裁剪后不足 min_tokens 的部分整体去掉，避免留下无意义的片段
+- 各部分的 token 数和裁剪量写入 /metrics
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+from app.core.config import settings
+from app.core.metrics import metrics
+
+_SECTION_TOKENS = metrics.histogram(
+    "prompt_section_tokens",
+    "系统提示词各部分的 token 数（裁剪后）",
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+    labelnames=("section",)
+)
+_TRIMMED_TOKENS = metrics.counter(
+    "prompt_trimmed_tokens_total", "因超出预算被裁剪的提示词 token 数", labelnames=("section",)
+)
+_DROPPED_SECTIONS = metrics.counter(
+    "prompt_sections_dropped_total", "因超出预算被整体去掉的提示词部分数", labelnames=("section",)
+)
+
+_TRUNCATION_MARK = "…（已截断）"
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """加载 tiktoken 编码器（失败时返回 None，使用估算）"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.PROMPT_TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"Failed to load tokenizer {settings.PROMPT_TOKENIZER_ENCODING}, estimating token counts: {e}")
+        return None
+
+
+def load_tokenizer():
+    """加载 tiktoken 编码器（启动预热时调用，避免首个请求下载编码文件），不可用时抛出 RuntimeError"""
+    if _encoding() is None:
+        raise RuntimeError(f"tokenizer {settings.PROMPT_TOKENIZER_ENCODING} unavailable, token counts are estimated")
+
+
+def _count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # 估算：中日韩字符约 1 token/字，其余约 4 字符/token
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """统计文本的 token 数（按文本缓存，固定的提示词部分只编码一次）"""
+    return _count_tokens(text)
+
+
+def _longest_fitting(length: int, fits: Callable[[int], bool]) -> int:
+    """二分查找满足 fits 的最大长度"""
+    low, high = 0, length
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+@dataclass
+class PromptSection:
+    """系统提示词的一个部分（header + body + footer，裁剪只作用于 body）"""
+    name: str
+    body: str
+    priority: Optional[int] = None  # 数值越大越重要；None 表示必需，不裁剪
+    trim: str = "tail"  # tail: 保留开头；head: 按行保留结尾
+    min_tokens: int = 0  # 裁剪后 body 少于该 token 数时整体去掉
+    header: str = ""
+    footer: str = ""
+
+    @property
+    def text(self) -> str:
+        return f"{self.header}{self.body}{self.footer}" if self.body else ""
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.text)
+
+
+@dataclass
+class PromptBudgetResult:
+    """预算分配结果"""
+    prompt: str
+    budget: int
+    total_tokens: int
+    sections: Dict[str, Dict[str, int]] = field(default_factory=dict)  # name -> {tokens, trimmed}
+
+
+class PromptBudgetManager:
+    """按 token 预算组装系统提示词"""
+
+    def fit(self, sections: List[PromptSection], budget: int) -> PromptBudgetResult:
+        """按顺序拼接各部分，超出预算时按优先级从低到高裁剪"""
+        original = {s.name: s.tokens for s in sections}
+        overflow = sum(original.values()) - budget
+
+        for section in sorted((s for s in sections if s.priority is not None), key=lambda s: s.priority):
+            if overflow <= 0:
+                break
+            before = section.tokens
+            if before == 0:
+                continue
+            self._shrink(section, max(0, before - overflow))
+            overflow -= before - section.tokens
+
+        if overflow > 0:
+            logger.warning(f"System prompt exceeds budget by {overflow} tokens after trimming (budget {budget})")
+
+        result = PromptBudgetResult(prompt="".join(s.text for s in sections), budget=budget, total_tokens=0)
+        for section in sections:
+            tokens = section.tokens
+            trimmed = original[section.name] - tokens
+            result.total_tokens += tokens
+            result.sections[section.name] = {"tokens": tokens, "trimmed": trimmed}
+            _SECTION_TOKENS.labels(section.name).observe(tokens)
+            if trimmed:
+                _TRIMMED_TOKENS.labels(section.name).inc(trimmed)
+                if not section.body:
+                    _DROPPED_SECTIONS.labels(section.name).inc()
+        logger.debug(f"System prompt: {result.total_tokens}/{budget} tokens, sections: {result.sections}")
+        return result
+
+    def _shrink(self, section: PromptSection, target: int):
+        """把 section 缩减到不超过 target 个 token"""
+        frame = count_tokens(section.header + section.footer)
+        body_target = target - frame
+        if body_target < max(section.min_tokens, 1):
+            section.body = ""
+            return
+
+        body = section.body
+        if section.trim == "head":
+            section.body = self._keep_tail(body, body_target)
+        else:
+            mark_tokens = count_tokens(_TRUNCATION_MARK)
+            keep = _longest_fitting(len(body), lambda n: _count_tokens(body[:n]) + mark_tokens <= body_target)
+            section.body = body[:keep].rstrip() + _TRUNCATION_MARK if keep else ""
+
+        if _count_tokens(section.body) < section.min_tokens:
+            section.body = ""
+
+    @staticmethod
+    def _keep_tail(body: str, budget: int) -> str:
+        """按行保留结尾（最近的内容），最早的一行放不下时截掉其开头"""
+        lines = body.splitlines(keepends=True)
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            tokens = _count_tokens(line)
+            if used + tokens > budget:
+                remaining = budget - used
+                if remaining > 0 and not kept:
+                    start = len(line) - _longest_fitting(len(line), lambda n: _count_tokens(line[len(line) - n:]) <= remaining)
+                    kept.append(line[start:])
+                break
+            kept.append(line)
+            used += tokens
+        return "".join(reversed(kept))
+
+
+# 全局实例
+prompt_budget_manager = PromptBudgetManager()
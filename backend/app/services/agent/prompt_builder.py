@@ -3,11 +3,66 @@ from typing import List, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
 from langchain_core.tools import Tool
 from loguru import logger
+from app.services.agent.prompt_budget import PromptBudgetResult, PromptSection, prompt_budget_manager
+from app.services.memory.memory_manager import HISTORY_FOOTER, HISTORY_HEADER
+
+# Agent 系统提示词的固定部分
+AGENT_INTRO = "你是一个智能AI助手，可以使用工具来帮助回答问题。"
+AGENT_TOOLS_GUIDE = """
+
+🔧 你可以使用的工具:
+• knowledge_base_search - 从内部知识库检索信息（提示词模板、文档、历史记录）
+• web_search - 联网搜索最新信息、新闻、实时数据、天气（可在页面切换Tavily或百度）
+• web_content_fetcher - 获取指定URL的网页内容
+• pdf_parser - 解析PDF文件内容
+• calculator - 执行数学计算
+
+💡 重要提示:
+1. 当用户询问天气、新闻、股价等实时信息时，必须使用 web_search 工具！
+2. 请用中文回答所有问题，确保答案专业、详细、有条理。
+3. 请参考对话历史，理解用户的意图和上下文，保持对话的连贯性。
+4. 需要多个相互独立的工具时（例如同时联网搜索和检索知识库），请在同一轮中一次性发起所有工具调用。"""
+
+# 静态前缀：不含任何随请求变化的内容，保证逐字节一致
+AGENT_STATIC_PREFIX = AGENT_INTRO + AGENT_TOOLS_GUIDE
+
+# 角色预设被裁剪到少于该 token 数时整体去掉
+ROLE_PRESET_MIN_TOKENS = 100
 
 
 class PromptBuilder:
     """提示词构建器 - 统一管理提示词模板"""
     
+    @staticmethod
+    def build_agent_system_prompt(
+        role_prompts: str = "",
+        history_lines: Optional[List[str]] = None,
+        budget: int = 4000
+    ) -> PromptBudgetResult:
+        """构建 Agent 系统提示词，并裁剪到 token 预算内
+        
+        固定的开头说明和工具说明在最前面，构成逐字节不变的前缀，便于提供商的前缀缓存（KV cache）命中；
+        每个请求不同的角色预设和对话历史追加在其后。
+        超出预算时先按行去掉最早的对话历史，再截断角色预设；开头说明和工具说明始终保留。
+        
+        Args:
+            role_prompts: 角色预设提示词（RolePresetRetriever 的结果）
+            history_lines: 历史消息行（MemoryManager.get_history_lines 的结果）
+            budget: 系统提示词的 token 预算
+        
+        Returns:
+            PromptBudgetResult（prompt 为最终的系统提示词，sections 为各部分的 token 数）
+        """
+        sections = [
+            PromptSection("static", AGENT_STATIC_PREFIX),
+            PromptSection("role_preset", role_prompts, priority=2, trim="tail", min_tokens=ROLE_PRESET_MIN_TOKENS),
+            PromptSection(
+                "history", "".join(history_lines or []), priority=1, trim="head",
+                header=HISTORY_HEADER, footer=HISTORY_FOOTER
+            ),
+        ]
+        return prompt_budget_manager.fit(sections, budget)
+    
     @staticmethod
     def build_react_prompt(
         tools: List[Tool],
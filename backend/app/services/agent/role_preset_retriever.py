@@ -1,13 +1,19 @@
 """角色预设检索器 - 统一处理角色预设检索逻辑"""
 from typing import Optional
 from app.services.knowledge_service import knowledge_service
+from app.services.preset_router import preset_router
+from app.services.role_preset_cache import role_preset_cache
+from app.core.tracing import span, traced
 from loguru import logger
 
+ROLE_PRESET_HEADER = "\n\n📋 角色预设提示（你应遵循这些指导原则）:\n"
+
 
 class RolePresetRetriever:
     """角色预设检索器 - 统一处理角色预设检索逻辑"""
     
     @staticmethod
+    @traced("role_preset.retrieve")
     def retrieve_prompts(
         role_preset_id: Optional[str] = None,
         collection: Optional[str] = None,
@@ -32,22 +38,48 @@ class RolePresetRetriever:
         if role_preset_id and db_session:
             # 直接使用指定预设
             try:
-                preset = knowledge_service.get_role_preset_by_id(db_session, role_preset_id)
-                if preset:
-                    role_prompts = "\n\n📋 角色预设提示（你应遵循这些指导原则）:\n"
-                    role_prompts += f"\n[{preset.get('title', '')}]\n{preset.get('content', '')}\n"
-                    logger.info(f"Using specified role preset: {preset.get('title', '')}")
+                block = role_preset_cache.get_block(
+                    role_preset_id, lambda preset_id: knowledge_service.get_role_preset_by_id(db_session, preset_id)
+                )
+                if block:
+                    role_prompts = ROLE_PRESET_HEADER + "\n" + block
+                    logger.info(f"Using specified role preset: {role_preset_id}")
                 else:
                     logger.warning(f"Role preset with id {role_preset_id} not found")
             except Exception as e:
                 logger.warning(f"Failed to get role preset by id: {e}")
         
+        elif collection and message and db_session:
+            # 根据对话内容选择相关预设（进程内的预设路由，不查询ChromaDB）
+            try:
+                query_embedding = knowledge_service.embed_query(message)
+                with span("role_preset.select"):
+                    preset_router.ensure_loaded(knowledge_service.get_role_preset_chunk_embeddings)
+                    # 多取一些候选，跳过已删除但向量尚未清理的预设
+                    candidates = preset_router.top_k(query_embedding, top_k * 2)
+                blocks = []
+                for preset_id, _ in candidates:
+                    block = role_preset_cache.get_block(
+                        preset_id, lambda pid: knowledge_service.get_role_preset_by_id(db_session, pid)
+                    )
+                    if block:
+                        blocks.append(block)
+                    if len(blocks) >= top_k:
+                        break
+                if blocks:
+                    role_prompts = ROLE_PRESET_HEADER
+                    for idx, block in enumerate(blocks, 1):
+                        role_prompts += f"\n{idx}. {block}"
+                    logger.info(f"Retrieved {len(blocks)} role presets")
+            except Exception as e:
+                logger.warning(f"Failed to search role presets: {e}")
+        
         elif collection and message:
-            # 根据对话内容检索相关预设
+            # 没有数据库会话时按分块检索
             try:
                 search_results = knowledge_service.search("prompts", message, top_k=top_k)
                 if search_results:
-                    role_prompts = "\n\n📋 角色预设提示（你应遵循这些指导原则）:\n"
+                    role_prompts = ROLE_PRESET_HEADER
                     for idx, result in enumerate(search_results, 1):
                         title = result.get('metadata', {}).get('title', '')
                         content = result.get('content', '')
@@ -57,4 +89,3 @@ class RolePresetRetriever:
                 logger.warning(f"Failed to search role presets: {e}")
         
         return role_prompts
-
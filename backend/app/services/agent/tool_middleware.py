@@ -0,0 +1,54 @@
+"""并行工具调用中间件 - 同一步内的多个工具调用并发执行"""
+import asyncio
+from typing import Awaitable, Callable
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse, ToolCallRequest
+from langchain_core.messages import ToolMessage
+from loguru import logger
+
+
+class ParallelToolCallMiddleware(AgentMiddleware):
+    """并行工具调用中间件
+
+    create_agent 会把模型一次返回的多个工具调用分发为同一步内的并发任务，
+    结果按模型给出的顺序写回消息列表。本中间件在此基础上：
+    - 限制同一步内同时执行的工具调用数
+    - 为每个工具调用设置截止时间，超时返回错误消息而不是拖住整步
+    - 提示模型在一轮中一次性发起多个相互独立的工具调用
+    """
+
+    def __init__(self, max_concurrency: int = 4, call_timeout: float = 60.0, parallel_tool_calls: bool = True):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self.call_timeout = call_timeout
+        self.parallel_tool_calls = parallel_tool_calls
+        # 每个Agent实例一个信号量，Agent按请求创建，因此相当于按步限流
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        if self.parallel_tool_calls and request.tools:
+            request = request.override(
+                model_settings={**request.model_settings, "parallel_tool_calls": True}
+            )
+        return await handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage]],
+    ) -> ToolMessage:
+        tool_call = request.tool_call
+        try:
+            async with self._semaphore:
+                return await asyncio.wait_for(handler(request), timeout=self.call_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool call {tool_call['name']} ({tool_call['id']}) exceeded deadline of {self.call_timeout}s")
+            return ToolMessage(
+                content=f"工具 {tool_call['name']} 执行超过 {self.call_timeout:g} 秒未完成，已放弃本次调用",
+                tool_call_id=tool_call["id"],
+                name=tool_call["name"],
+                status="error"
+            )
@@ -3,17 +3,20 @@ from langchain_core.tools import Tool
 from langchain_core.messages import HumanMessage, AIMessage
 from typing import List, Dict, Optional, AsyncIterator, Any
 import asyncio
+import time
 from app.core.config import settings
+from app.core.tracing import record, span
 from app.services.knowledge_service import knowledge_service
 from app.services.llm_factory import llm_factory
-from app.services.agent import RolePresetRetriever
+from app.services.agent import RolePresetRetriever, PromptBuilder, ParallelToolCallMiddleware
 from app.services.memory import MemoryManager
 from app.services.streaming import StreamCallbackHandler
 from app.services.tools import (
-    create_web_search_tool,
-    web_scraper_tool,
-    pdf_parser_tool,
-    knowledge_retrieval_tool
+    get_calculator_tool,
+    get_web_search_tool,
+    get_web_scraper_tool,
+    get_pdf_parser_tool,
+    get_knowledge_retrieval_tool
 )
 from app.api.schemas import AgentConfig
 from loguru import logger
@@ -23,8 +26,15 @@ class AgentService:
     """Agent服务 - 处理问答和推理规划"""
     
     def __init__(self):
-        # 初始化默认LLM
-        self.llm = llm_factory.create_llm()
+        # 默认LLM延迟初始化（避免导入模块时就创建客户端）
+        self._llm = None
+    
+    @property
+    def llm(self):
+        """默认LLM实例（首次使用时创建）"""
+        if self._llm is None:
+            self._llm = llm_factory.create_llm()
+        return self._llm
     
     def _get_llm(self, provider: Optional[str] = None, model: Optional[str] = None, streaming: bool = False):
         """获取LLM实例"""
@@ -44,34 +54,15 @@ class AgentService:
             search_provider: 搜索提供商，可选值: 'tavily', 'baidu', None(默认使用tavily)
         """
         
-        def calculator_tool(expression: str) -> str:
-            """计算数学表达式"""
-            try:
-                # 安全的数学计算
-                import math
-                allowed_names = {
-                    k: v for k, v in math.__dict__.items() 
-                    if not k.startswith("__")
-                }
-                result = eval(expression, {"__builtins__": {}}, allowed_names)
-                return f"计算结果: {result}"
-            except Exception as e:
-                return f"计算错误: {str(e)}"
-        
-        tools = [
-            Tool(
-                name="calculator",
-                func=calculator_tool,
-                description="执行数学计算。输入应该是一个数学表达式，例如: '2+2' 或 '10*5' 或 'sqrt(16)'。"
-            )
-        ]
+        tools = [get_calculator_tool()]
         
         # 添加知识库检索工具
+        knowledge_retrieval_tool = get_knowledge_retrieval_tool()
         if knowledge_retrieval_tool:
             tools.append(knowledge_retrieval_tool)
         
-        # 创建统一的联网搜索工具（根据search_provider选择Tavily或百度）
-        web_search = create_web_search_tool(search_provider=search_provider)
+        # 获取统一的联网搜索工具（根据search_provider选择Tavily或百度）
+        web_search = get_web_search_tool(search_provider=search_provider)
         if web_search:
             tools.append(web_search)
             logger.info(f"Added web search tool (provider: {search_provider or 'tavily'})")
@@ -79,16 +70,40 @@ class AgentService:
             logger.warning("Web search tool not available")
         
         # 添加网页抓取工具
+        web_scraper_tool = get_web_scraper_tool()
         if web_scraper_tool:
             tools.append(web_scraper_tool)
         
         # 添加PDF解析工具
+        pdf_parser_tool = get_pdf_parser_tool()
         if pdf_parser_tool:
             tools.append(pdf_parser_tool)
         
         logger.info(f"Created {len(tools)} tools for agent (search provider: {search_provider or 'tavily'})")
         return tools
     
+    def _build_system_prompt(self, config: AgentConfig) -> str:
+        """构建 Agent 的系统提示词，并裁剪到当前模型的 token 预算内"""
+        with span("agent.build_prompt"):
+            # 获取角色预设提示词
+            role_prompts = RolePresetRetriever.retrieve_prompts(
+                role_preset_id=config.role_preset_id,
+                collection=config.collection,
+                message=config.message,
+                db_session=config.db_session,
+                top_k=3
+            )
+            
+            # 获取历史对话（超出预算时从最早的消息开始裁剪）
+            history_lines = MemoryManager.get_history_lines(config.memory, max_messages=20) if config.memory else []
+            
+            result = PromptBuilder.build_agent_system_prompt(
+                role_prompts=role_prompts,
+                history_lines=history_lines,
+                budget=llm_factory.get_prompt_budget(config.provider, config.model)
+            )
+        return result.prompt
+    
     def create_agent(
         self, 
         config: Optional[AgentConfig] = None,
@@ -127,32 +142,8 @@ class AgentService:
         # 创建工具列表（根据search_provider选择搜索工具）
         tools = self._create_tools(search_provider=config.search_provider)
         
-        # 获取角色预设提示词
-        role_prompts = RolePresetRetriever.retrieve_prompts(
-            role_preset_id=config.role_preset_id,
-            collection=config.collection,
-            message=config.message,
-            db_session=config.db_session,
-            top_k=3
-        )
-        
-        # 获取历史对话上下文
-        history_context = MemoryManager.get_history_context(config.memory, max_messages=20) if config.memory else ""
-        
-        # 构建系统提示词
-        system_prompt = f"""你是一个智能AI助手，可以使用工具来帮助回答问题。{role_prompts}{history_context}
-
-🔧 你可以使用的工具:
-• knowledge_base_search - 从内部知识库检索信息（提示词模板、文档、历史记录）
-• web_search - 联网搜索最新信息、新闻、实时数据、天气（可在页面切换Tavily或百度）
-• web_content_fetcher - 获取指定URL的网页内容
-• pdf_parser - 解析PDF文件内容
-• calculator - 执行数学计算
-
-💡 重要提示:
-1. 当用户询问天气、新闻、股价等实时信息时，必须使用 web_search 工具！
-2. 请用中文回答所有问题，确保答案专业、详细、有条理。
-3. 请参考对话历史，理解用户的意图和上下文，保持对话的连贯性。"""
+        # 构建系统提示词（角色预设 + 历史对话，按模型的 token 预算裁剪）
+        system_prompt = self._build_system_prompt(config)
         
         # 获取 LangGraph 的存储实例
         checkpointer = MemoryManager.get_short_term_saver()  # 短期记忆
@@ -205,42 +196,32 @@ class AgentService:
             llm = self._get_llm(config.provider, config.model, streaming=False)
         
         # 创建工具列表（根据search_provider选择搜索工具）
-        tools = self._create_tools(search_provider=config.search_provider)
-        
-        # 获取角色预设提示词
-        role_prompts = RolePresetRetriever.retrieve_prompts(
-            role_preset_id=config.role_preset_id,
-            collection=config.collection,
-            message=config.message,
-            db_session=config.db_session,
-            top_k=3
-        )
+        with span("agent.create_tools"):
+            tools = self._create_tools(search_provider=config.search_provider)
         
-        # 构建系统提示词
-        system_prompt = f"""你是一个智能AI助手，可以使用工具来帮助回答问题。{role_prompts}
-
-🔧 你可以使用的工具:
-• knowledge_base_search - 从内部知识库检索信息（提示词模板、文档、历史记录）
-• web_search - 联网搜索最新信息、新闻、实时数据、天气（可在页面切换Tavily或百度）
-• web_content_fetcher - 获取指定URL的网页内容
-• pdf_parser - 解析PDF文件内容
-• calculator - 执行数学计算
-
-💡 重要提示:
-1. 当用户询问天气、新闻、股价等实时信息时，必须使用 web_search 工具！
-2. 请用中文回答所有问题，确保答案专业、详细、有条理。
-3. 请参考对话历史，理解用户的意图和上下文，保持对话的连贯性。"""
+        # 构建系统提示词（角色预设 + 历史对话，按模型的 token 预算裁剪）
+        # 其中的查询向量、预设加载和共享缓存访问都是同步调用，放到线程中执行，不阻塞其他流
+        system_prompt = await asyncio.to_thread(self._build_system_prompt, config)
         
         # 获取 LangGraph 的异步存储实例
-        checkpointer = await MemoryManager.get_short_term_saver()  # 短期记忆
+        with span("agent.checkpointer"):
+            checkpointer = await MemoryManager.get_short_term_saver()  # 短期记忆
         store = MemoryManager.get_long_term_store()  # 长期记忆
         
+        # 同一步内的多个工具调用并发执行（限制并发数，并为每个调用设置截止时间）
+        tool_middleware = ParallelToolCallMiddleware(
+            max_concurrency=settings.AGENT_MAX_PARALLEL_TOOL_CALLS,
+            call_timeout=settings.AGENT_TOOL_CALL_TIMEOUT,
+            parallel_tool_calls=settings.AGENT_PARALLEL_TOOL_CALLS
+        )
+        
         # 使用统一的 create_agent API，集成 LangGraph 的存储机制
         logger.info(f"Creating async agent with {len(tools)} tools (provider: {config.provider or settings.LLM_PROVIDER})")
         agent = create_agent(
             model=llm,
             tools=tools,
             system_prompt=system_prompt,
+            middleware=[tool_middleware],
             checkpointer=checkpointer,  # 使用 AsyncPostgresSaver 管理短期记忆
             store=store  # 使用 InMemoryStore 管理长期记忆
         )
@@ -337,7 +318,8 @@ class AgentService:
                 db_session=config.db_session,
                 llm_instance=llm
             )
-            agent = await self.create_async_agent(config=agent_config)
+            with span("agent.build"):
+                agent = await self.create_async_agent(config=agent_config)
             
             # 设置回调到agent上
             if hasattr(agent, 'callbacks'):
@@ -348,6 +330,7 @@ class AgentService:
             logger.info(f"Agent callbacks set: {hasattr(agent, 'callbacks')}")
             
             # 使用ainvoke执行，通过回调处理器捕获流式输出
+            agent_task = None
             try:
                 agent_done = False
                 agent_error = None
@@ -355,6 +338,7 @@ class AgentService:
                 
                 async def run_agent():
                     nonlocal agent_done, agent_error, final_result
+                    run_start = time.perf_counter()
                     try:
                         # 构建消息列表
                         messages = []
@@ -396,8 +380,12 @@ class AgentService:
                         logger.error(traceback.format_exc())
                         agent_error = str(e)
                         agent_done = True
+                    finally:
+                        record("agent.run", time.perf_counter() - run_start, run_start)
                 
                 # 启动agent任务
+                agent_start = time.perf_counter()
+                first_output_recorded = False
                 agent_task = asyncio.create_task(run_agent())
                 
                 # 流式返回回调处理器的数据
@@ -405,15 +393,18 @@ class AgentService:
                 empty_loops = 0
                 
                 while not agent_done or stream_handler.has_new_data():
-                    # 检查回调处理器的数据（包含token级别的流式输出）
+                    # 检查回调处理器的数据（包含token级别的流式输出），一次取完所有已缓冲的数据块
                     if stream_handler.has_new_data():
-                        chunk = stream_handler.get_latest_chunk()
-                        if chunk:
-                            yield chunk
-                            last_activity = asyncio.get_event_loop().time()
-                            empty_loops = 0
-                        else:
-                            empty_loops += 1
+                        while stream_handler.has_new_data():
+                            chunk = stream_handler.get_latest_chunk()
+                            if chunk:
+                                if not first_output_recorded:
+                                    # 从启动 Agent 到第一段输出交给调用方的时间
+                                    record("agent.first_output", time.perf_counter() - agent_start, agent_start)
+                                    first_output_recorded = True
+                                yield chunk
+                        last_activity = asyncio.get_event_loop().time()
+                        empty_loops = 0
                     else:
                         empty_loops += 1
                     
@@ -471,19 +462,16 @@ class AgentService:
                                     if len(parts) > 1:
                                         final_content = parts[1].strip()
                                         if final_content:
-                                            # 逐字符发送以模拟流式效果
-                                            for char in final_content:
-                                                yield {
-                                                    "type": "content",
-                                                    "content": char
-                                                }
+                                            yield {
+                                                "type": "content",
+                                                "content": final_content
+                                            }
                                 else:
-                                    # 直接发送输出
-                                    for char in output:
-                                        yield {
-                                            "type": "content",
-                                            "content": char
-                                        }
+                                    # 直接发送输出（整段发送，由 SSE 写出器负责分帧）
+                                    yield {
+                                        "type": "content",
+                                        "content": output
+                                    }
                 
                 # 检查错误
                 if agent_error:
@@ -496,6 +484,12 @@ class AgentService:
                 import traceback
                 logger.error(traceback.format_exc())
                 yield {"type": "error", "message": str(e)}
+            finally:
+                # 调用方提前关闭流（如客户端断开）时，取消仍在运行的Agent任务，
+                # 连同进行中的LLM请求和工具调用一起停止，避免继续消耗容量
+                if agent_task is not None and not agent_task.done():
+                    agent_task.cancel()
+                    logger.info("Stream closed before agent finished, agent task cancelled")
                     
         except Exception as e:
             logger.error(f"Error in chat_stream: {e}")
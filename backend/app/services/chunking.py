@@ -0,0 +1,182 @@
+"""文本切分 - 按中文标点的句子边界切分文档，批量文档在进程池中并行切分
+
+- 切分：用正则一次找出所有句子结束位置（。！？；… 及换行等），按块大小贪心装入整句，
+  块之间重叠末尾的整句；单句超过块大小时退而在逗号/空白处断开，仍没有时按长度硬切
+- 流水线：iter_document_chunks 把文档按字符数分批提交到进程池，按文档顺序逐个产出切分结果，
+  调用方边切分边向量化、写入，不需要先得到所有文档的全部分块；超大文档先在换行处分段，段之间可以并行
+- 输入较少（不足一批）时直接在当前进程切分，避免进程间传输的开销
+"""
+import re
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+# 句子结束：中英文句末标点（可带后引号/括号）或换行
+_SENTENCE_END = re.compile(r"[。！？!?；;…]+[”’\"'』」）)\]]*|\.(?=\s)|\n+")
+# 句内可断开的位置：逗号、顿号、冒号和空白
+_SOFT_BREAK = re.compile(r"[，,、：:]|\s+")
+
+
+def split_text(text: str, chunk_size: int = 500, chunk_overlap: int = 50) -> List[str]:
+    """按句子边界把文本切分为不超过 chunk_size 个字符的块，相邻块重叠约 chunk_overlap 个字符（整句）"""
+    length = len(text)
+    if length <= chunk_size:
+        text = text.strip()
+        return [text] if text else []
+
+    ends = [m.end() for m in _SENTENCE_END.finditer(text)]
+    soft_ends: Optional[List[int]] = None
+    min_fill = chunk_size // 4  # 块至少装到这么长，否则改用句内断点
+    chunks = []
+    start = 0
+    while start < length:
+        limit = start + chunk_size
+        hard_cut = False
+        if limit >= length:
+            end = length
+        else:
+            i = bisect_right(ends, limit) - 1
+            end = ends[i] if i >= 0 else 0
+            if end - start < min_fill:
+                if soft_ends is None:
+                    soft_ends = [m.end() for m in _SOFT_BREAK.finditer(text)]
+                i = bisect_right(soft_ends, limit) - 1
+                end = soft_ends[i] if i >= 0 else 0
+                if end - start < min_fill:
+                    end = limit
+                    hard_cut = True
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+
+        # 下一块从重叠区域内的第一个句子边界开始（只重叠整句）
+        if hard_cut:
+            start = end - chunk_overlap
+        else:
+            j = bisect_left(ends, end - chunk_overlap)
+            start = ends[j] if j < len(ends) and start < ends[j] < end else end
+    return chunks
+
+
+def _split_batch(texts: List[str], chunk_size: int, chunk_overlap: int) -> List[List[str]]:
+    """进程池任务：切分一批文本"""
+    return [split_text(text, chunk_size, chunk_overlap) for text in texts]
+
+
+def _segments(text: str, segment_chars: int) -> Iterator[str]:
+    """把超大文档在换行处分段（找不到换行时在句末或按长度断开）"""
+    start = 0
+    while len(text) - start > segment_chars:
+        limit = start + segment_chars
+        end = text.rfind("\n", start, limit) + 1
+        if end <= start:
+            end = text.rfind("。", start, limit) + 1
+        if end <= start:
+            end = limit
+        yield text[start:end]
+        start = end
+    yield text[start:]
+
+
+class TextChunker:
+    """文本切分器（接口与 langchain 的 TextSplitter.split_text 兼容）"""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        """切分使用的进程池"""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=settings.INGEST_PROCESS_POOL_SIZE)
+        return self._process_pool
+
+    def split_text(self, text: str) -> List[str]:
+        return split_text(text, self.chunk_size, self.chunk_overlap)
+
+    def iter_document_chunks(self, documents: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+        """逐个产出 (文档序号, 该文档的分块列表)，顺序与输入一致"""
+        current: Optional[Tuple[int, List[str]]] = None  # 当前文档已切分的分块（超大文档的分段依次合并）
+        for doc_index, chunks in self._iter_segment_chunks(documents):
+            if current is not None and current[0] == doc_index:
+                current[1].extend(chunks)
+                continue
+            if current is not None:
+                yield current
+            current = (doc_index, chunks)
+        if current is not None:
+            yield current
+
+    def _iter_segment_chunks(self, documents: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+        """按顺序产出每个分段的 (文档序号, 分块列表)"""
+        batches = self._batches(documents)
+        first = next(batches, None)
+        if first is None:
+            return
+        second = next(batches, None)
+        if second is None or settings.INGEST_PROCESS_POOL_SIZE <= 0:
+            # 只有一批（或未启用进程池）：在当前进程切分
+            for batch in chain([first], [second] if second is not None else [], batches):
+                for doc_index, text in batch:
+                    yield doc_index, self.split_text(text)
+            return
+
+        # 多批：提交到进程池，最多同时进行 2 倍进程数的任务，按提交顺序取结果
+        max_in_flight = settings.INGEST_PROCESS_POOL_SIZE * 2
+        in_flight: Deque[Tuple[List[int], Future]] = deque()
+
+        def submit(batch: List[Tuple[int, str]]):
+            indexes = [doc_index for doc_index, _ in batch]
+            texts = [text for _, text in batch]
+            in_flight.append((indexes, self.process_pool.submit(_split_batch, texts, self.chunk_size, self.chunk_overlap)))
+
+        try:
+            submit(first)
+            submit(second)
+            for batch in batches:
+                while len(in_flight) >= max_in_flight:
+                    yield from self._collect(in_flight.popleft())
+                submit(batch)
+            while in_flight:
+                yield from self._collect(in_flight.popleft())
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _batches(self, documents: Iterable[str]) -> Iterator[List[Tuple[int, str]]]:
+        """把文档（超大文档先分段）按字符数分批"""
+        batch: List[Tuple[int, str]] = []
+        batch_chars = 0
+        for doc_index, document in enumerate(documents):
+            for segment in _segments(document, settings.INGEST_BATCH_CHARS):
+                batch.append((doc_index, segment))
+                batch_chars += len(segment)
+                if batch_chars >= settings.INGEST_BATCH_CHARS:
+                    yield batch
+                    batch = []
+                    batch_chars = 0
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _collect(item: Tuple[List[int], Future]) -> Iterator[Tuple[int, List[str]]]:
+        indexes, future = item
+        yield from zip(indexes, future.result())
+
+    def shutdown(self):
+        """释放进程池（应用退出时调用）"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+
+# 全局实例
+text_chunker = TextChunker(chunk_size=500, chunk_overlap=50)
@@ -1,11 +1,16 @@
-import chromadb
-from langchain_community.embeddings import HuggingFaceEmbeddings, DashScopeEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from app.core.cache import shared_cache
 from app.core.config import settings
+from app.core.tracing import span
+from app.db.pagination import approximate_count, keyset_page
+from app.services.chunking import text_chunker
+from app.services.preset_router import preset_router
+from app.services.role_preset_cache import role_preset_cache
+from fastapi import HTTPException
 from loguru import logger
+import hashlib
+import threading
 import uuid
-import dashscope
 
 
 class KnowledgeService:
@@ -15,56 +20,86 @@ class KnowledgeService:
         # 延迟初始化
         self._chroma_client = None
         self._embeddings = None
+        # 预热线程与请求线程可能同时触发初始化
+        self._chroma_lock = threading.Lock()
+        self._embeddings_lock = threading.Lock()
         
-        # 文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
-            length_function=len,
-        )
+        # 文本分割器（按中文句子边界切分，批量文档在进程池中切分）
+        self.text_splitter = text_chunker
     
     @property
     def chroma_client(self):
         """延迟初始化ChromaDB客户端"""
         if self._chroma_client is None:
-            try:
-                self._chroma_client = chromadb.HttpClient(
-                    host=settings.CHROMA_HOST,
-                    port=settings.CHROMA_PORT
-                )
-                logger.info(f"Connected to ChromaDB at {settings.CHROMA_HOST}:{settings.CHROMA_PORT}")
-            except Exception as e:
-                logger.error(f"Failed to connect to ChromaDB: {e}")
-                raise
+            with self._chroma_lock:
+                if self._chroma_client is None:
+                    try:
+                        import chromadb  # 重量级依赖，延迟导入
+                        self._chroma_client = chromadb.HttpClient(
+                            host=settings.CHROMA_HOST,
+                            port=settings.CHROMA_PORT
+                        )
+                        logger.info(f"Connected to ChromaDB at {settings.CHROMA_HOST}:{settings.CHROMA_PORT}")
+                    except Exception as e:
+                        logger.error(f"Failed to connect to ChromaDB: {e}")
+                        raise
         return self._chroma_client
     
     @property
     def embeddings(self):
         """延迟初始化Embedding模型"""
         if self._embeddings is None:
-            if settings.USE_DASHSCOPE_EMBEDDING and settings.DASHSCOPE_API_KEY:
-                # 使用阿里百炼向量化模型
-                try:
-                    dashscope.api_key = settings.DASHSCOPE_API_KEY
-                    self._embeddings = DashScopeEmbeddings(
-                        model=settings.DASHSCOPE_EMBEDDING_MODEL,
-                        dashscope_api_key=settings.DASHSCOPE_API_KEY
-                    )
-                    logger.info(f"Loaded DashScope embedding model: {settings.DASHSCOPE_EMBEDDING_MODEL}")
-                except Exception as e:
-                    logger.warning(f"Failed to load DashScope embeddings, falling back to HuggingFace: {e}")
-                    self._embeddings = HuggingFaceEmbeddings(
-                        model_name=settings.EMBEDDING_MODEL,
-                        model_kwargs={'device': 'cpu'}
-                    )
-            else:
-                # 使用HuggingFace模型
-                self._embeddings = HuggingFaceEmbeddings(
+            with self._embeddings_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._load_embeddings()
+        return self._embeddings
+    
+    def _load_embeddings(self):
+        """加载Embedding模型（sentence-transformers / dashscope 均在此处延迟导入）"""
+        from langchain_community.embeddings import HuggingFaceEmbeddings, DashScopeEmbeddings
+        
+        if settings.USE_DASHSCOPE_EMBEDDING and settings.DASHSCOPE_API_KEY:
+            # 使用阿里百炼向量化模型
+            try:
+                import dashscope
+                dashscope.api_key = settings.DASHSCOPE_API_KEY
+                embeddings = DashScopeEmbeddings(
+                    model=settings.DASHSCOPE_EMBEDDING_MODEL,
+                    dashscope_api_key=settings.DASHSCOPE_API_KEY
+                )
+                logger.info(f"Loaded DashScope embedding model: {settings.DASHSCOPE_EMBEDDING_MODEL}")
+                return embeddings
+            except Exception as e:
+                logger.warning(f"Failed to load DashScope embeddings, falling back to HuggingFace: {e}")
+                return HuggingFaceEmbeddings(
                     model_name=settings.EMBEDDING_MODEL,
                     model_kwargs={'device': 'cpu'}
                 )
-                logger.info(f"Loaded embedding model: {settings.EMBEDDING_MODEL}")
-        return self._embeddings
+        
+        # 使用HuggingFace模型
+        embeddings = HuggingFaceEmbeddings(
+            model_name=settings.EMBEDDING_MODEL,
+            model_kwargs={'device': 'cpu'}
+        )
+        logger.info(f"Loaded embedding model: {settings.EMBEDDING_MODEL}")
+        return embeddings
+    
+    def embed_query(self, text: str) -> List[float]:
+        """生成查询向量（结果以 float16 存入共享缓存，各 worker 共用）"""
+        from app.services.vector_index import pack_embedding, unpack_embedding
+        
+        embeddings = self.embeddings
+        if not shared_cache.available:
+            with span("knowledge.embed_query"):
+                return embeddings.embed_query(text)
+        model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", "")
+        key = hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+        with span("knowledge.embed_query"):
+            packed = shared_cache.get_or_set(
+                "embedding", key, settings.CACHE_EMBEDDING_TTL,
+                lambda: pack_embedding(embeddings.embed_query(text), "float16")
+            )
+        return unpack_embedding(packed).tolist()
     
     def create_collection(self, collection_name: str) -> bool:
         """创建知识库集合"""
@@ -85,78 +120,74 @@ class KnowledgeService:
         documents: List[str], 
         metadatas: Optional[List[Dict]] = None
     ) -> List[str]:
-        """添加文档到知识库"""
+        """添加文档到知识库（边切分边向量化、写入，每批最多 INGEST_EMBED_BATCH_SIZE 个分块）"""
         try:
             collection = self.chroma_client.get_collection(collection_name)
             
-            # 分割文档
-            all_chunks = []
-            all_metadatas = []
+            batch_chunks = []
+            batch_metadatas = []
+            batch_ids = []
             doc_ids = []
+            total = 0
             
-            for idx, doc in enumerate(documents):
-                chunks = self.text_splitter.split_text(doc)
-                all_chunks.extend(chunks)
-                
+            for idx, chunks in self.text_splitter.iter_document_chunks(documents):
                 # 为每个chunk创建metadata
                 base_metadata = metadatas[idx] if metadatas and idx < len(metadatas) else {}
-                for chunk_idx in range(len(chunks)):
+                for chunk_idx, chunk in enumerate(chunks):
                     chunk_metadata = base_metadata.copy()
                     chunk_metadata.update({
                         "doc_index": idx,
                         "chunk_index": chunk_idx,
                         "total_chunks": len(chunks)
                     })
-                    all_metadatas.append(chunk_metadata)
-                    doc_ids.append(str(uuid.uuid4()))
-            
-            # 生成embeddings并添加到ChromaDB
-            embeddings = self.embeddings.embed_documents(all_chunks)
-            
-            collection.add(
-                embeddings=embeddings,
-                documents=all_chunks,
-                metadatas=all_metadatas,
-                ids=doc_ids
-            )
-            
-            logger.info(f"Added {len(all_chunks)} chunks to {collection_name}")
+                    batch_chunks.append(chunk)
+                    batch_metadatas.append(chunk_metadata)
+                    batch_ids.append(str(uuid.uuid4()))
+                    
+                    if len(batch_chunks) >= settings.INGEST_EMBED_BATCH_SIZE:
+                        self._add_chunks(collection, batch_chunks, batch_metadatas, batch_ids)
+                        doc_ids.extend(batch_ids)
+                        total += len(batch_chunks)
+                        batch_chunks, batch_metadatas, batch_ids = [], [], []
+            
+            if batch_chunks:
+                self._add_chunks(collection, batch_chunks, batch_metadatas, batch_ids)
+                doc_ids.extend(batch_ids)
+                total += len(batch_chunks)
+            
+            shared_cache.bump("search", collection_name)
+            logger.info(f"Added {total} chunks to {collection_name}")
             return doc_ids
             
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
             return []
     
+    def _add_chunks(self, collection, chunks: List[str], metadatas: List[Dict], ids: List[str]):
+        """生成一批分块的embeddings并添加到ChromaDB"""
+        with span("knowledge.embed_documents"):
+            embeddings = self.embeddings.embed_documents(chunks)
+        collection.add(
+            embeddings=embeddings,
+            documents=chunks,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
     def search(
         self, 
         collection_name: str, 
         query: str, 
         top_k: int = 5
     ) -> List[Dict]:
-        """检索相关文档"""
+        """检索相关文档（结果按集合版本缓存，集合内容修改后旧结果不再命中）"""
         try:
-            collection = self.chroma_client.get_collection(collection_name)
-            
-            # 生成查询embedding
-            query_embedding = self.embeddings.embed_query(query)
-            
-            # 查询
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                include=["documents", "metadatas", "distances"]
+            version = shared_cache.version("search", collection_name)
+            query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+            formatted_results = shared_cache.get_or_set(
+                "search", f"{collection_name}:{version}:{top_k}:{query_hash}", settings.CACHE_SEARCH_TTL,
+                lambda: self._search(collection_name, query, top_k)
             )
-            
-            # 格式化结果
-            formatted_results = []
-            if results and results['documents']:
-                for i in range(len(results['documents'][0])):
-                    formatted_results.append({
-                        "content": results['documents'][0][i],
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                        "score": 1 - results['distances'][0][i] if results['distances'] else 0  # 转换为相似度分数
-                    })
-            
             logger.info(f"Found {len(formatted_results)} results for query: {query}")
             return formatted_results
             
@@ -164,10 +195,37 @@ class KnowledgeService:
             logger.error(f"Error searching documents: {e}")
             return []
     
+    def _search(self, collection_name: str, query: str, top_k: int) -> List[Dict]:
+        """向量检索（出错时抛出异常，避免把空结果写入缓存）"""
+        collection = self.chroma_client.get_collection(collection_name)
+        
+        # 生成查询embedding
+        query_embedding = self.embed_query(query)
+        
+        # 查询
+        with span("knowledge.chroma_query"):
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"]
+            )
+        
+        # 格式化结果
+        formatted_results = []
+        if results and results['documents']:
+            for i in range(len(results['documents'][0])):
+                formatted_results.append({
+                    "content": results['documents'][0][i],
+                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                    "score": 1 - results['distances'][0][i] if results['distances'] else 0  # 转换为相似度分数
+                })
+        return formatted_results
+    
     def delete_collection(self, collection_name: str) -> bool:
         """删除知识库集合"""
         try:
             self.chroma_client.delete_collection(collection_name)
+            shared_cache.bump("search", collection_name)
             logger.info(f"Deleted collection: {collection_name}")
             return True
         except Exception as e:
@@ -233,7 +291,10 @@ class KnowledgeService:
                     metadatas=chunk_metadatas,
                     ids=chunk_ids
                 )
+                preset_router.upsert(preset_id, embeddings, category, tags)
             
+            role_preset_cache.invalidate(preset_id)
+            shared_cache.bump("search", "prompts")
             logger.info(f"Added role preset: {title} (preset_id: {preset_id}, {len(chunks)} chunks)")
             return preset_id
                 
@@ -247,104 +308,102 @@ class KnowledgeService:
         db_session,
         query: str,
         category: Optional[str] = None,
+        tags: Optional[List[str]] = None,
         top_k: int = 3
     ) -> List[Dict]:
-        """搜索角色预设：使用ChromaDB语义搜索，从PostgreSQL获取完整数据"""
+        """搜索角色预设：在进程内的预设路由中语义检索（分类/标签在取 top-k 之前过滤），从PostgreSQL获取完整数据"""
         try:
             from app.db import models
             
-            # 如果query为空或只包含空白字符，直接返回所有预设
+            # 如果query为空或只包含空白字符，直接按条件返回预设
             if not query or not query.strip():
-                logger.info("Query is empty, returning all role presets")
+                logger.info("Query is empty, returning role presets without ranking")
+                if category or tags:
+                    return self.filter_role_presets(db_session=db_session, category=category, tags=tags, skip=0, limit=top_k)
                 return self.get_all_role_presets(db_session=db_session, skip=0, limit=top_k)
             
-            collection_name = "prompts"
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-            except Exception:
-                logger.info(f"Collection {collection_name} does not exist, returning empty list")
+            # 使用语义搜索（预设级向量，每个预设只出现一次）
+            query_embedding = self.embed_query(query)
+            preset_router.ensure_loaded(self.get_role_preset_chunk_embeddings)
+            matches = preset_router.top_k(query_embedding, top_k, category=category, tags=tags)
+            if not matches:
                 return []
             
-            # 使用语义搜索
-            query_embedding = self.embeddings.embed_query(query)
-            search_results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k * 3,  # 获取更多结果以便过滤
-                include=["documents", "metadatas", "ids", "distances"]
-            )
-            
-            # 收集唯一的preset_id（兼容旧的card_id）
-            preset_ids_seen = set()
-            filtered_results = []
-            
-            if search_results and search_results['documents']:
-                for i in range(len(search_results['documents'][0])):
-                    metadata = search_results['metadatas'][0][i] if search_results['metadatas'] else {}
-                    preset_id = metadata.get('preset_id') or metadata.get('card_id')  # 兼容旧数据
-                    
-                    if not preset_id or preset_id in preset_ids_seen:
-                        continue
-                    
-                    # 如果指定了category，过滤
-                    if category and metadata.get('category') != category:
-                        continue
-                    
-                    # 从PostgreSQL获取完整数据
-                    preset = db_session.query(models.RolePreset).filter(
-                        models.RolePreset.preset_id == preset_id
-                    ).first()
-                    
-                    if preset:
-                        preset_ids_seen.add(preset_id)
-                        filtered_results.append({
-                            "id": preset.preset_id,
-                            "title": preset.title,
-                            "content": preset.prompt_content,  # 使用完整内容
-                            "category": preset.category,
-                            "tags": preset.tags if preset.tags else [],
-                            "score": 1 - search_results['distances'][0][i] if search_results.get('distances') and search_results['distances'][0] else 0
-                        })
-                    
-                    if len(filtered_results) >= top_k:
-                        break
-            
-            return filtered_results
+            # 从PostgreSQL获取完整数据（一次查询）
+            presets = {
+                preset.preset_id: preset
+                for preset in db_session.query(models.RolePreset).filter(
+                    models.RolePreset.preset_id.in_([preset_id for preset_id, _ in matches])
+                )
+            }
+            
+            results = []
+            for preset_id, score in matches:
+                preset = presets.get(preset_id)
+                if preset:
+                    results.append({
+                        "id": preset.preset_id,
+                        "title": preset.title,
+                        "content": preset.prompt_content,  # 使用完整内容
+                        "category": preset.category,
+                        "tags": preset.tags if preset.tags else [],
+                        "score": score
+                    })
+            return results
             
         except Exception as e:
             logger.error(f"Error searching role presets: {e}")
             return []
     
+    def get_role_preset_by_id(self, db_session, preset_id: str) -> Optional[Dict]:
+        """从PostgreSQL获取单个角色预设，不存在时返回None"""
+        from app.db import models
+        
+        preset = db_session.query(models.RolePreset).filter(models.RolePreset.preset_id == preset_id).first()
+        if not preset:
+            return None
+        return {
+            "id": preset.preset_id,
+            "title": preset.title,
+            "content": preset.prompt_content,
+            "category": preset.category,
+            "tags": preset.tags if preset.tags else [],
+            "created_at": preset.created_at.isoformat() if preset.created_at else None,
+            "updated_at": preset.updated_at.isoformat() if preset.updated_at else None
+        }
+    
+    def get_role_preset_chunk_embeddings(self) -> Tuple[List[str], List[List[float]], List[Dict]]:
+        """从ChromaDB读取所有角色预设分块的向量（用于构建预设级向量矩阵）
+        
+        Returns:
+            (每个分块所属的preset_id列表, 分块向量列表, 分块元数据列表)
+        """
+        try:
+            collection = self.chroma_client.get_collection("prompts")
+        except Exception:
+            logger.info("Collection prompts does not exist, no role preset embeddings")
+            return [], [], []
+        
+        results = collection.get(include=["embeddings", "metadatas"])
+        chunk_embeddings = results.get("embeddings")
+        if chunk_embeddings is None:  # 新版本 chromadb 返回 numpy 数组，不能直接做真值判断
+            chunk_embeddings = []
+        
+        preset_ids = []
+        embeddings = []
+        metadatas = []
+        for metadata, embedding in zip(results.get("metadatas") or [], chunk_embeddings):
+            metadata = metadata or {}
+            preset_id = metadata.get("preset_id") or metadata.get("card_id")  # 兼容旧数据
+            if preset_id and embedding is not None:
+                preset_ids.append(preset_id)
+                embeddings.append(embedding)
+                metadatas.append(metadata)
+        return preset_ids, embeddings, metadatas
+    
     def get_all_role_presets(self, db_session, skip: int = 0, limit: int = 100) -> List[Dict]:
         """从PostgreSQL获取所有角色预设"""
-        try:
-            from app.db import models
-            from sqlalchemy.orm import Query
-            
-            # 从PostgreSQL查询
-            query: Query = db_session.query(models.RolePreset)
-            total = query.count()
-            presets = query.order_by(models.RolePreset.created_at.desc()).offset(skip).limit(limit).all()
-            
-            # 格式化结果
-            formatted_results = []
-            for preset in presets:
-                formatted_results.append({
-                    "id": preset.preset_id,  # 使用preset_id作为唯一标识
-                    "title": preset.title,
-                    "content": preset.prompt_content,
-                    "category": preset.category,
-                    "tags": preset.tags if preset.tags else [],
-                    "score": 1.0,
-                    "created_at": preset.created_at.isoformat() if preset.created_at else None,
-                    "updated_at": preset.updated_at.isoformat() if preset.updated_at else None
-                })
-            
-            logger.info(f"Retrieved {len(formatted_results)}/{total} role presets from PostgreSQL")
-            return formatted_results
-            
-        except Exception as e:
-            logger.error(f"Error getting all role presets: {e}")
-            return []
+        return self.list_role_presets(db_session, skip=skip, limit=limit)[0]
     
     def update_role_preset(
         self,
@@ -378,24 +437,27 @@ class KnowledgeService:
             db_session.commit()
             db_session.refresh(preset)
             
-            # 3. 更新ChromaDB：删除旧chunks，添加新chunks
+            # 3. 更新ChromaDB：内容改变时删除旧chunks并添加新chunks，否则只更新chunks的元数据
             collection_name = "prompts"
             try:
                 collection = self.chroma_client.get_collection(collection_name)
                 
-                # 删除该preset_id的所有chunks（兼容旧的card_id）
+                # 查找该preset_id的所有chunks（兼容旧的card_id）
                 all_results = collection.get(include=["metadatas", "ids"])
-                chunk_ids_to_delete = []
+                preset_chunk_ids = []
+                preset_chunk_metadatas = []
                 if all_results and all_results.get('metadatas'):
                     for i, metadata in enumerate(all_results['metadatas']):
                         if metadata.get('preset_id') == preset_id or metadata.get('card_id') == preset_id:
-                            chunk_ids_to_delete.append(all_results['ids'][i])
-                
-                if chunk_ids_to_delete:
-                    collection.delete(ids=chunk_ids_to_delete)
+                            preset_chunk_ids.append(all_results['ids'][i])
+                            preset_chunk_metadatas.append(metadata)
                 
                 # 如果内容改变，重新分割并添加
                 if prompt_content is not None:
+                    if preset_chunk_ids:
+                        collection.delete(ids=preset_chunk_ids)
+                    preset_router.remove(preset_id)
+                    
                     chunks = self.text_splitter.split_text(preset.prompt_content)
                     chunk_metadatas = []
                     chunk_ids = []
@@ -419,10 +481,29 @@ class KnowledgeService:
                             metadatas=chunk_metadatas,
                             ids=chunk_ids
                         )
+                        preset_router.upsert(preset_id, embeddings, preset.category, preset.tags)
+                
+                # 只改了标题/分类/标签：向量不变，更新chunks的元数据（检索时按元数据过滤）
+                elif preset_chunk_ids:
+                    collection.update(
+                        ids=preset_chunk_ids,
+                        metadatas=[
+                            {
+                                **metadata,
+                                "title": preset.title,
+                                "category": preset.category,
+                                "tags": ",".join(preset.tags) if preset.tags else ""
+                            }
+                            for metadata in preset_chunk_metadatas
+                        ]
+                    )
+                    preset_router.update_metadata(preset_id, preset.category, preset.tags)
                 
             except Exception as e:
                 logger.warning(f"Error updating ChromaDB, but PostgreSQL updated: {e}")
             
+            role_preset_cache.invalidate(preset_id)
+            shared_cache.bump("search", "prompts")
             logger.info(f"Updated role preset: {preset_id}")
             return True
             
@@ -444,6 +525,7 @@ class KnowledgeService:
             
             db_session.delete(preset)
             db_session.commit()
+            preset_router.remove(preset_id)
             
             # 2. 从ChromaDB删除所有相关的chunks（兼容旧的card_id）
             collection_name = "prompts"
@@ -465,6 +547,8 @@ class KnowledgeService:
             except Exception as e:
                 logger.warning(f"Error deleting from ChromaDB, but PostgreSQL deleted: {e}")
             
+            role_preset_cache.invalidate(preset_id)
+            shared_cache.bump("search", "prompts")
             logger.info(f"Deleted role preset: {preset_id}")
             return True
             
@@ -483,56 +567,92 @@ class KnowledgeService:
         limit: int = 100
     ) -> List[Dict]:
         """条件查询角色预设（从PostgreSQL）"""
+        return self.list_role_presets(
+            db_session, category=category, tags=tags, title_query=title_query, skip=skip, limit=limit
+        )[0]
+    
+    def list_role_presets(
+        self,
+        db_session,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        title_query: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        skip: int = 0
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """按创建时间倒序分页查询角色预设（键集分页，不执行COUNT）
+        
+        Returns:
+            (本页的预设列表, 下一页的游标或None)
+        """
         try:
             from app.db import models
-            from sqlalchemy.orm import Query
-            from sqlalchemy import or_
-            
-            # 构建查询
-            query: Query = db_session.query(models.RolePreset)
-            
-            # 按分类过滤
-            if category:
-                query = query.filter(models.RolePreset.category == category)
-            
-            # 按标题查询
-            if title_query:
-                query = query.filter(models.RolePreset.title.ilike(f"%{title_query}%"))
             
-            # 按标签过滤（JSON数组包含）
-            if tags:
-                # PostgreSQL JSON数组查询：使用JSONB @> 操作符
-                # 检查tags JSON数组是否包含任何一个指定的标签
-                for tag in tags:
-                    # 使用contains方法检查JSON数组是否包含该标签
-                    query = query.filter(models.RolePreset.tags.contains([tag]))
-            
-            # 获取总数
-            total = query.count()
-            
-            # 分页查询
-            presets = query.order_by(models.RolePreset.created_at.desc()).offset(skip).limit(limit).all()
-            
-            # 格式化结果
-            formatted_results = []
-            for preset in presets:
-                formatted_results.append({
-                    "id": preset.preset_id,
-                    "title": preset.title,
-                    "content": preset.prompt_content,
-                    "category": preset.category,
-                    "tags": preset.tags if preset.tags else [],
-                    "score": 1.0,
-                    "created_at": preset.created_at.isoformat() if preset.created_at else None,
-                    "updated_at": preset.updated_at.isoformat() if preset.updated_at else None
-                })
+            query = self._role_preset_query(db_session, category, tags, title_query)
+            presets, next_cursor = keyset_page(
+                query, models.RolePreset.created_at, models.RolePreset.id, limit, cursor=cursor, skip=skip
+            )
             
-            logger.info(f"Filtered {len(formatted_results)}/{total} role presets from PostgreSQL")
-            return formatted_results
+            formatted_results = [self._format_role_preset(preset) for preset in presets]
+            logger.info(f"Retrieved {len(formatted_results)} role presets from PostgreSQL")
+            return formatted_results, next_cursor
             
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error filtering role presets: {e}")
-            return []
+            logger.error(f"Error listing role presets: {e}")
+            return [], None
+    
+    def count_role_presets(
+        self,
+        db_session,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        title_query: Optional[str] = None
+    ) -> int:
+        """满足条件的角色预设数量（估算值，见 approximate_count）"""
+        query = self._role_preset_query(db_session, category, tags, title_query)
+        return approximate_count(db_session, query, "role_presets")
+    
+    @staticmethod
+    def _role_preset_query(
+        db_session,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        title_query: Optional[str] = None
+    ):
+        """构建角色预设的过滤查询"""
+        from app.db import models
+        
+        query = db_session.query(models.RolePreset)
+        
+        # 按分类过滤
+        if category:
+            query = query.filter(models.RolePreset.category == category)
+        
+        # 按标题查询
+        if title_query:
+            query = query.filter(models.RolePreset.title.ilike(f"%{title_query}%"))
+        
+        # 按标签过滤（JSONB数组包含所有指定的标签：一次 @> 查询，使用GIN索引）
+        if tags:
+            query = query.filter(models.RolePreset.tags.contains(list(tags)))
+        
+        return query
+    
+    @staticmethod
+    def _format_role_preset(preset) -> Dict:
+        return {
+            "id": preset.preset_id,  # 使用preset_id作为唯一标识
+            "title": preset.title,
+            "content": preset.prompt_content,
+            "category": preset.category,
+            "tags": preset.tags if preset.tags else [],
+            "score": 1.0,
+            "created_at": preset.created_at.isoformat() if preset.created_at else None,
+            "updated_at": preset.updated_at.isoformat() if preset.updated_at else None
+        }
     
     def list_collections(self) -> List[str]:
         """列出所有知识库集合"""
@@ -1,43 +1,113 @@
 """
 LLM工厂 - 支持多个LLM提供商
-支持: OpenAI, 阿里百炼(DashScope)
+支持: OpenAI, 阿里百炼(DashScope)，以及离线基准测试用的 fake 提供商
+创建的模型实例带有按 (提供商, 模型) 划分的准入控制（见 app.llm.admission）
 """
+import hashlib
 import json
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Dict, List
-from langchain_community.chat_models import ChatOpenAI
-from langchain_community.chat_models.tongyi import ChatTongyi
+from types import MappingProxyType
+from typing import Any, Optional, Dict, List, Tuple
 from app.core.config import settings
+from app.llm.admission import AdmissionLimiter, LLMLimits, admission_controlled, llm_admission
 from loguru import logger
 
 # 加载模型配置
 _CONFIG_PATH = Path(__file__).parent.parent / "llm" / "config" / "models.json"
 
-def _load_model_config() -> Dict:
-    """加载模型配置文件"""
+_DEFAULT_MODEL_CONFIG = {
+    "providers": {},
+    "defaults": {
+        "provider": "dashscope",
+        "openai_model": "gpt-3.5-turbo",
+        "dashscope_model": "qwen-max"
+    }
+}
+
+
+def _read_model_config(path: Path) -> Dict:
+    """读取模型配置文件"""
     try:
-        with open(_CONFIG_PATH, 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
-        logger.warning(f"模型配置文件未找到: {_CONFIG_PATH}，使用默认配置")
-        return {
-            "providers": {},
-            "defaults": {
-                "provider": "dashscope",
-                "openai_model": "gpt-3.5-turbo",
-                "dashscope_model": "qwen-max"
-            }
-        }
+        logger.warning(f"模型配置文件未找到: {path}，使用默认配置")
+        return _DEFAULT_MODEL_CONFIG
     except json.JSONDecodeError as e:
         logger.error(f"模型配置文件格式错误: {e}，使用默认配置")
-        return {
-            "providers": {},
-            "defaults": {
-                "provider": "dashscope",
-                "openai_model": "gpt-3.5-turbo",
-                "dashscope_model": "qwen-max"
-            }
-        }
+        return _DEFAULT_MODEL_CONFIG
+
+
+def _freeze(value: Any) -> Any:
+    """转换为只读结构（dict -> MappingProxyType，list -> tuple），缓存的配置被所有请求共享，不允许修改"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass(frozen=True)
+class ModelCatalog:
+    """模型目录 - models.json 解析一次后的只读快照，以及预先序列化好的 /llm-providers 响应"""
+    config: MappingProxyType
+    mtime_ns: Optional[int]  # 配置文件的修改时间，文件不存在时为 None
+    providers_body: bytes  # LLMProvidersResponse 的 JSON
+    etag: str
+
+
+class _ModelCatalogLoader:
+    """按配置文件的修改时间重新加载模型目录（修改 models.json 后无需重启）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._catalog: Optional[ModelCatalog] = None
+        self._lock = threading.Lock()
+
+    def _mtime_ns(self) -> Optional[int]:
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self) -> ModelCatalog:
+        mtime_ns = self._mtime_ns()
+        catalog = self._catalog
+        if catalog is not None and catalog.mtime_ns == mtime_ns:
+            return catalog
+        with self._lock:
+            if self._catalog is None or self._catalog.mtime_ns != mtime_ns:
+                if self._catalog is not None:
+                    logger.info(f"模型配置文件已修改，重新加载: {self.path}")
+                self._catalog = self._build(self.path, mtime_ns)
+            return self._catalog
+
+    @staticmethod
+    def _build(path: Path, mtime_ns: Optional[int]) -> ModelCatalog:
+        from app.api.schemas import LLMProvidersResponse
+        
+        config = _freeze(_read_model_config(path))
+        body = LLMProvidersResponse(
+            providers=LLMFactory._list_providers(config),
+            default=LLMFactory.get_default_config()
+        ).model_dump_json().encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return ModelCatalog(config=config, mtime_ns=mtime_ns, providers_body=body, etag=etag)
+
+
+_catalog_loader = _ModelCatalogLoader(_CONFIG_PATH)
+
+
+def get_model_catalog() -> ModelCatalog:
+    """当前的模型目录（配置文件修改后自动重新加载）"""
+    return _catalog_loader.get()
+
+
+def _load_model_config() -> MappingProxyType:
+    """模型配置（只读，进程内缓存）"""
+    return get_model_catalog().config
 
 
 class LLMFactory:
@@ -59,35 +129,154 @@ class LLMFactory:
             temperature: 温度参数
             
         Returns:
-            LLM实例
+            LLM实例（配置了备用模型时为 HedgedChatModel）
         """
+        llm = LLMFactory._create_provider_llm(provider, model_name, temperature, streaming)
+        if not settings.LLM_HEDGING_ENABLED:
+            return llm
+        return LLMFactory._with_fallback(llm, provider, model_name, temperature, streaming)
+    
+    @staticmethod
+    def _create_provider_llm(
+        provider: Optional[str] = None,
+        model_name: Optional[str] = None,
+        temperature: float = 0.7,
+        streaming: bool = False
+    ):
+        """创建单个提供商的LLM实例"""
         provider = provider or settings.LLM_PROVIDER
         
         if provider == "dashscope":
             return LLMFactory._create_dashscope_llm(model_name, temperature, streaming)
         elif provider == "openai":
             return LLMFactory._create_openai_llm(model_name, temperature, streaming)
+        elif provider == "fake" and settings.FAKE_LLM_ENABLED:
+            return LLMFactory._create_fake_llm(model_name, streaming)
         else:
             logger.warning(f"Unknown provider: {provider}, falling back to OpenAI")
             return LLMFactory._create_openai_llm(model_name, temperature, streaming)
     
+    @staticmethod
+    def _provider_available(provider: str) -> bool:
+        """提供商是否已配置（有 API Key）"""
+        if provider == "dashscope":
+            return bool(settings.DASHSCOPE_API_KEY)
+        if provider == "openai":
+            return bool(settings.OPENAI_API_KEY)
+        if provider == "fake":
+            return settings.FAKE_LLM_ENABLED
+        return False
+    
+    @staticmethod
+    def _with_fallback(llm, provider: Optional[str], model_name: Optional[str], temperature: float, streaming: bool):
+        """按 models.json 的 routing 配置为主模型加上备用模型（对冲请求 + 熔断），没有可用的备用模型时原样返回"""
+        from app.llm.routing import HedgedChatModel
+        
+        primary_provider, primary_model = LLMFactory.resolve_model(provider, model_name)
+        routing = _load_model_config().get("routing", {})
+        fallback = routing.get("fallbacks", {}).get(primary_provider)
+        if not fallback or not LLMFactory._provider_available(fallback.get("provider", "")):
+            return llm
+        
+        secondary_provider, secondary_model = LLMFactory.resolve_model(fallback["provider"], fallback.get("model"))
+        if (secondary_provider, secondary_model) == (primary_provider, primary_model):
+            return llm
+        
+        try:
+            secondary = LLMFactory._create_provider_llm(secondary_provider, secondary_model, temperature, streaming)
+        except Exception as e:
+            # 备用模型创建失败（缺少依赖、配置错误等）时不影响主模型
+            logger.warning(f"Failed to create fallback {secondary_provider}/{secondary_model}, using {primary_provider}/{primary_model} only: {e}")
+            return llm
+        logger.info(f"Routing {primary_provider}/{primary_model} with fallback {secondary_provider}/{secondary_model}")
+        return HedgedChatModel(
+            primary=llm,
+            secondary=secondary,
+            primary_provider=primary_provider,
+            secondary_provider=secondary_provider,
+            hedge_delay=float(routing.get("hedge_delay", settings.LLM_HEDGE_DELAY)),
+            streaming=streaming
+        )
+    
+    @staticmethod
+    def resolve_model(provider: Optional[str] = None, model_name: Optional[str] = None) -> Tuple[str, str]:
+        """解析实际使用的 (提供商, 模型)，与 create_llm 的选择逻辑一致"""
+        provider = provider or settings.LLM_PROVIDER
+        if provider == "dashscope":
+            return provider, model_name or settings.DASHSCOPE_MODEL
+        if provider == "fake" and settings.FAKE_LLM_ENABLED:
+            return provider, model_name or "fake-scripted"
+        return "openai", model_name or settings.MODEL_NAME
+    
+    @staticmethod
+    def _load_limits(provider: str, model: str) -> LLMLimits:
+        """读取调用限制：模型级 limits > 提供商级 limits > 配置默认值"""
+        limits = LLMLimits(
+            requests_per_second=settings.LLM_DEFAULT_REQUESTS_PER_SECOND,
+            burst=settings.LLM_DEFAULT_BURST,
+            max_concurrency=settings.LLM_DEFAULT_MAX_CONCURRENCY,
+            max_queue_wait=settings.LLM_DEFAULT_MAX_QUEUE_WAIT
+        )
+        provider_config = _load_model_config().get("providers", {}).get(provider, {})
+        limits = LLMLimits.from_dict(provider_config.get("limits", {}), limits)
+        for model_config in provider_config.get("models", []):
+            if model_config.get("id") == model and "limits" in model_config:
+                limits = LLMLimits.from_dict(model_config["limits"], limits)
+        logger.info(f"LLM limits for {provider}/{model}: {limits}")
+        return limits
+    
+    @staticmethod
+    def get_prompt_budget(provider: Optional[str] = None, model_name: Optional[str] = None) -> int:
+        """系统提示词的 token 预算：模型级 prompt_budget > 提供商级 prompt_budget > 配置默认值"""
+        provider, model = LLMFactory.resolve_model(provider, model_name)
+        provider_config = _load_model_config().get("providers", {}).get(provider, {})
+        budget = provider_config.get("prompt_budget", settings.PROMPT_BUDGET_DEFAULT_TOKENS)
+        for model_config in provider_config.get("models", []):
+            if model_config.get("id") == model:
+                budget = model_config.get("prompt_budget", budget)
+        return int(budget)
+    
+    @staticmethod
+    def get_admission_limiter(provider: Optional[str] = None, model_name: Optional[str] = None) -> Optional[AdmissionLimiter]:
+        """获取 (提供商, 模型) 的准入限制器（models.json 修改后更新限制），未启用准入控制时返回 None"""
+        if not settings.LLM_ADMISSION_ENABLED:
+            return None
+        provider, model = LLMFactory.resolve_model(provider, model_name)
+        return llm_admission.get(
+            provider, model, lambda: LLMFactory._load_limits(provider, model),
+            version=get_model_catalog().mtime_ns
+        )
+    
+    @staticmethod
+    def check_admission(provider: Optional[str] = None, model_name: Optional[str] = None):
+        """在开始处理请求前检查排队情况，预计无法按时获得调用名额时抛出 LLMOverloadedError"""
+        limiter = LLMFactory.get_admission_limiter(provider, model_name)
+        if limiter is not None:
+            limiter.check()
+    
     @staticmethod
     def _create_openai_llm(model_name: Optional[str] = None, temperature: float = 0.7, streaming: bool = False):
         """创建OpenAI LLM实例"""
+        from langchain_openai import ChatOpenAI
+        
         model = model_name or settings.MODEL_NAME
         logger.info(f"Creating OpenAI LLM with model: {model}, streaming: {streaming}")
         
-        return ChatOpenAI(
-            model_name=model,
-            openai_api_key=settings.OPENAI_API_KEY,
-            openai_api_base=settings.OPENAI_API_BASE,
+        return admission_controlled(ChatOpenAI)(
+            model=model,
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_API_BASE,
             temperature=temperature,
-            streaming=streaming
+            streaming=streaming,
+            stream_usage=True,  # 流式调用也返回用量信息（含前缀缓存命中的 token 数）
+            admission_limiter=LLMFactory.get_admission_limiter("openai", model)
         )
     
     @staticmethod
     def _create_dashscope_llm(model_name: Optional[str] = None, temperature: float = 0.7, streaming: bool = False):
         """创建阿里百炼(DashScope) LLM实例"""
+        from langchain_community.chat_models.tongyi import ChatTongyi  # 依赖 dashscope，延迟导入
+        
         model = model_name or settings.DASHSCOPE_MODEL
         logger.info(f"Creating DashScope LLM with model: {model}, streaming: {streaming}")
         
@@ -97,18 +286,41 @@ class LLMFactory:
                 "Please set it in .env file to use DashScope models."
             )
         
-        llm = ChatTongyi(
+        llm = admission_controlled(ChatTongyi)(
             model_name=model,
             dashscope_api_key=settings.DASHSCOPE_API_KEY,
             temperature=temperature,
-            streaming=streaming  # 根据参数启用流式输出
+            streaming=streaming,  # 根据参数启用流式输出
+            admission_limiter=LLMFactory.get_admission_limiter("dashscope", model)
         )
         return llm
     
     @staticmethod
-    def get_available_providers():
+    def _create_fake_llm(model_name: Optional[str] = None, streaming: bool = False):
+        """创建脚本化的假模型（离线基准测试用，不访问外部服务）"""
+        from app.llm.fake_chat_model import ScriptedFakeChatModel
+        
+        logger.info(f"Creating fake LLM (pattern: {settings.FAKE_LLM_TOOL_CALL_PATTERN}, streaming: {streaming})")
+        
+        model = model_name or "fake-scripted"
+        return admission_controlled(ScriptedFakeChatModel)(
+            model_name=model,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            first_token_latency=settings.FAKE_LLM_FIRST_TOKEN_LATENCY,
+            response_tokens=settings.FAKE_LLM_RESPONSE_TOKENS,
+            tool_call_pattern=settings.FAKE_LLM_TOOL_CALL_PATTERN,
+            streaming=streaming,
+            admission_limiter=LLMFactory.get_admission_limiter("fake", model)
+        )
+    
+    @staticmethod
+    def get_available_providers() -> List[Dict]:
         """获取可用的LLM提供商列表"""
-        config = _load_model_config()
+        return LLMFactory._list_providers(_load_model_config())
+    
+    @staticmethod
+    def _list_providers(config) -> List[Dict]:
+        """配置中有 API Key 的提供商及其模型"""
         providers = []
         
         # 从配置文件加载提供商信息
@@ -5,8 +5,12 @@ from langgraph.store.memory import InMemoryStore
 from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from app.core.config import settings
-from psycopg_pool import ConnectionPool, AsyncConnectionPool
+from app.db.pool import checkpoint_conninfo, get_async_pool
+from psycopg_pool import ConnectionPool
+
+# 提示词中对话历史部分的标题与结尾
+HISTORY_HEADER = "\n\n📜 对话历史（请参考之前的对话内容，保持对话连贯性）:\n"
+HISTORY_FOOTER = "\n请基于以上对话历史，理解用户的意图和上下文，保持对话的连贯性。\n"
 
 
 class MemoryManager:
@@ -21,7 +25,6 @@ class MemoryManager:
     _short_term_saver: Optional[PostgresSaver] = None
     _async_short_term_saver: Optional[AsyncPostgresSaver] = None
     _connection_pool: Optional[ConnectionPool] = None
-    _async_connection_pool: Optional[AsyncConnectionPool] = None
     _short_term_saver_initialized: bool = False
     _async_short_term_saver_initialized: bool = False
     
@@ -44,13 +47,7 @@ class MemoryManager:
         """
         if cls._async_short_term_saver is None:
             # 获取数据库连接字符串
-            db_uri = settings.DATABASE_URL
-            
-            # 确保连接字符串包含 sslmode 参数（如果不存在）
-            if '?sslmode=' not in db_uri and '?' not in db_uri:
-                db_uri = f"{db_uri}?sslmode=disable"
-            elif '?sslmode=' not in db_uri and '?' in db_uri:
-                db_uri = f"{db_uri}&sslmode=disable"
+            db_uri = checkpoint_conninfo()
             
             # 首次使用时，先使用自动提交连接执行 setup（CREATE INDEX CONCURRENTLY 需要）
             if not cls._async_short_term_saver_initialized:
@@ -65,18 +62,9 @@ class MemoryManager:
                 finally:
                     cls._async_short_term_saver_initialized = True  # 标记为已尝试，避免重复尝试
             
-            # 创建异步连接池（用于长期存在的连接）
-            if cls._async_connection_pool is None:
-                cls._async_connection_pool = AsyncConnectionPool(
-                    conninfo=db_uri,
-                    min_size=1,
-                    max_size=10,
-                    open=True
-                )
-                logger.info(f"Created PostgreSQL async connection pool with DB: {db_uri.split('@')[1] if '@' in db_uri else '***'}")
-            
-            # 使用异步连接池创建 AsyncPostgresSaver
-            cls._async_short_term_saver = AsyncPostgresSaver(cls._async_connection_pool)
+            # 使用统一配置的异步连接池创建 AsyncPostgresSaver
+            connection_pool = await get_async_pool()
+            cls._async_short_term_saver = AsyncPostgresSaver(connection_pool)
             logger.info("Initialized async short-term memory saver (AsyncPostgresSaver) with connection pool")
         
         return cls._async_short_term_saver
@@ -133,14 +121,30 @@ class MemoryManager:
         Returns:
             格式化的历史对话上下文字符串
         """
-        if not memory or "messages" not in memory or not memory["messages"]:
+        lines = MemoryManager.get_history_lines(memory, max_messages)
+        if not lines:
             return ""
+        return HISTORY_HEADER + "".join(lines) + HISTORY_FOOTER
+    
+    @staticmethod
+    def get_history_lines(
+        memory: Optional[Dict[str, Any]] = None,
+        max_messages: int = 20
+    ) -> List[str]:
+        """获取最近的历史消息，每条格式化为 "角色: 内容" 并以换行结尾，供提示词预算按行裁剪
+        
+        Args:
+            memory: 内存字典，包含 messages 列表
+            max_messages: 最大消息数量
+        """
+        if not memory or "messages" not in memory or not memory["messages"]:
+            return []
         
         messages = memory["messages"]
         # 只取最近的消息
         recent_messages = messages[-max_messages:] if len(messages) > max_messages else messages
         
-        history_context = "\n\n📜 对话历史（请参考之前的对话内容，保持对话连贯性）:\n"
+        lines = []
         for msg in recent_messages:
             if hasattr(msg, 'content'):
                 # 判断消息类型
@@ -153,10 +157,8 @@ class MemoryManager:
                 
                 # 限制每条消息长度，避免过长
                 content = msg.content[:500] + "..." if len(msg.content) > 500 else msg.content
-                history_context += f"{role}: {content}\n"
-        
-        history_context += "\n请基于以上对话历史，理解用户的意图和上下文，保持对话的连贯性。\n"
-        return history_context
+                lines.append(f"{role}: {content}\n")
+        return lines
     
     @staticmethod
     def messages_to_dict(messages: List[BaseMessage]) -> List[Dict]:
@@ -0,0 +1,196 @@
+"""预设路由 - 在进程内按语义选择角色预设
+
+- ChromaDB 的 prompts 集合是数据源：首次使用时读取所有分块向量，按 preset_id 去重
+  （同一预设的分块向量取平均并归一化），每个预设一行写入 VectorIndex（连续矩阵，可选 float16/int8/二值压缩）
+- 选择预设：矩阵与查询向量做一次乘法，再用 argpartition 取 top-k，全程不访问网络；
+  分类/标签条件在取 top-k 之前作为行掩码过滤，满足条件的预设足够时恰好返回 k 个
+- 预设增删改时只更新对应的行（删除时用最后一行填补空位），不重新读取整个集合；
+  多 worker 部署时其他进程按刷新间隔从 ChromaDB 重新加载
+"""
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+from app.core.config import settings
+from app.services.vector_index import VectorIndex
+
+ChunkEmbeddings = Tuple[List[str], List[Sequence[float]], List[Dict]]  # (每个分块所属的 preset_id, 分块向量, 分块元数据)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _parse_tags(tags) -> FrozenSet[str]:
+    """标签集合（ChromaDB 元数据中为逗号分隔的字符串）"""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return frozenset(tag.strip() for tag in tags or [] if tag and tag.strip())
+
+
+class PresetRouter:
+    """角色预设向量索引"""
+
+    def __init__(self, refresh_interval: float, quantization: str = "float32"):
+        self.refresh_interval = refresh_interval
+        self._index = VectorIndex(quantization, rescore_factor=settings.VECTOR_INDEX_RESCORE_FACTOR)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._categories: List[str] = []  # 与行对应
+        self._tags: List[FrozenSet[str]] = []  # 与行对应
+        self._loaded_at = None
+        self._mutations = 0  # 增量更新次数（用于丢弃与更新并发的全量加载结果）
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ---------- 加载 ----------
+
+    def ensure_loaded(self, load: Callable[[], ChunkEmbeddings]):
+        """首次使用或超过刷新间隔时从数据源重新加载"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        with self._load_lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+                return
+            mutations = self._mutations
+            chunk_preset_ids, embeddings, metadatas = load()
+            ids, matrix = self._build(chunk_preset_ids, embeddings)
+            first_metadata = {}
+            for preset_id, metadata in zip(chunk_preset_ids, metadatas):
+                first_metadata.setdefault(preset_id, metadata or {})
+            with self._lock:
+                if self._mutations != mutations:
+                    # 加载期间有预设被修改，结果可能已过期，下次使用时重新加载
+                    logger.info("Role presets changed while loading the preset router, will reload")
+                    return
+                self._index.build(matrix)
+                self._ids = ids
+                self._rows = {preset_id: row for row, preset_id in enumerate(ids)}
+                self._categories = [first_metadata[preset_id].get("category") or "general" for preset_id in ids]
+                self._tags = [_parse_tags(first_metadata[preset_id].get("tags")) for preset_id in ids]
+                self._loaded_at = time.monotonic()
+            logger.info(
+                f"Loaded preset router: {len(ids)} presets from {len(chunk_preset_ids)} chunks "
+                f"({self._index.mode}, {self._index.nbytes / 1024:.1f} KiB)"
+            )
+
+    @staticmethod
+    def _build(chunk_preset_ids: List[str], embeddings: List[Sequence[float]]) -> Tuple[List[str], np.ndarray]:
+        """分块向量按 preset_id 去重（取平均后归一化）"""
+        if not chunk_preset_ids:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        preset_ids, inverse = np.unique(np.asarray(chunk_preset_ids), return_inverse=True)
+        matrix = np.zeros((len(preset_ids), vectors.shape[1]), dtype=np.float32)
+        np.add.at(matrix, inverse, vectors)
+        return preset_ids.tolist(), _normalize(matrix)
+
+    # ---------- 增量更新 ----------
+
+    def upsert(
+        self,
+        preset_id: str,
+        chunk_embeddings: List[Sequence[float]],
+        category: str = "general",
+        tags: Optional[List[str]] = None
+    ):
+        """新增或更新预设的行（chunk_embeddings 为该预设所有分块的向量）"""
+        if not len(chunk_embeddings):
+            self.remove(preset_id)
+            return
+        vector = _normalize(np.asarray(chunk_embeddings, dtype=np.float32)).sum(axis=0)
+        with self._lock:
+            self._mutations += 1
+            if len(self._ids) and vector.shape[0] != self._index.dim:
+                logger.warning(f"Embedding dimension changed ({self._index.dim} -> {vector.shape[0]}), reloading preset router")
+                self._loaded_at = None
+                return
+            row = self._rows.get(preset_id)
+            if row is None:
+                row = len(self._ids)
+                self._ids.append(preset_id)
+                self._rows[preset_id] = row
+                self._categories.append(category)
+                self._tags.append(_parse_tags(tags))
+            else:
+                self._categories[row] = category
+                self._tags[row] = _parse_tags(tags)
+            self._index.put(row, vector)
+
+    def update_metadata(self, preset_id: str, category: str, tags: Optional[List[str]]):
+        """只更新预设的分类和标签（向量不变）"""
+        with self._lock:
+            row = self._rows.get(preset_id)
+            if row is not None:
+                self._categories[row] = category
+                self._tags[row] = _parse_tags(tags)
+
+    def remove(self, preset_id: str):
+        """删除预设的行（最后一行移到空位上，矩阵保持连续）"""
+        with self._lock:
+            self._mutations += 1
+            row = self._rows.pop(preset_id, None)
+            if row is None:
+                return
+            self._index.remove(row)
+            last = self._ids.pop()
+            last_category = self._categories.pop()
+            last_tags = self._tags.pop()
+            if row < len(self._ids):
+                self._ids[row] = last
+                self._rows[last] = row
+                self._categories[row] = last_category
+                self._tags[row] = last_tags
+
+    # ---------- 查询 ----------
+
+    def top_k(
+        self,
+        query_embedding: Sequence[float],
+        k: int,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """余弦相似度最高的 k 个预设
+
+        Args:
+            query_embedding: 查询向量
+            k: 返回的预设数量
+            category: 可选，只在该分类中选择
+            tags: 可选，只在包含所有这些标签的预设中选择
+
+        Returns:
+            [(preset_id, 相似度)]，按相似度从高到低排列
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            if not self._ids or k <= 0:
+                return []
+            if query.shape[0] != self._index.dim:
+                logger.warning(f"Query embedding dimension {query.shape[0]} does not match preset router ({self._index.dim})")
+                return []
+            rows, scores = self._index.search(query, k, mask=self._filter_mask(category, tags))
+            return [(self._ids[row], float(score)) for row, score in zip(rows, scores)]
+
+    def _filter_mask(self, category: Optional[str], tags: Optional[List[str]]) -> Optional[np.ndarray]:
+        """满足分类/标签条件的行（没有条件时返回 None）"""
+        required = _parse_tags(tags)
+        if not category and not required:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        if category:
+            mask &= np.fromiter((c == category for c in self._categories), dtype=bool, count=len(self._ids))
+        if required:
+            mask &= np.fromiter((required <= t for t in self._tags), dtype=bool, count=len(self._ids))
+        return mask
+
+
+# 全局实例
+preset_router = PresetRouter(
+    refresh_interval=settings.ROLE_PRESET_CACHE_TTL,
+    quantization=settings.VECTOR_INDEX_QUANTIZATION
+)
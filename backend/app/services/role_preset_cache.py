@@ -0,0 +1,84 @@
+"""角色预设缓存 - 按 preset_id 缓存渲染好的提示词块（预设的语义选择见 app.services.preset_router）
+
+- 提示词块：每个预设渲染一次（"[标题]\\n内容\\n"），之后的对话直接使用，不再查询 PostgreSQL
+- 版本化失效：预设新增/更新/删除时递增该预设的版本号；加载期间版本发生变化的结果不会写入缓存，
+  避免并发更新时写回旧数据。多 worker 部署时其他进程依靠 TTL 过期
+- 共享缓存：本进程未命中时先读 Redis 中的提示词块（键中带共享版本号，修改预设时递增），
+  一个 worker 加载后其他 worker 不必再查询 PostgreSQL
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from loguru import logger
+from app.core.cache import shared_cache
+from app.core.config import settings
+from app.core.metrics import metrics
+
+_CACHE_REQUESTS = metrics.counter(
+    "role_preset_cache_requests_total", "角色预设缓存访问次数", labelnames=("kind", "result")
+)
+
+
+def render_preset_block(preset: Dict) -> str:
+    """渲染单个角色预设的提示词块"""
+    return f"[{preset.get('title', '')}]\n{preset.get('content', '')}\n"
+
+
+@dataclass
+class _CachedBlock:
+    version: int
+    expires_at: float
+    block: Optional[str]  # None 表示预设不存在
+
+
+class RolePresetCache:
+    """角色预设缓存"""
+
+    def __init__(self):
+        self._blocks: Dict[str, _CachedBlock] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, preset_id: str):
+        """预设新增/更新/删除后调用"""
+        with self._lock:
+            self._versions[preset_id] = self._versions.get(preset_id, 0) + 1
+            self._blocks.pop(preset_id, None)
+        shared_cache.bump("role_preset", preset_id)
+        logger.debug(f"Role preset cache invalidated for {preset_id}")
+
+    def get_block(self, preset_id: str, load: Callable[[str], Optional[Dict]]) -> Optional[str]:
+        """获取预设的提示词块，未缓存时调用 load(preset_id) 加载预设
+
+        Returns:
+            提示词块，预设不存在时返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(preset_id, 0)
+            cached = self._blocks.get(preset_id)
+        if cached is not None and cached.version == version and cached.expires_at > now:
+            _CACHE_REQUESTS.labels("block", "hit").inc()
+            return cached.block
+
+        _CACHE_REQUESTS.labels("block", "miss").inc()
+        shared_version = shared_cache.version("role_preset", preset_id)
+        block = shared_cache.get_or_set(
+            "role_preset", f"{preset_id}:{shared_version}", settings.ROLE_PRESET_CACHE_TTL,
+            lambda: {"block": self._render(preset_id, load)}
+        )["block"]
+        with self._lock:
+            # 加载期间预设被修改时不写入缓存
+            if self._versions.get(preset_id, 0) == version:
+                self._blocks[preset_id] = _CachedBlock(version, now + settings.ROLE_PRESET_CACHE_TTL, block)
+        return block
+
+    @staticmethod
+    def _render(preset_id: str, load: Callable[[str], Optional[Dict]]) -> Optional[str]:
+        preset = load(preset_id)
+        return render_preset_block(preset) if preset else None
+
+
+# 全局实例
+role_preset_cache = RolePresetCache()
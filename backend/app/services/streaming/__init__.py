@@ -1,7 +1,14 @@
 """流式处理模块"""
 from .stream_handler import StreamCallbackHandler
+from .sse import SSEWriter, encode_event, sse_writer
+from .event_log import EventLogStore, TurnEventLog, event_log_store
 
 __all__ = [
-    "StreamCallbackHandler"
+    "StreamCallbackHandler",
+    "SSEWriter",
+    "encode_event",
+    "sse_writer",
+    "EventLogStore",
+    "TurnEventLog",
+    "event_log_store"
 ]
-
@@ -0,0 +1,331 @@
+"""流式事件日志 - 每轮对话的事件写入有界日志，断线后可按 Last-Event-ID 续传
+
+- Agent 在后台生产者任务中运行，产生的事件按序号（从 1 开始）追加到该轮的 TurnEventLog
+- HTTP 连接只是日志的订阅者：先回放指定序号之后的事件，再跟随实时事件
+- 相邻的同类文本事件（thinking / content）在日志中合并为一段，每个 token 仍占一个序号，
+  日志容量按合并后的段数计算，足以覆盖整轮回答；回放时从续传位置开始合并输出
+- 所有订阅者都断开后，生产者还会继续运行一个宽限期，期间重连只需回放，不会重新调用 LLM；
+  宽限期内没有重连则取消生产者（Agent 任务随之取消，已生成的部分回复照常保存）
+- 可选 Redis 层：事件同时镜像到 Redis 列表（每次唤醒把积压的事件一次写入），请求落到其他 worker 时也能回放并跟随；
+  镜像落后到事件被移出日志时放弃镜像并删除列表，其他 worker 不会从不完整的列表续传
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from itertools import islice
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from loguru import logger
+from app.core.config import settings
+
+_REDIS_KEY_PREFIX = "chat:stream:"
+_REDIS_POLL_INTERVAL = 0.2  # 跟随 Redis 中未结束的流时的轮询间隔（秒）
+
+# 可以在日志中合并的文本事件类型（与 SSEWriter 合并的类型一致）
+_TEXT_TYPES = ("thinking", "content")
+
+_GAP_MESSAGE = "部分事件已过期，无法从该位置续传，请重新提问"
+
+
+class StreamGapError(Exception):
+    """请求续传的位置已被移出日志"""
+
+
+class _Entry:
+    """日志中的一项：一个普通事件，或一段序号连续的同类文本事件（每个 piece 对应一个序号）"""
+    __slots__ = ("first_seq", "event", "text_type", "pieces", "chars")
+
+    def __init__(self, seq: int, event: Dict):
+        self.first_seq = seq
+        self.event = event
+        self.text_type: Optional[str] = None
+        self.pieces: List[str] = []
+        self.chars = 0
+        if event.get("type") in _TEXT_TYPES and event.keys() <= {"type", "content"}:
+            self.text_type = event["type"]
+            self._add(event.get("content", ""))
+
+    @property
+    def last_seq(self) -> int:
+        return self.first_seq + len(self.pieces) - 1 if self.text_type else self.first_seq
+
+    def merge(self, event: Dict, max_chars: int) -> bool:
+        """把紧随其后的同类文本事件并入该段，不能合并时返回 False"""
+        if (
+            self.text_type is None
+            or event.get("type") != self.text_type
+            or event.keys() > {"type", "content"}
+            or self.chars >= max_chars
+        ):
+            return False
+        self._add(event.get("content", ""))
+        return True
+
+    def _add(self, content: str):
+        self.pieces.append(content)
+        self.chars += len(content)
+
+    def events_after(self, after: int, coalesce: bool) -> List[Tuple[int, Dict]]:
+        """该项中序号大于 after 的事件（coalesce 时合并为一个事件，序号取最后一个）"""
+        if self.text_type is None:
+            return [(self.first_seq, self.event)]
+        offset = max(0, after - self.first_seq + 1)
+        if coalesce:
+            return [(self.last_seq, {"type": self.text_type, "content": "".join(self.pieces[offset:])})]
+        return [
+            (self.first_seq + i, {"type": self.text_type, "content": piece})
+            for i, piece in enumerate(self.pieces[offset:], offset)
+        ]
+
+
+class TurnEventLog:
+    """单轮对话的事件日志"""
+
+    def __init__(self, stream_id: str, max_events: int, grace_period: float, max_text_chars: int = 1024):
+        self.stream_id = stream_id
+        self.grace_period = grace_period
+        self.finished = False
+        self.producer: Optional[asyncio.Task] = None
+        self._entries: Deque[_Entry] = deque(maxlen=max_events)
+        self._max_text_chars = max_text_chars  # 每段合并文本的最大字符数
+        self._last_seq = 0
+        self._new_data = asyncio.Event()
+        self._subscribers = 0
+        self._grace_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def append(self, event: Dict) -> int:
+        """追加事件并唤醒订阅者，返回事件序号"""
+        self._last_seq += 1
+        if not self._entries or not self._entries[-1].merge(event, self._max_text_chars):
+            self._entries.append(_Entry(self._last_seq, event))
+        self._wake()
+        return self._last_seq
+
+    def finish(self):
+        """标记该轮结束（订阅者读完剩余事件后退出）"""
+        self.finished = True
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        self._wake()
+
+    def events_after(self, after: int, coalesce: bool = True) -> List[Tuple[int, Dict]]:
+        """获取序号大于 after 的事件
+
+        Args:
+            after: 已收到的最后一个事件序号
+            coalesce: 是否把同一段中的文本事件合并为一个（序号取最后一个）
+        """
+        if not self._entries or after >= self._last_seq:
+            return []
+        first_seq = self._entries[0].first_seq
+        if after < first_seq - 1:
+            raise StreamGapError(f"事件 {after + 1}-{first_seq - 1} 已被移出日志")
+        # 订阅者通常只落后几项，从尾部向前找到包含 after + 1 的项
+        start = len(self._entries) - 1
+        while start > 0 and self._entries[start].first_seq > after + 1:
+            start -= 1
+        items = []
+        for entry in islice(self._entries, start, None):
+            items.extend(entry.events_after(after, coalesce))
+        return items
+
+    async def batches(self, after: int = 0, coalesce: bool = True) -> AsyncIterator[List[Tuple[int, Dict]]]:
+        """回放并跟随 after 之后的事件，每次唤醒时返回当前积压的全部事件，直到该轮结束
+
+        不计入订阅者（不影响宽限期判断）；续传位置已被移出日志时抛出 StreamGapError。
+        """
+        while True:
+            # 先取得当前的唤醒事件再读日志，避免漏掉读取之后追加的事件
+            new_data = self._new_data
+            items = self.events_after(after, coalesce)
+            if items:
+                after = items[-1][0]
+                yield items
+            elif self.finished:
+                return
+            else:
+                await new_data.wait()
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[Tuple[int, Dict]]:
+        """回放 after（Last-Event-ID）之后的事件，然后跟随实时事件直到该轮结束"""
+        self._attach()
+        try:
+            while True:
+                # 先取得当前的唤醒事件再读日志，避免漏掉读取之后追加的事件
+                new_data = self._new_data
+                try:
+                    items = self.events_after(after)
+                except StreamGapError as e:
+                    logger.warning(f"Cannot resume stream {self.stream_id}: {e}")
+                    yield self._last_seq, {"type": "error", "message": _GAP_MESSAGE}
+                    return
+
+                for seq, event in items:
+                    after = seq
+                    yield seq, event
+
+                if not items:
+                    if self.finished:
+                        return
+                    await new_data.wait()
+        finally:
+            self._detach()
+
+    def _wake(self):
+        self._new_data.set()
+        self._new_data = asyncio.Event()
+
+    def _attach(self):
+        self._subscribers += 1
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+
+    def _detach(self):
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self.finished:
+            # 所有客户端都已断开：宽限期后仍无人重连则取消生产者
+            loop = asyncio.get_running_loop()
+            self._grace_handle = loop.call_later(self.grace_period, self._cancel_if_abandoned)
+
+    def _cancel_if_abandoned(self):
+        self._grace_handle = None
+        if self._subscribers == 0 and not self.finished and self.producer is not None:
+            logger.info(f"No client reconnected to stream {self.stream_id} within {self.grace_period}s, cancelling")
+            self.producer.cancel()
+
+
+class EventLogStore:
+    """事件日志注册表 - 启动生产者、按 stream_id 查找日志并清理过期日志"""
+
+    def __init__(self):
+        self._logs: Dict[str, TurnEventLog] = {}
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()  # 已结束的日志，按结束时间排序
+
+    def start(self, events: AsyncIterator[Dict]) -> TurnEventLog:
+        """在后台运行事件源，事件写入新的日志"""
+        self._purge()
+        stream_id = uuid.uuid4().hex
+        log = TurnEventLog(
+            stream_id, settings.SSE_EVENT_LOG_MAX_EVENTS, settings.SSE_RESUME_GRACE_PERIOD,
+            max_text_chars=settings.SSE_COALESCE_MAX_CHARS
+        )
+        # 第一个事件告诉客户端续传时使用的 stream_id
+        log.append({"type": "stream_id", "stream_id": stream_id})
+        self._logs[stream_id] = log
+
+        loop = asyncio.get_running_loop()
+        log.producer = loop.create_task(self._produce(log, events))
+        if settings.SSE_EVENT_LOG_REDIS:
+            loop.create_task(self._mirror_to_redis(log))
+        return log
+
+    def get(self, stream_id: str) -> Optional[TurnEventLog]:
+        self._purge()
+        return self._logs.get(stream_id)
+
+    async def resume(self, stream_id: str, after: int) -> Optional[AsyncIterator[Tuple[int, Dict]]]:
+        """续传：优先使用本进程的日志，否则尝试从 Redis 回放；都没有时返回 None"""
+        log = self.get(stream_id)
+        if log is not None:
+            return log.subscribe(after)
+        if settings.SSE_EVENT_LOG_REDIS:
+            return await self._resume_from_redis(stream_id, after)
+        return None
+
+    async def _produce(self, log: TurnEventLog, events: AsyncIterator[Dict]):
+        try:
+            async with aclosing(events) as source:
+                async for event in source:
+                    log.append(event)
+        except asyncio.CancelledError:
+            logger.info(f"Stream {log.stream_id} producer cancelled")
+        except Exception as e:
+            logger.error(f"Stream {log.stream_id} producer error: {e}")
+            log.append({"type": "error", "message": str(e)})
+        finally:
+            log.finish()
+            self._expiry[log.stream_id] = time.monotonic() + settings.SSE_EVENT_LOG_TTL
+
+    def _purge(self):
+        """删除已结束且超过保留时间的日志"""
+        now = time.monotonic()
+        while self._expiry:
+            stream_id, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._expiry.popitem(last=False)
+            self._logs.pop(stream_id, None)
+
+    # ---------- Redis 层 ----------
+
+    def _redis(self):
+        from app.core.cache import shared_cache
+        return shared_cache.async_client
+
+    async def _mirror_to_redis(self, log: TurnEventLog):
+        """把日志事件镜像到 Redis 列表（列表下标 + 1 即事件序号），每次唤醒把积压的事件一次写入"""
+        import orjson
+
+        key = _REDIS_KEY_PREFIX + log.stream_id
+        ttl = int(settings.SSE_EVENT_LOG_TTL)
+        client = self._redis()
+        try:
+            async for items in log.batches(after=0, coalesce=False):
+                await client.pipeline().rpush(key, *(orjson.dumps(event) for _, event in items)).expire(key, ttl).execute()
+            await client.set(key + ":done", 1, ex=ttl)
+        except StreamGapError as e:
+            # 镜像跟不上日志：删除不完整的列表（不写结束标记），其他 worker 不再从 Redis 续传
+            logger.warning(f"Redis mirror of stream {log.stream_id} fell behind, dropping it: {e}")
+            try:
+                await client.delete(key)
+            except Exception as e:
+                logger.warning(f"Failed to drop Redis mirror of stream {log.stream_id}: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to mirror stream {log.stream_id} to Redis: {e}")
+
+    async def _resume_from_redis(self, stream_id: str, after: int) -> Optional[AsyncIterator[Tuple[int, Dict]]]:
+        import orjson
+
+        key = _REDIS_KEY_PREFIX + stream_id
+        client = self._redis()
+        try:
+            if not await client.exists(key):
+                return None
+        except Exception as e:
+            logger.warning(f"Failed to look up stream {stream_id} in Redis: {e}")
+            return None
+
+        async def replay() -> AsyncIterator[Tuple[int, Dict]]:
+            index = after
+            while True:
+                items = await client.lrange(key, index, -1)
+                for raw in items:
+                    index += 1
+                    yield index, orjson.loads(raw)
+                if items:
+                    continue
+                done, exists = await client.pipeline().exists(key + ":done").exists(key).execute()
+                if done:
+                    # 结束标记在最后一个事件之后写入，再读一次确保没有遗漏
+                    for raw in await client.lrange(key, index, -1):
+                        index += 1
+                        yield index, orjson.loads(raw)
+                    return
+                if not exists:
+                    # 镜像已被放弃（跟不上日志）或已过期
+                    yield index, {"type": "error", "message": _GAP_MESSAGE}
+                    return
+                await asyncio.sleep(_REDIS_POLL_INTERVAL)
+
+        return replay()
+
+
+# 全局实例
+event_log_store = EventLogStore()
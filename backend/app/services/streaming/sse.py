@@ -0,0 +1,141 @@
+"""SSE 输出 - 合并相邻的文本块并快速编码为 SSE 帧
+
+LLM 按 token 输出时，每个 token 单独编码、单独写 socket 的开销远大于内容本身。
+SSEWriter 在一个很短的时间/大小窗口内把相邻的同类文本事件（thinking / content）合并为一帧，
+其他事件（tool / done / error 等）会先冲刷已缓冲的文本，再立即发送，保持事件顺序不变。
+提供 is_disconnected 时会定期检查客户端是否已断开，断开后立即关闭事件源。
+事件源产生 (事件序号, 事件) 元组时，每帧带上 id 行（合并帧使用其中最后一个事件的序号），
+客户端重连时通过 Last-Event-ID 告知已收到的位置。
+"""
+import asyncio
+import contextvars
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+from loguru import logger
+from app.core.config import settings
+
+try:
+    import orjson
+
+    def _dumps(data: Dict) -> bytes:
+        return orjson.dumps(data)
+except ImportError:  # pragma: no cover - orjson 未安装时退回标准库
+    import json
+
+    def _dumps(data: Dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# 可以合并的文本事件类型
+MERGEABLE_TYPES = ("thinking", "content")
+
+
+def encode_event(data: Dict, event_id: Optional[str] = None) -> bytes:
+    """把一个事件编码为 SSE 帧"""
+    if event_id is None:
+        return b"data: " + _dumps(data) + b"\n\n"
+    return b"id: " + event_id.encode("utf-8") + b"\ndata: " + _dumps(data) + b"\n\n"
+
+
+class SSEWriter:
+    """SSE 写出器 - 在时间/大小窗口内合并文本事件"""
+
+    def __init__(self, max_delay: Optional[float] = None, max_chars: Optional[int] = None):
+        self.max_delay = settings.SSE_COALESCE_WINDOW if max_delay is None else max_delay
+        self.max_chars = settings.SSE_COALESCE_MAX_CHARS if max_chars is None else max_chars
+
+    async def stream(
+        self,
+        events: AsyncIterator[Union[Dict, Tuple[int, Dict]]],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[bytes]:
+        """把事件流转换为合并后的 SSE 帧流
+
+        事件源的每一步都在同一个上下文中执行（与直接迭代时一致），
+        这样事件源内设置的 contextvars（如耗时追踪）在后续步骤中仍然有效。
+
+        Args:
+            events: 事件字典（或 (事件序号, 事件字典) 元组）的异步迭代器
+            is_disconnected: 检查客户端是否已断开的协程函数（如 Request.is_disconnected）
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        iterator = events.__aiter__()
+        pending: Optional[Dict] = None  # 正在合并的文本事件
+        pending_id: Optional[str] = None  # 已合并的最后一个事件的序号
+        flush_at = 0.0
+        next_event: Optional[asyncio.Task] = None
+        watcher = loop.create_task(self._watch_disconnect(is_disconnected)) if is_disconnected else None
+
+        try:
+            while True:
+                if next_event is None:
+                    next_event = loop.create_task(iterator.__anext__(), context=context)
+
+                if not next_event.done():
+                    # 有缓冲的文本时，最多等到窗口结束就先发出去；同时关注客户端是否断开
+                    timeout = None if pending is None else max(0.0, flush_at - loop.time())
+                    waiters = {next_event} if watcher is None else {next_event, watcher}
+                    await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if watcher is not None and watcher.done():
+                        logger.info("Client disconnected, closing event stream")
+                        return
+                    if not next_event.done():
+                        yield encode_event(pending, pending_id)
+                        pending = None
+                        continue
+
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_event = None
+
+                event_id = None
+                if isinstance(event, tuple):
+                    seq, event = event
+                    event_id = str(seq)
+
+                if event.get("type") in MERGEABLE_TYPES:
+                    if pending is not None and pending["type"] == event["type"]:
+                        pending["content"] += event.get("content", "")
+                    else:
+                        if pending is not None:
+                            yield encode_event(pending, pending_id)
+                        pending = {"type": event["type"], "content": event.get("content", "")}
+                        flush_at = loop.time() + self.max_delay
+                    pending_id = event_id
+                    if len(pending["content"]) >= self.max_chars:
+                        yield encode_event(pending, pending_id)
+                        pending = None
+                    continue
+
+                if pending is not None:
+                    yield encode_event(pending, pending_id)
+                    pending = None
+                yield encode_event(event, event_id)
+
+            if pending is not None:
+                yield encode_event(pending, pending_id)
+        finally:
+            # 客户端断开等情况下，停止读取事件源
+            if watcher is not None and not watcher.done():
+                watcher.cancel()
+            if next_event is not None and not next_event.done():
+                next_event.cancel()
+                try:
+                    await next_event
+                except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                    pass
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    @staticmethod
+    async def _watch_disconnect(is_disconnected: Callable[[], Awaitable[bool]]):
+        """定期检查客户端连接，断开时返回"""
+        while not await is_disconnected():
+            await asyncio.sleep(settings.SSE_DISCONNECT_CHECK_INTERVAL)
+
+
+# 全局实例
+sse_writer = SSEWriter()
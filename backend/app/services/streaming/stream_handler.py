@@ -1,6 +1,10 @@
 """流式回调处理器"""
+from collections import deque
 from langchain_core.callbacks import AsyncCallbackHandler
 from typing import List, Dict, Optional
+from time import perf_counter
+from app.core.tracing import record
+from app.llm.usage import record_prompt_usage
 from loguru import logger
 
 
@@ -9,13 +13,16 @@ class StreamCallbackHandler(AsyncCallbackHandler):
     
     def __init__(self):
         super().__init__()
-        self.chunks = []
+        self.chunks = deque()
         self.current_tool = None
         self.current_thinking = ""
         self.in_final_answer = False
         self.done = False
         self.error = None
         self.buffer = ""  # 用于累积token
+        self._llm_started_at: Optional[float] = None  # 当前这次LLM调用的开始时间
+        self._first_token_recorded = False
+        self._llm_model = "unknown"  # 当前这次LLM调用的模型（用于用量统计）
         
     def has_new_data(self) -> bool:
         """检查是否有新数据"""
@@ -24,7 +31,7 @@ class StreamCallbackHandler(AsyncCallbackHandler):
     def get_latest_chunk(self) -> Optional[Dict]:
         """获取最新的数据块"""
         if self.chunks:
-            return self.chunks.pop(0)
+            return self.chunks.popleft()
         return None
     
     def is_done(self) -> bool:
@@ -81,6 +88,10 @@ class StreamCallbackHandler(AsyncCallbackHandler):
         if not token:
             return
         
+        if not self._first_token_recorded and self._llm_started_at is not None:
+            record("llm.first_token", perf_counter() - self._llm_started_at, self._llm_started_at)
+            self._first_token_recorded = True
+        
         logger.debug(f"Received token: {token[:50]}...")  # 调试日志
         
         # 累积token到buffer用于分析
@@ -136,11 +147,22 @@ class StreamCallbackHandler(AsyncCallbackHandler):
         self.in_final_answer = False
         self.current_thinking = ""
         self.buffer = ""
+        self._llm_started_at = perf_counter()
+        self._first_token_recorded = False
+        self._llm_model = (kwargs.get("metadata") or {}).get("ls_model_name") or "unknown"
         logger.debug("LLM started, resetting state")
     
     async def on_llm_end(self, response, **kwargs):
         """LLM结束输出时，发送剩余的推理内容和最终答案"""
         logger.debug("LLM ended, flushing remaining content")
+        if self._llm_started_at is not None:
+            record("llm.call", perf_counter() - self._llm_started_at, self._llm_started_at)
+            self._llm_started_at = None
+        
+        # 提示词用量与前缀缓存命中情况（提供商返回用量信息时）
+        usage = record_prompt_usage(response, self._llm_model)
+        if usage is not None:
+            logger.debug(f"LLM prompt tokens: {usage.prompt_tokens}, prefix cache hit: {usage.cached_tokens}")
         
         # 发送剩余的推理内容
         if self.current_thinking.strip() and not self.in_final_answer:
@@ -1,13 +1,14 @@
 """Agent 工具模块"""
-from .web_search_tool import create_web_search_tool, web_search_tool
-from .web_scraper_tool import web_scraper_tool, pdf_parser_tool
-from .knowledge_tool import knowledge_retrieval_tool
+from .web_search_tool import create_web_search_tool, get_web_search_tool
+from .web_scraper_tool import get_web_scraper_tool, get_pdf_parser_tool
+from .knowledge_tool import get_knowledge_retrieval_tool
+from .calculator_tool import get_calculator_tool
 
 __all__ = [
     "create_web_search_tool",
-    "web_search_tool",
-    "web_scraper_tool", 
-    "pdf_parser_tool",
-    "knowledge_retrieval_tool"
+    "get_web_search_tool",
+    "get_web_scraper_tool", 
+    "get_pdf_parser_tool",
+    "get_knowledge_retrieval_tool",
+    "get_calculator_tool"
 ]
-
@@ -0,0 +1,331 @@
+"""计算器工具 - 基于 AST 白名单的安全表达式求值
+
+表达式只解析一次并编译为闭包树（LRU 缓存），之后重复计算无需再次解析；
+不使用 eval，只允许数字、白名单函数/常量和算术运算。
+列表和 range(...) 会转换为 NumPy 数组，支持向量化计算，例如 sqrt([1, 4, 9])、sum(range(1, 101))。
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+from langchain_core.tools import Tool
+from app.services.tools.runtime import tool_runtime
+
+# 输入与计算规模限制，防止 9**9**9 之类的表达式占满 CPU
+MAX_EXPRESSION_LENGTH = 1000  # 表达式最大长度
+MAX_NODES = 200  # 语法树最大节点数
+MAX_INT_BITS = 4096  # 整数结果最大位数（约 1233 位十进制数）
+MAX_EXPONENT = 10000  # 幂运算指数绝对值上限
+MAX_FACTORIAL = 536  # 阶乘参数上限（536! 是不超过 MAX_INT_BITS 位的最大阶乘）
+MAX_ARRAY_SIZE = 100000  # 列表/range 以及任何数组结果（含广播后）的最大元素个数
+MAX_ELEMENTWISE_SIZE = 10000  # atan2/hypot/gcd/factorial 等逐元素调用 Python 函数时的最大元素个数
+MAX_DISPLAY_ITEMS = 50  # 结果数组最多展示的元素个数
+
+
+class CalculatorError(ValueError):
+    """表达式不合法或超出计算限制"""
+
+
+Compiled = Callable[[], Any]
+
+
+def _is_array(value: Any) -> bool:
+    return isinstance(value, np.ndarray)
+
+
+def _check_int(value: Any) -> Any:
+    """限制整数结果大小"""
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalculatorError(f"结果过大（超过 {MAX_INT_BITS} 位二进制）")
+    return value
+
+
+def _check_array(value: Any) -> Any:
+    """限制数组结果的元素个数"""
+    if _is_array(value) and value.size > MAX_ARRAY_SIZE:
+        raise CalculatorError(f"数组元素个数不能超过 {MAX_ARRAY_SIZE}")
+    return value
+
+
+def _broadcast_size(*args: Any) -> int:
+    """参数广播后的元素个数（只计算形状，不分配内存）"""
+    try:
+        return np.broadcast(*args).size
+    except ValueError as e:
+        raise CalculatorError(f"数组形状不匹配: {e}") from e
+
+
+def _check_broadcast(*args: Any, limit: int = MAX_ARRAY_SIZE):
+    """在计算之前检查数组参数广播后的规模"""
+    if any(_is_array(a) for a in args) and _broadcast_size(*args) > limit:
+        raise CalculatorError(f"数组元素个数不能超过 {limit}")
+
+
+def _array_op(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """二元运算：数组参数先检查广播规模"""
+    def checked(left: Any, right: Any) -> Any:
+        _check_broadcast(left, right)
+        return op(left, right)
+    return checked
+
+
+def _pow(base: Any, exponent: Any) -> Any:
+    """带规模检查的幂运算"""
+    if _is_array(base) or _is_array(exponent):
+        _check_broadcast(base, exponent)
+        return np.power(np.asarray(base, dtype=np.float64), exponent)
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise CalculatorError(f"指数过大（绝对值不能超过 {MAX_EXPONENT}）")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        # 结果位数至少为 (bit_length - 1) * exponent，超限时不进行计算
+        if (base.bit_length() - 1) * exponent > MAX_INT_BITS:
+            raise CalculatorError(f"结果过大（超过 {MAX_INT_BITS} 位二进制）")
+    return operator.pow(base, exponent)
+
+
+def _factorial(n: Any) -> int:
+    if not float(n).is_integer() or n < 0:
+        raise CalculatorError("factorial 只接受非负整数")
+    if n > MAX_FACTORIAL:
+        raise CalculatorError(f"factorial 参数不能超过 {MAX_FACTORIAL}")
+    return _check_int(math.factorial(int(n)))
+
+
+def _range(*args: Any) -> np.ndarray:
+    if not all(isinstance(a, int) for a in args):
+        raise CalculatorError("range 只接受整数参数")
+    r = range(*args)
+    if len(r) > MAX_ARRAY_SIZE:
+        raise CalculatorError(f"range 元素个数不能超过 {MAX_ARRAY_SIZE}")
+    return np.arange(r.start, r.stop, r.step, dtype=np.float64)
+
+
+def _log(x: Any, base: Optional[Any] = None) -> Any:
+    if _is_array(x) or _is_array(base):
+        if base is not None:
+            _check_broadcast(x, base)
+        result = np.log(x)
+        return result if base is None else result / np.log(base)
+    return math.log(x) if base is None else math.log(x, base)
+
+
+def _round(x: Any, ndigits: Optional[int] = None) -> Any:
+    if _is_array(x):
+        return np.round(x, ndigits or 0)
+    return round(x) if ndigits is None else round(x, ndigits)
+
+
+def _aggregate(scalar_func: Callable, array_func: Callable) -> Callable:
+    """聚合函数：单个数组参数时按数组聚合，否则按多个标量参数计算"""
+    def aggregate(*args: Any) -> Any:
+        if len(args) == 1 and _is_array(args[0]):
+            return array_func(args[0])
+        return scalar_func(args)
+    return aggregate
+
+
+def _elementwise(scalar_func: Callable) -> Callable:
+    """没有 NumPy 对应实现的函数：对数组逐元素计算（每个元素一次 Python 调用，规模限制更严）"""
+    def elementwise(*args: Any) -> Any:
+        if any(_is_array(a) for a in args):
+            _check_broadcast(*args, limit=MAX_ELEMENTWISE_SIZE)
+            return np.array([scalar_func(*values) for values in np.broadcast(*args)], dtype=np.float64)
+        return scalar_func(*args)
+    return elementwise
+
+
+def _unary(scalar_func: Callable, array_func: Callable) -> Callable:
+    """一元函数：标量走 math，数组走对应的 NumPy ufunc"""
+    def unary(x: Any) -> Any:
+        return array_func(x) if _is_array(x) else scalar_func(x)
+    return unary
+
+
+# 允许调用的函数
+_FUNCTIONS: Dict[str, Callable] = {
+    "sqrt": _unary(math.sqrt, np.sqrt),
+    "exp": _unary(math.exp, np.exp),
+    "log": _log,
+    "ln": _unary(math.log, np.log),
+    "log10": _unary(math.log10, np.log10),
+    "log2": _unary(math.log2, np.log2),
+    "sin": _unary(math.sin, np.sin),
+    "cos": _unary(math.cos, np.cos),
+    "tan": _unary(math.tan, np.tan),
+    "asin": _unary(math.asin, np.arcsin),
+    "acos": _unary(math.acos, np.arccos),
+    "atan": _unary(math.atan, np.arctan),
+    "sinh": _unary(math.sinh, np.sinh),
+    "cosh": _unary(math.cosh, np.cosh),
+    "tanh": _unary(math.tanh, np.tanh),
+    "degrees": _unary(math.degrees, np.degrees),
+    "radians": _unary(math.radians, np.radians),
+    "floor": _unary(math.floor, np.floor),
+    "ceil": _unary(math.ceil, np.ceil),
+    "fabs": _unary(math.fabs, np.fabs),
+    "abs": _unary(abs, np.abs),
+    "atan2": _elementwise(math.atan2),
+    "hypot": _elementwise(math.hypot),
+    "gcd": _elementwise(lambda a, b: math.gcd(int(a), int(b))),
+    "factorial": _elementwise(_factorial),
+    "pow": _pow,
+    "round": _round,
+    "range": _range,
+    "sum": _aggregate(sum, np.sum),
+    "min": _aggregate(min, np.min),
+    "max": _aggregate(max, np.max),
+    "mean": _aggregate(lambda values: sum(values) / len(values), np.mean),
+    "len": lambda x: int(x.size) if _is_array(x) else 1,
+}
+
+# 允许使用的常量
+_CONSTANTS: Dict[str, Any] = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+    "inf": math.inf,
+}
+
+_BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: _array_op(operator.add),
+    ast.Sub: _array_op(operator.sub),
+    ast.Mult: _array_op(operator.mul),
+    ast.Div: _array_op(operator.truediv),
+    ast.FloorDiv: _array_op(operator.floordiv),
+    ast.Mod: _array_op(operator.mod),
+    ast.Pow: _pow,
+}
+
+_UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _compile_node(node: ast.AST) -> Compiled:
+    """把白名单内的语法树节点编译为闭包"""
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalculatorError(f"不支持的常量: {value!r}")
+        _check_int(value)
+        return lambda: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in _CONSTANTS:
+            raise CalculatorError(f"未知的名称: {node.id}")
+        value = _CONSTANTS[node.id]
+        return lambda: value
+
+    if isinstance(node, ast.BinOp):
+        op = _BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculatorError(f"不支持的运算符: {type(node.op).__name__}")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda: _check_array(_check_int(op(left(), right())))
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculatorError(f"不支持的运算符: {type(node.op).__name__}")
+        operand = _compile_node(node.operand)
+        return lambda: op(operand())
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        if len(node.elts) > MAX_ARRAY_SIZE:
+            raise CalculatorError(f"列表元素个数不能超过 {MAX_ARRAY_SIZE}")
+        items = [_compile_node(elt) for elt in node.elts]
+
+        def build_array() -> np.ndarray:
+            values = [item() for item in items]
+            # 嵌套列表会生成多维数组，先按元素总数检查再分配
+            if sum(v.size if _is_array(v) else 1 for v in values) > MAX_ARRAY_SIZE:
+                raise CalculatorError(f"数组元素个数不能超过 {MAX_ARRAY_SIZE}")
+            return np.array(values, dtype=np.float64)
+        return build_array
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+            raise CalculatorError(f"不支持的函数: {ast.unparse(node.func)}")
+        if node.keywords:
+            raise CalculatorError("函数不支持关键字参数")
+        func = _FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda: _check_array(func(*[arg() for arg in args]))
+
+    raise CalculatorError(f"不支持的语法: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str) -> Compiled:
+    """解析并编译表达式（按表达式文本缓存）"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalculatorError(f"表达式过长（不能超过 {MAX_EXPRESSION_LENGTH} 个字符）")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise CalculatorError(f"表达式语法错误: {e.msg}") from e
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise CalculatorError(f"表达式过于复杂（语法树节点超过 {MAX_NODES} 个）")
+    return _compile_node(tree.body)
+
+
+def evaluate(expression: str) -> Any:
+    """计算表达式，返回 int/float 或 NumPy 数组"""
+    compiled = compile_expression(expression)
+    with np.errstate(all="ignore"):
+        return compiled()
+
+
+def _format_result(result: Any) -> str:
+    if _is_array(result):
+        values = [_format_number(v) for v in result[:MAX_DISPLAY_ITEMS].tolist()]
+        if result.size > MAX_DISPLAY_ITEMS:
+            values.append(f"...(共 {result.size} 个)")
+        return f"[{', '.join(values)}]"
+    return _format_number(result)
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    return str(value)
+
+
+def calculate(expression: str) -> str:
+    """计算数学表达式，返回给 Agent 的文本结果"""
+    try:
+        return f"计算结果: {_format_result(evaluate(expression))}"
+    except CalculatorError as e:
+        return f"计算错误: {str(e)}"
+    except Exception as e:
+        return f"计算错误: {str(e) or type(e).__name__}"
+
+
+def create_calculator_tool() -> Tool:
+    """创建计算器工具"""
+
+    async def acalculate(expression: str) -> str:
+        """计算数学表达式（在进程池中执行，不阻塞事件循环，超时限制可以生效）"""
+        return await tool_runtime.run_in_process(calculate, expression)
+
+    return Tool(
+        name="calculator",
+        func=calculate,
+        coroutine=tool_runtime.limit("calculator", acalculate),
+        description=(
+            "执行数学计算。输入应该是一个数学表达式，例如: '2+2' 或 '10*5' 或 'sqrt(16)'。"
+            "支持 + - * / // % **、pi/e 常量和 sqrt/log/sin/factorial/round 等函数；"
+            "也支持对列表或 range 批量计算，例如 'sqrt([1, 4, 9])'、'sum(range(1, 101))'、'mean([3, 5, 10])'。"
+        )
+    )
+
+
+@lru_cache(maxsize=1)
+def get_calculator_tool() -> Tool:
+    """获取计算器工具实例（首次调用时创建）"""
+    return create_calculator_tool()
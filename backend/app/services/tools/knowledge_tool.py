@@ -1,65 +1,95 @@
 """知识库检索工具"""
+import asyncio
+from functools import lru_cache
+from typing import Dict, List
 from langchain_core.tools import Tool
 from app.services.knowledge_service import knowledge_service
+from app.services.tools.runtime import tool_runtime
 from loguru import logger
 
+# 检索的集合
+_COLLECTIONS_TO_SEARCH = ["prompts", "default", "documents"]
+
+
+def _format_results(all_results: List[Dict]) -> str:
+    """按相似度排序并格式化检索结果"""
+    if not all_results:
+        return "未在知识库中找到相关信息"
+
+    # 按相似度排序
+    all_results.sort(key=lambda x: x.get('score', 0), reverse=True)
+
+    # 取top 5
+    top_results = all_results[:5]
+
+    # 格式化结果
+    formatted = []
+    for i, r in enumerate(top_results, 1):
+        source = r.get('source_collection', 'unknown')
+        score = r.get('score', 0)
+        content = r.get('content', '')
+        metadata = r.get('metadata', {})
+
+        formatted.append(
+            f"[结果 {i}] (来源: {source}, 相似度: {score:.2f})\n"
+            f"{content}"
+        )
+
+        # 如果有标题或其他metadata，也显示
+        if metadata.get('title'):
+            formatted[-1] = f"[结果 {i}] 标题: {metadata['title']}\n" + formatted[-1]
+
+    return "\n\n".join(formatted)
+
+
+def _search_collection(collection_name: str, query: str) -> List[Dict]:
+    """检索单个集合，结果标注来源集合"""
+    try:
+        results = knowledge_service.search(collection_name, query, top_k=2)
+        for r in results:
+            r['source_collection'] = collection_name
+        return results
+    except Exception as e:
+        logger.debug(f"Collection {collection_name} not found or error: {e}")
+        return []
+
 
 def create_knowledge_retrieval_tool() -> Tool:
     """创建知识库检索工具"""
-    
+
     def search_knowledge_base(query: str) -> str:
-        """搜索知识库"""
+        """搜索知识库（同步版本）"""
         try:
             # 搜索多个集合
-            collections_to_search = ["prompts", "default", "documents"]
             all_results = []
-            
-            for collection_name in collections_to_search:
-                try:
-                    results = knowledge_service.search(collection_name, query, top_k=2)
-                    if results:
-                        for r in results:
-                            r['source_collection'] = collection_name
-                        all_results.extend(results)
-                except Exception as e:
-                    logger.debug(f"Collection {collection_name} not found or error: {e}")
-                    continue
-            
-            if not all_results:
-                return "未在知识库中找到相关信息"
-            
-            # 按相似度排序
-            all_results.sort(key=lambda x: x.get('score', 0), reverse=True)
-            
-            # 取top 5
-            top_results = all_results[:5]
-            
-            # 格式化结果
-            formatted = []
-            for i, r in enumerate(top_results, 1):
-                source = r.get('source_collection', 'unknown')
-                score = r.get('score', 0)
-                content = r.get('content', '')
-                metadata = r.get('metadata', {})
-                
-                formatted.append(
-                    f"[结果 {i}] (来源: {source}, 相似度: {score:.2f})\n"
-                    f"{content}"
-                )
-                
-                # 如果有标题或其他metadata，也显示
-                if metadata.get('title'):
-                    formatted[-1] = f"[结果 {i}] 标题: {metadata['title']}\n" + formatted[-1]
-            
-            return "\n\n".join(formatted)
-            
+            for collection_name in _COLLECTIONS_TO_SEARCH:
+                all_results.extend(_search_collection(collection_name, query))
+
+            return _format_results(all_results)
+
+        except Exception as e:
+            logger.error(f"Knowledge retrieval error: {e}")
+            return f"知识库检索出错: {str(e)}"
+
+    async def asearch_knowledge_base(query: str) -> str:
+        """搜索知识库（异步版本：在I/O线程池中并发检索多个集合）"""
+        try:
+            results_per_collection = await asyncio.gather(*[
+                tool_runtime.run_in_thread(_search_collection, collection_name, query)
+                for collection_name in _COLLECTIONS_TO_SEARCH
+            ])
+            all_results = [r for results in results_per_collection for r in results]
+
+            return _format_results(all_results)
+
         except Exception as e:
             logger.error(f"Knowledge retrieval error: {e}")
             return f"知识库检索出错: {str(e)}"
-    
+
     return Tool(
         name="knowledge_base_search",
         func=search_knowledge_base,
+        coroutine=tool_runtime.limit("knowledge_base_search", asearch_knowledge_base),
         description=(
             "知识库检索工具。用于从内部知识库中检索相关信息，包括提示词模板、文档、历史记录等。"
             "输入应该是一个检索查询字符串。"
@@ -68,6 +98,7 @@ def create_knowledge_retrieval_tool() -> Tool:
     )
 
 
-# 创建工具实例
-knowledge_retrieval_tool = create_knowledge_retrieval_tool()
-
+@lru_cache(maxsize=1)
+def get_knowledge_retrieval_tool() -> Tool:
+    """获取知识库检索工具实例（首次调用时创建）"""
+    return create_knowledge_retrieval_tool()
@@ -0,0 +1,125 @@
+"""工具运行时 - 为工具提供异步执行环境，并施加按工具划分的并发与超时限制
+
+- I/O 型工具使用原生协程（共享的 httpx.AsyncClient）或专用线程池（同步客户端，如 ChromaDB）
+- CPU 型工具（HTML/PDF 解析）在专用进程池中执行，避免阻塞事件循环和争抢 GIL
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
+from loguru import logger
+from app.core.config import settings
+from app.core.tracing import span
+
+
+@dataclass(frozen=True)
+class ToolLimits:
+    """单个工具的执行限制"""
+    max_concurrency: int  # 进程内该工具的最大并发调用数
+    timeout: float  # 单次调用的超时时间（秒，包含排队时间）
+
+
+# 各工具的默认限制，未列出的工具使用 TOOL_DEFAULT_* 配置
+TOOL_LIMITS: Dict[str, ToolLimits] = {
+    "calculator": ToolLimits(max_concurrency=16, timeout=5.0),
+    "knowledge_base_search": ToolLimits(max_concurrency=8, timeout=15.0),
+    "web_search": ToolLimits(max_concurrency=8, timeout=20.0),
+    "web_content_fetcher": ToolLimits(max_concurrency=4, timeout=20.0),
+    "pdf_parser": ToolLimits(max_concurrency=2, timeout=45.0),
+}
+
+
+class ToolRuntime:
+    """工具运行时 - 管理工具专用的执行器、HTTP 客户端和并发信号量"""
+
+    def __init__(self):
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        """I/O 型同步工具使用的线程池"""
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=settings.TOOL_THREAD_POOL_SIZE,
+                thread_name_prefix="tool-io"
+            )
+        return self._thread_pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        """CPU 型工具使用的进程池"""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=settings.TOOL_PROCESS_POOL_SIZE)
+        return self._process_pool
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """工具共享的异步 HTTP 客户端（复用连接）"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=settings.TOOL_HTTP_MAX_CONNECTIONS)
+            )
+        return self._http_client
+
+    async def run_in_thread(self, func: Callable, *args, **kwargs) -> Any:
+        """在 I/O 线程池中执行同步函数（携带当前上下文，使耗时追踪能关联到请求）"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.thread_pool, partial(context.run, func, *args, **kwargs))
+
+    async def run_in_process(self, func: Callable, *args) -> Any:
+        """在进程池中执行 CPU 密集型函数（func 和参数必须可被 pickle）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.process_pool, func, *args)
+
+    def get_limits(self, tool_name: str) -> ToolLimits:
+        return TOOL_LIMITS.get(
+            tool_name,
+            ToolLimits(max_concurrency=settings.TOOL_DEFAULT_CONCURRENCY, timeout=settings.TOOL_DEFAULT_TIMEOUT)
+        )
+
+    def _semaphore(self, tool_name: str) -> asyncio.Semaphore:
+        if tool_name not in self._semaphores:
+            self._semaphores[tool_name] = asyncio.Semaphore(self.get_limits(tool_name).max_concurrency)
+        return self._semaphores[tool_name]
+
+    def limit(self, tool_name: str, coroutine: Callable[[str], Awaitable[str]]) -> Callable[[str], Awaitable[str]]:
+        """为工具协程加上并发和超时限制，超时时返回错误说明而非抛出异常"""
+        limits = self.get_limits(tool_name)
+
+        async def run_limited(tool_input: str) -> str:
+            async with self._semaphore(tool_name):
+                return await coroutine(tool_input)
+
+        async def limited(tool_input: str) -> str:
+            try:
+                with span(f"tool.{tool_name}"):
+                    return await asyncio.wait_for(run_limited(tool_input), timeout=limits.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {tool_name} timed out after {limits.timeout}s")
+                return f"工具 {tool_name} 执行超时（{limits.timeout:.0f}秒），请稍后重试或换一种方式"
+
+        return limited
+
+    async def shutdown(self):
+        """释放执行器和 HTTP 客户端（应用退出时调用）"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+
+# 全局实例
+tool_runtime = ToolRuntime()
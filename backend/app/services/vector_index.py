@@ -0,0 +1,230 @@
+"""进程内向量索引 - 可选的紧凑存储（float16 / int8 标量量化 / 二值码）与候选重排
+
+- float32：原始精度（4 字节/维）
+- float16：半精度（2 字节/维，2 倍压缩），召回几乎无损
+- int8：按维度的对称标量量化（1 字节/维，4 倍压缩），量化尺度在全量构建时按各维度的最大绝对值校准，
+  之后新增的向量超出范围时截断
+- binary：按符号取 1 位（1 位/维，32 倍压缩），用汉明距离粗排出 k × rescore_factor 个候选，再重排：
+  调用方提供原始向量（rescore 回调，例如从磁盘或 ChromaDB 读取）时用全精度余弦重排，
+  否则用全精度查询向量与候选的 ±1 码做非对称点积重排
+- 打分按块进行，临时内存不随索引大小增长
+
+向量在写入前归一化，分数为余弦相似度（binary 未提供 rescore 时为近似值）。
+另提供 pack_embedding / unpack_embedding，用于把向量以紧凑格式写入缓存。
+"""
+import struct
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+QUANTIZATION_MODES = ("float32", "float16", "int8", "binary")
+
+_BLOCK_ROWS = 1024  # 按块打分时每块的行数（块转换为 float32 后留在 CPU 缓存中）
+_INITIAL_CAPACITY = 64
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(values)
+    return _POPCOUNT[values]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的 k 个下标（从高到低）"""
+    if k < len(scores):
+        top = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class VectorIndex:
+    """按行存储的向量索引（行号由调用方维护，删除时用最后一行填补空位）"""
+
+    def __init__(self, mode: str = "float32", rescore_factor: int = 10):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}, expected one of {QUANTIZATION_MODES}")
+        self.mode = mode
+        self.rescore_factor = max(1, rescore_factor)
+        self.dim = 0
+        self._size = 0
+        self._codes = np.zeros((0, 0), dtype=self._code_dtype)  # 容量可能大于 _size
+        self._scale: Optional[np.ndarray] = None  # int8 各维度的量化尺度
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def _code_dtype(self):
+        return {"float32": np.float32, "float16": np.float16, "int8": np.int8, "binary": np.uint8}[self.mode]
+
+    @property
+    def nbytes(self) -> int:
+        """有效行占用的字节数"""
+        return int(self._codes[:self._size].nbytes) + (int(self._scale.nbytes) if self._scale is not None else 0)
+
+    # ---------- 写入 ----------
+
+    def build(self, vectors: np.ndarray):
+        """用一批向量重建索引（int8 在此时校准量化尺度）"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        self._size = 0
+        if vectors.size == 0:
+            self.dim = 0
+            self._codes = np.zeros((0, 0), dtype=self._code_dtype)
+            self._scale = None
+            return
+        self.dim = vectors.shape[1]
+        if self.mode == "int8":
+            self._scale = np.maximum(np.abs(vectors).max(axis=0), 1e-6) / 127
+        self._codes = np.ascontiguousarray(self._encode(vectors))
+        self._size = len(vectors)
+
+    def put(self, row: int, vector: np.ndarray):
+        """写入一行（row 等于当前行数时追加）"""
+        vector = _normalize(np.asarray(vector, dtype=np.float32))
+        if self._size == 0 and self.dim != vector.shape[0]:
+            self.dim = vector.shape[0]
+            self._codes = np.zeros((0, self._row_width), dtype=self._code_dtype)
+            self._scale = None
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Vector dimension {vector.shape[0]} does not match index ({self.dim})")
+        if self.mode == "int8" and self._scale is None:
+            # 未经全量构建时使用单位向量各分量的典型范围
+            self._scale = np.full(self.dim, 4 / np.sqrt(self.dim) / 127, dtype=np.float32)
+        if row == self._size:
+            self._grow(row + 1)
+            self._size += 1
+        self._codes[row] = self._encode(vector[None, :])[0]
+
+    def remove(self, row: int):
+        """删除一行（最后一行移到该位置）"""
+        last = self._size - 1
+        if row != last:
+            self._codes[row] = self._codes[last]
+        self._size = last
+
+    @property
+    def _row_width(self) -> int:
+        return (self.dim + 7) // 8 if self.mode == "binary" else self.dim
+
+    def _grow(self, size: int):
+        if self._codes.shape[0] >= size:
+            return
+        capacity = max(_INITIAL_CAPACITY, size, self._codes.shape[0] * 2)
+        codes = np.zeros((capacity, self._row_width), dtype=self._code_dtype)
+        codes[:self._size] = self._codes[:self._size]
+        self._codes = codes
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.mode == "float32":
+            return vectors
+        if self.mode == "float16":
+            return vectors.astype(np.float16)
+        if self.mode == "int8":
+            return np.clip(np.rint(vectors / self._scale), -127, 127).astype(np.int8)
+        return np.packbits(vectors > 0, axis=1)
+
+    # ---------- 查询 ----------
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        rescore: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """相似度最高的 k 行
+
+        Args:
+            query: 查询向量
+            k: 返回的行数
+            rescore: 可选，按行号返回原始 float32 向量，用于对候选做全精度重排
+            mask: 可选，长度等于行数的布尔数组，只在为 True 的行中选择（先过滤再取 top-k）
+
+        Returns:
+            (行号数组, 分数数组)，按分数从高到低排列；满足过滤条件的行不少于 k 时恰好返回 k 行
+        """
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self._size == 0 or k <= 0:
+            return empty
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query dimension {query.shape[0]} does not match index ({self.dim})")
+
+        size = self._size
+        if mask is not None:
+            size = int(np.count_nonzero(mask))
+            if size == 0:
+                return empty
+        k = min(k, size)
+        rescoring = self.mode == "binary" or rescore is not None
+        candidates = min(size, k * self.rescore_factor) if rescoring else k
+        scores = self._coarse_scores(query)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        rows = _top(scores, candidates)
+        if not rescoring:
+            return rows, scores[rows]
+
+        if rescore is not None:
+            fine = _normalize(np.asarray(rescore(rows), dtype=np.float32)) @ query
+        else:
+            # 非对称重排：全精度查询向量与候选的 ±1 码
+            signs = np.unpackbits(self._codes[rows], axis=1, count=self.dim).astype(np.float32) * 2 - 1
+            fine = signs @ query / np.sqrt(self.dim)
+        order = _top(fine, k)
+        return rows[order], fine[order]
+
+    def _coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        """按块计算所有有效行的分数（binary 为负汉明距离）"""
+        scores = np.empty(self._size, dtype=np.float32)
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            for start in range(0, self._size, _BLOCK_ROWS):
+                block = self._codes[start:min(start + _BLOCK_ROWS, self._size)]
+                scores[start:start + len(block)] = -_popcount(block ^ query_bits).sum(axis=1, dtype=np.int32)
+            return scores
+
+        weights = query * self._scale if self.mode == "int8" else query
+        if self.mode == "float32":
+            return self._codes[:self._size] @ weights
+        buffer = np.empty((min(_BLOCK_ROWS, self._size), self.dim), dtype=np.float32)
+        for start in range(0, self._size, _BLOCK_ROWS):
+            block = self._codes[start:min(start + _BLOCK_ROWS, self._size)]
+            np.copyto(buffer[:len(block)], block)
+            scores[start:start + len(block)] = buffer[:len(block)] @ weights
+        return scores
+
+
+# ---------- 缓存中的紧凑格式 ----------
+
+def pack_embedding(vector, mode: str = "float16") -> bytes:
+    """把向量编码为紧凑的字节串（float16：2 字节/维；int8：4 字节尺度 + 1 字节/维）"""
+    vector = np.asarray(vector, dtype=np.float32)
+    if mode == "float32":
+        return b"f" + vector.tobytes()
+    if mode == "float16":
+        return b"h" + vector.astype(np.float16).tobytes()
+    if mode == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return b"b" + struct.pack("<f", scale) + codes.tobytes()
+    raise ValueError(f"Unsupported cache encoding: {mode}")
+
+
+def unpack_embedding(data: bytes) -> np.ndarray:
+    """解码 pack_embedding 的结果为 float32 向量"""
+    kind, payload = data[:1], data[1:]
+    if kind == b"f":
+        return np.frombuffer(payload, dtype=np.float32).copy()
+    if kind == b"h":
+        return np.frombuffer(payload, dtype=np.float16).astype(np.float32)
+    if kind == b"b":
+        (scale,) = struct.unpack("<f", payload[:4])
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding encoding: {kind!r}")
@@ -0,0 +1,183 @@
+"""启动预热 - 在后台并发完成建表、连接池、checkpoint、Embedding 模型和工具的初始化
+
+- 必需阶段（建表、checkpoint、连接池、工具）全部成功后才标记为就绪；失败或超时的阶段按指数退避在后台重试，
+  期间保持未就绪（/health 返回 503），数据库等依赖恢复后自动就绪，无需重启进程
+- 可选阶段（Embedding 模型、ChromaDB、预设路由、tokenizer）在后台继续执行，不阻塞就绪，失败时首次使用时再初始化
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+from app.core.config import settings
+
+
+class WarmupState:
+    """预热状态 - 供 /health 就绪检查使用"""
+
+    def __init__(self):
+        self.ready = False
+        self.failed = False  # 必需阶段失败或超时（后台重试中）
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stages: Dict[str, Dict] = {}
+
+    def as_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "failed": self.failed,
+            "elapsed_seconds": elapsed,
+            "stages": self.stages,
+        }
+
+
+# 全局实例
+warmup_state = WarmupState()
+
+
+async def _run_stage(name: str, func: Callable[[], Awaitable], required: bool = True) -> bool:
+    """执行单个预热阶段并记录耗时，失败不影响其他阶段，返回是否成功"""
+    start = time.monotonic()
+    warmup_state.stages[name] = {"status": "running", "required": required}
+    try:
+        await func()
+        warmup_state.stages[name] = {"status": "ok", "required": required, "seconds": round(time.monotonic() - start, 3)}
+        logger.info(f"Warm-up stage '{name}' finished in {time.monotonic() - start:.2f}s")
+        return True
+    except asyncio.CancelledError:
+        # 超时后被取消
+        warmup_state.stages[name] = {"status": "timeout", "required": required, "seconds": round(time.monotonic() - start, 3)}
+        logger.warning(f"Warm-up stage '{name}' did not finish in time")
+        raise
+    except Exception as e:
+        warmup_state.stages[name] = {
+            "status": "failed", "required": required, "seconds": round(time.monotonic() - start, 3), "error": str(e)
+        }
+        logger.warning(f"Warm-up stage '{name}' failed: {e}")
+        return False
+
+
+def _create_tables():
+    from sqlalchemy import text
+    from app.db.database import engine, Base
+    if engine.dialect.name == "postgresql":
+        # role_presets 标题的三元组索引依赖 pg_trgm（PostgreSQL 13+ 中为可信扩展，数据库所有者即可创建）
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception as e:
+            logger.warning(f"Failed to create pg_trgm extension: {e}")
+    Base.metadata.create_all(bind=engine)
+
+
+async def _warm_pools():
+    from app.db.pool import warm_up_pools
+    await warm_up_pools()
+
+
+async def _warm_checkpointer():
+    from app.services.memory import MemoryManager
+    await MemoryManager.get_short_term_saver()
+
+
+def _load_embeddings():
+    from app.services.knowledge_service import knowledge_service
+    _ = knowledge_service.embeddings
+
+
+def _connect_chroma():
+    from app.services.knowledge_service import knowledge_service
+    knowledge_service.chroma_client.heartbeat()
+
+
+def _load_preset_router():
+    from app.services.knowledge_service import knowledge_service
+    from app.services.preset_router import preset_router
+    preset_router.ensure_loaded(knowledge_service.get_role_preset_chunk_embeddings)
+
+
+def _load_tokenizer():
+    from app.services.agent.prompt_budget import load_tokenizer
+    load_tokenizer()
+
+
+def _build_tools():
+    from app.services.tools import (
+        get_web_search_tool,
+        get_web_scraper_tool,
+        get_pdf_parser_tool,
+        get_knowledge_retrieval_tool
+    )
+    get_knowledge_retrieval_tool()
+    get_web_search_tool()
+    get_web_scraper_tool()
+    get_pdf_parser_tool()
+
+
+async def _run_required_stage(name: str, func: Callable[[], Awaitable]):
+    """执行必需阶段，失败或超时后按指数退避重试，直到成功"""
+    delay = settings.WARMUP_RETRY_INTERVAL
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            succeeded = await asyncio.wait_for(_run_stage(name, func), timeout=settings.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            succeeded = False
+        warmup_state.stages[name]["attempts"] = attempt
+        if succeeded:
+            return
+        warmup_state.failed = True
+        logger.warning(f"Required warm-up stage '{name}' failed (attempt {attempt}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.WARMUP_RETRY_MAX_INTERVAL)
+
+
+async def _run_required(optional: List[asyncio.Task]):
+    """执行必需阶段（建表完成后再启动其他阶段），全部成功后返回"""
+    # 建表需先于其他阶段完成
+    await _run_required_stage("database_tables", lambda: asyncio.to_thread(_create_tables))
+    if not settings.WARMUP_ENABLED:
+        return
+
+    # 可选阶段在后台执行，不阻塞就绪
+    for name, func in (
+        ("embeddings", _load_embeddings),
+        ("chromadb", _connect_chroma),
+        ("preset_router", _load_preset_router),
+        ("tokenizer", _load_tokenizer),
+    ):
+        optional.append(asyncio.create_task(
+            _run_stage(name, lambda func=func: asyncio.to_thread(func), required=False)
+        ))
+
+    stages = [
+        _run_required_stage("checkpointer", _warm_checkpointer),
+        _run_required_stage("tools", lambda: asyncio.to_thread(_build_tools)),
+    ]
+    if settings.DB_POOL_PREWARM:
+        stages.append(_run_required_stage("db_pools", _warm_pools))
+    await asyncio.gather(*stages)
+
+
+async def run_warmup():
+    """执行启动预热，必需阶段全部成功（含重试）后将服务标记为就绪"""
+    warmup_state.started_at = time.monotonic()
+    optional: List[asyncio.Task] = []
+    try:
+        await _run_required(optional)
+
+        warmup_state.finished_at = time.monotonic()
+        warmup_state.ready = True
+        warmup_state.failed = False
+        logger.info(f"Warm-up finished in {warmup_state.finished_at - warmup_state.started_at:.2f}s, service ready")
+
+        if optional:
+            await asyncio.wait_for(asyncio.gather(*optional), timeout=settings.WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Optional warm-up stages did not finish within {settings.WARMUP_TIMEOUT}s")
+    finally:
+        for task in optional:
+            task.cancel()
@@ -0,0 +1 @@
+"""离线基准测试 - 在不依赖外部服务的情况下测量 Agent 流水线自身的开销"""
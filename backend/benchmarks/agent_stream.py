@@ -0,0 +1,260 @@
+"""Agent 流式输出基准测试
+
+在离线环境中（假模型 + 桩工具 + 进程内存储）并发运行 AgentService.chat_stream，
+按 chat 路由相同的方式经 SSEWriter 合并、编码为 SSE 帧，统计：
+- 首 token 时间（TTFT）
+- 通过 SSE 交付的 token 速率
+- 每个请求消耗的 CPU 时间
+- 每个打开的流占用的内存
+
+用法（在 backend 目录下）:
+    python -m benchmarks.agent_stream
+    python -m benchmarks.agent_stream --levels 1,10,100 --tool-pattern parallel --json report.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from benchmarks import offline
+
+offline.prepare_environment()
+
+from loguru import logger  # noqa: E402
+from app.api.schemas import AgentConfig  # noqa: E402
+from app.llm.fake_chat_model import TOKEN_CHARS, TOOL_CALL_PATTERNS  # noqa: E402
+from app.services.agent_service import agent_service  # noqa: E402
+from app.services.streaming import sse_writer  # noqa: E402
+
+_TEXT_TYPES = ("thinking", "content")
+
+
+@dataclass
+class StreamResult:
+    """单个流的测量结果"""
+    ttft: Optional[float] = None  # 首个文本事件的时间（秒）
+    duration: float = 0.0  # 整个流的耗时（秒）
+    text_chars: int = 0  # 交付的文本字符数（thinking + content）
+    events: int = 0  # SSE 事件数
+    sse_bytes: int = 0  # SSE 字节数
+    error: Optional[str] = None
+
+
+@dataclass
+class LevelReport:
+    """某一并发级别的汇总结果"""
+    concurrency: int
+    errors: int
+    wall_time: float
+    ttft_p50: float
+    ttft_p95: float
+    ttft_max: float
+    tokens_per_sec_per_stream: float
+    tokens_per_sec_total: float
+    events_per_stream: float
+    sse_bytes_per_stream: float
+    cpu_ms_per_request: float
+    rss_kib_per_stream: float
+    py_heap_kib_per_stream: Optional[float] = None
+    extra: Dict = field(default_factory=dict)
+
+
+def _current_rss_bytes() -> int:
+    """当前进程的常驻内存（Linux 读取 /proc，其他平台退化为峰值 RSS）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run_stream(index: int, level: int, message: str, all_open: asyncio.Event, opened: List[int]) -> StreamResult:
+    """消费一个 chat_stream，经 SSEWriter 编码为 SSE 帧并记录时间点"""
+    result = StreamResult()
+    config = AgentConfig(provider="fake", collection="default", thread_id=f"bench-{level}-{index}")
+    start = time.perf_counter()
+
+    async def tap():
+        # 在合并之前统计文本量和错误
+        async for chunk in agent_service.chat_stream(message, config=config):
+            if chunk.get("type") in _TEXT_TYPES:
+                result.text_chars += len(chunk.get("content", ""))
+            elif chunk.get("type") == "error":
+                result.error = chunk.get("message")
+            yield chunk
+
+    try:
+        async for frame in sse_writer.stream(tap()):
+            result.events += 1
+            result.sse_bytes += len(frame)
+            if result.ttft is None and result.text_chars:
+                result.ttft = time.perf_counter() - start
+                opened[0] += 1
+                if opened[0] == level:
+                    all_open.set()
+    except Exception as e:
+        result.error = str(e)
+    result.duration = time.perf_counter() - start
+    if result.ttft is None:
+        opened[0] += 1
+        if opened[0] == level:
+            all_open.set()
+    return result
+
+
+async def _sample_memory(stop: asyncio.Event, samples: List[int]):
+    while not stop.is_set():
+        samples.append(_current_rss_bytes())
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(level: int, message: str, trace_heap: bool) -> LevelReport:
+    """以指定并发数运行一轮"""
+    gc.collect()
+    baseline_rss = _current_rss_bytes()
+    if trace_heap:
+        tracemalloc.start()
+    heap_at_open = None
+
+    all_open = asyncio.Event()
+    opened = [0]
+    stop_sampling = asyncio.Event()
+    rss_samples: List[int] = []
+    sampler = asyncio.create_task(_sample_memory(stop_sampling, rss_samples))
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    tasks = [asyncio.create_task(_run_stream(i, level, message, all_open, opened)) for i in range(level)]
+
+    # 所有流都开始输出时采样一次，此时每个流都处于打开状态
+    await all_open.wait()
+    rss_at_open = _current_rss_bytes()
+    if trace_heap:
+        heap_at_open, _ = tracemalloc.get_traced_memory()
+
+    results = await asyncio.gather(*tasks)
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    stop_sampling.set()
+    await sampler
+    if trace_heap:
+        tracemalloc.stop()
+
+    ok = [r for r in results if r.error is None and r.ttft is not None]
+    ttfts = [r.ttft for r in ok]
+    per_stream_rates = [
+        (r.text_chars / TOKEN_CHARS) / (r.duration - r.ttft)
+        for r in ok if r.duration > r.ttft
+    ]
+    total_tokens = sum(r.text_chars for r in ok) / TOKEN_CHARS
+    peak_rss = max(rss_samples + [rss_at_open])
+
+    return LevelReport(
+        concurrency=level,
+        errors=len(results) - len(ok),
+        wall_time=round(wall_time, 3),
+        ttft_p50=round(_percentile(ttfts, 50), 4),
+        ttft_p95=round(_percentile(ttfts, 95), 4),
+        ttft_max=round(max(ttfts, default=0.0), 4),
+        tokens_per_sec_per_stream=round(statistics.mean(per_stream_rates), 1) if per_stream_rates else 0.0,
+        tokens_per_sec_total=round(total_tokens / wall_time, 1) if wall_time else 0.0,
+        events_per_stream=round(statistics.mean(r.events for r in results), 1),
+        sse_bytes_per_stream=round(statistics.mean(r.sse_bytes for r in results), 1),
+        cpu_ms_per_request=round(cpu_time * 1000 / level, 2),
+        rss_kib_per_stream=round((peak_rss - baseline_rss) / 1024 / level, 1),
+        py_heap_kib_per_stream=round(heap_at_open / 1024 / level, 1) if heap_at_open is not None else None,
+        extra={"first_error": next((r.error for r in results if r.error), None)}
+    )
+
+
+def _print_report(reports: List[LevelReport]):
+    header = (
+        f"{'并发':>6} {'错误':>5} {'耗时s':>8} {'TTFT p50':>9} {'TTFT p95':>9} "
+        f"{'tok/s/流':>9} {'tok/s总':>9} {'事件/流':>8} {'CPU ms/请求':>11} {'RSS KiB/流':>11} {'堆 KiB/流':>10}"
+    )
+    print(header)
+    print("-" * 110)
+    for r in reports:
+        heap = f"{r.py_heap_kib_per_stream:>10.1f}" if r.py_heap_kib_per_stream is not None else f"{'-':>10}"
+        print(
+            f"{r.concurrency:>6} {r.errors:>5} {r.wall_time:>8.2f} {r.ttft_p50:>9.3f} {r.ttft_p95:>9.3f} "
+            f"{r.tokens_per_sec_per_stream:>9.1f} {r.tokens_per_sec_total:>9.1f} {r.events_per_stream:>8.1f} "
+            f"{r.cpu_ms_per_request:>11.2f} {r.rss_kib_per_stream:>11.1f} {heap}"
+        )
+        if r.extra.get("first_error"):
+            print(f"       首个错误: {r.extra['first_error']}")
+
+
+async def main(args: argparse.Namespace) -> List[LevelReport]:
+    offline.install(offline.OfflineConfig(
+        tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_latency,
+        response_tokens=args.response_tokens,
+        tool_call_pattern=args.tool_pattern,
+        search_latency=args.search_latency,
+        tool_latency=args.tool_latency,
+    ))
+
+    # 预热一次，排除首次导入和初始化的开销
+    await run_level(1, args.message, trace_heap=False)
+
+    reports = []
+    for level in args.levels:
+        report = await run_level(level, args.message, trace_heap=args.trace_heap)
+        reports.append(report)
+    return reports
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Agent 流式输出离线基准测试")
+    parser.add_argument("--levels", default="1,10,100,1000", help="并发级别，逗号分隔")
+    parser.add_argument("--message", default="请介绍一下向量数据库的选型要点", help="发送的用户消息")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="假模型输出速率（<=0 不限速）")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="假模型首 token 延迟（秒）")
+    parser.add_argument("--response-tokens", type=int, default=200, help="每次回答的 token 数")
+    parser.add_argument("--tool-pattern", choices=TOOL_CALL_PATTERNS, default="none", help="工具调用模式")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="假知识库检索延迟（秒）")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="桩工具延迟（秒）")
+    parser.add_argument("--trace-heap", action="store_true", help="用 tracemalloc 统计 Python 堆（有额外开销）")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+    args.levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    reports = asyncio.run(main(args))
+    _print_report(reports)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json_path"},
+                "results": [asdict(r) for r in reports],
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json_path}")
@@ -0,0 +1,173 @@
+"""文档切分基准测试
+
+生成确定性的中文语料（段落长短不一，部分段落超过块大小且没有换行，模拟 PDF/网页提取的文本），
+比较以下三种方式切分整个语料的耗时与分块情况：
+- baseline：原来的 RecursiveCharacterTextSplitter(500, 50)，逐个文档切分
+- sentence：按中文句子边界切分（app.services.chunking.split_text），单进程逐个文档切分
+- pipeline：TextChunker.iter_document_chunks，文档分批在进程池中切分
+
+用法（在 backend 目录下）:
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --size-mb 20 --workers 8 --json chunking.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, List, Optional
+
+from benchmarks import offline
+
+offline.prepare_environment()
+
+from loguru import logger  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services.chunking import TextChunker, split_text  # noqa: E402
+
+_CHARS = (
+    "知识库系统文本切分向量检索模型推理数据处理流程性能优化并发吞吐延迟缓存索引查询结果用户请求服务"
+    "我们今天讨论的是如何在保证质量的前提下提高整体效率以及降低资源消耗同时兼顾可维护性与扩展性"
+)
+_ENGLISH = "The quick brown fox jumps over the lazy dog while the system processes incoming requests"
+
+
+@dataclass
+class ModeReport:
+    """某一切分方式的结果"""
+    mode: str
+    seconds: float
+    mb_per_sec: float
+    chunks: int
+    avg_chunk_chars: float
+    max_chunk_chars: int
+    speedup: float = 1.0
+
+
+def generate_corpus(size_mb: float, seed: int = 0) -> List[str]:
+    """生成总大小约 size_mb（UTF-8 字节）的文档列表：大多数为几十到几百 KB，少数为数 MB"""
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(4000):
+        if rng.random() < 0.1:
+            words = _ENGLISH.split()
+            sentences.append(" ".join(rng.choice(words) for _ in range(rng.randint(6, 20))) + ". ")
+        else:
+            body = "".join(rng.choice(_CHARS) for _ in range(rng.randint(8, 45)))
+            if rng.random() < 0.3:
+                body += "，" + "".join(rng.choice(_CHARS) for _ in range(rng.randint(5, 20)))
+            sentences.append(body + rng.choice("。。。！？；"))
+
+    target = int(size_mb * 1024 * 1024)
+    documents = []
+    total = 0
+    while total < target:
+        doc_bytes = rng.choice([5, 8]) * 1024 * 1024 if rng.random() < 0.02 else rng.randint(20, 500) * 1024
+        paragraphs = []
+        doc_total = 0
+        while doc_total < doc_bytes:
+            # 约三成段落很长（超过块大小且没有换行）
+            count = rng.randint(30, 120) if rng.random() < 0.3 else rng.randint(2, 12)
+            paragraph = "".join(rng.choices(sentences, k=count))
+            paragraphs.append(paragraph)
+            doc_total += len(paragraph.encode("utf-8")) + 2
+        document = "\n\n".join(paragraphs)
+        documents.append(document)
+        total += doc_total
+    return documents
+
+
+def _measure(mode: str, run: Callable[[], Iterator[List[str]]], size_bytes: int) -> ModeReport:
+    chunks = 0
+    chunk_chars = 0
+    max_chars = 0
+    start = time.perf_counter()
+    for doc_chunks in run():
+        chunks += len(doc_chunks)
+        for chunk in doc_chunks:
+            chunk_chars += len(chunk)
+            max_chars = max(max_chars, len(chunk))
+    seconds = time.perf_counter() - start
+    return ModeReport(
+        mode=mode,
+        seconds=round(seconds, 3),
+        mb_per_sec=round(size_bytes / 1024 / 1024 / seconds, 2),
+        chunks=chunks,
+        avg_chunk_chars=round(chunk_chars / max(chunks, 1), 1),
+        max_chunk_chars=max_chars
+    )
+
+
+def main(args: argparse.Namespace) -> List[ModeReport]:
+    settings.INGEST_PROCESS_POOL_SIZE = args.workers
+    print(f"生成语料 {args.size_mb} MB ...", file=sys.stderr)
+    documents = generate_corpus(args.size_mb, args.seed)
+    size_bytes = sum(len(d.encode("utf-8")) for d in documents)
+    print(f"{len(documents)} 个文档，{size_bytes / 1024 / 1024:.1f} MB", file=sys.stderr)
+
+    chunker = TextChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    if args.workers > 0:
+        # 先启动进程池，排除进程创建的开销
+        list(chunker.process_pool.map(split_text, ["预热。"] * args.workers))
+
+    reports = []
+    if not args.skip_baseline:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        baseline = RecursiveCharacterTextSplitter(
+            chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, length_function=len
+        )
+        reports.append(_measure("baseline", lambda: (baseline.split_text(d) for d in documents), size_bytes))
+    reports.append(_measure("sentence", lambda: (chunker.split_text(d) for d in documents), size_bytes))
+    reports.append(_measure(
+        f"pipeline x{args.workers}",
+        lambda: (chunks for _, chunks in chunker.iter_document_chunks(documents)),
+        size_bytes
+    ))
+    chunker.shutdown()
+
+    for report in reports:
+        report.speedup = round(reports[0].seconds / report.seconds, 2)
+    return reports
+
+
+def _print_report(reports: List[ModeReport]):
+    header = f"{'方式':<14} {'耗时s':>8} {'MB/s':>8} {'分块数':>9} {'平均长度':>8} {'最大长度':>8} {'加速比':>7}"
+    print(header)
+    print("-" * 72)
+    for r in reports:
+        print(
+            f"{r.mode:<14} {r.seconds:>8.2f} {r.mb_per_sec:>8.2f} {r.chunks:>9} "
+            f"{r.avg_chunk_chars:>8.1f} {r.max_chunk_chars:>8} {r.speedup:>7.2f}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="文档切分基准测试")
+    parser.add_argument("--size-mb", type=float, default=100.0, help="语料大小（MB）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="pipeline 使用的进程数（0 表示单进程）")
+    parser.add_argument("--chunk-size", type=int, default=500, help="块大小（字符）")
+    parser.add_argument("--chunk-overlap", type=int, default=50, help="块重叠（字符）")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    parser.add_argument("--skip-baseline", action="store_true", help="不运行 RecursiveCharacterTextSplitter（较慢）")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    reports = main(args)
+    _print_report(reports)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json_path"},
+                "results": [asdict(r) for r in reports],
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json_path}")
@@ -0,0 +1,141 @@
+"""向量量化基准测试
+
+生成聚类分布的归一化向量（低维语义空间随机投影到 1024 维再加噪声，模拟 text-embedding-v3 的向量），对比 VectorIndex 各存储格式的
+召回率（相对 float32 精确检索的 recall@k）、单次查询延迟和内存占用：
+- float32 / float16 / int8：直接打分
+- int8 + rescore：int8 粗排后用原始向量重排
+- binary：汉明距离粗排 + 非对称（全精度查询 × ±1 码）重排
+- binary + rescore：汉明距离粗排后用原始向量重排（原始向量可放在磁盘或 ChromaDB，不必常驻内存）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.quantization
+    python -m benchmarks.quantization --vectors 200000 --dim 1024 --rescore-factor 20 --json quantization.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from benchmarks import offline
+
+offline.prepare_environment()
+
+from app.services.vector_index import VectorIndex  # noqa: E402
+
+
+@dataclass
+class ModeReport:
+    """某一存储格式的结果"""
+    mode: str
+    memory_mib: float
+    compression: float
+    recall: float
+    latency_ms_p50: float
+    latency_ms_p95: float
+
+
+def generate_vectors(count: int, dim: int, latent_dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """聚类分布的归一化向量：latent_dim 维空间中的聚类，随机投影到 dim 维后叠加各向同性噪声"""
+    centers = rng.standard_normal((clusters, latent_dim), dtype=np.float32)
+    latent = centers[rng.integers(0, clusters, count)]
+    latent += 0.8 * rng.standard_normal((count, latent_dim), dtype=np.float32)
+    projection = rng.standard_normal((latent_dim, dim), dtype=np.float32)
+    vectors = latent @ projection
+    vectors += 0.3 * np.sqrt(latent_dim) * rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run_mode(name: str, mode: str, vectors: np.ndarray, queries: np.ndarray, truth: List[set],
+             k: int, rescore_factor: int, rescore: bool) -> ModeReport:
+    index = VectorIndex(mode, rescore_factor=rescore_factor)
+    index.build(vectors)
+    full = (lambda rows: vectors[rows]) if rescore else None
+
+    hits = 0
+    latencies = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows, _ = index.search(query, k, rescore=full)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected.intersection(rows.tolist()))
+
+    latencies.sort()
+    return ModeReport(
+        mode=name,
+        memory_mib=round(index.nbytes / 1024 / 1024, 2),
+        compression=round(vectors.nbytes / index.nbytes, 1),
+        recall=round(hits / (len(queries) * k), 4),
+        latency_ms_p50=round(statistics.median(latencies), 3),
+        latency_ms_p95=round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+    )
+
+
+def main(args: argparse.Namespace) -> List[ModeReport]:
+    rng = np.random.default_rng(args.seed)
+    print(f"生成 {args.vectors} 个 {args.dim} 维向量 ...", file=sys.stderr)
+    vectors = generate_vectors(args.vectors, args.dim, args.latent_dim, args.clusters, rng)
+    # 查询：在已有向量附近加噪声
+    queries = vectors[rng.integers(0, args.vectors, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = VectorIndex("float32")
+    exact.build(vectors)
+    truth = [set(exact.search(query, args.k)[0].tolist()) for query in queries]
+
+    modes = [
+        ("float32", "float32", False),
+        ("float16", "float16", False),
+        ("int8", "int8", False),
+        ("int8+rescore", "int8", True),
+        ("binary", "binary", False),
+        ("binary+rescore", "binary", True),
+    ]
+    return [
+        run_mode(name, mode, vectors, queries, truth, args.k, args.rescore_factor, rescore)
+        for name, mode, rescore in modes
+    ]
+
+
+def _print_report(reports: List[ModeReport]):
+    header = f"{'格式':<16} {'内存MiB':>9} {'压缩比':>7} {'recall':>8} {'延迟ms p50':>11} {'延迟ms p95':>11}"
+    print(header)
+    print("-" * 68)
+    for r in reports:
+        print(
+            f"{r.mode:<16} {r.memory_mib:>9.2f} {r.compression:>7.1f} {r.recall:>8.4f} "
+            f"{r.latency_ms_p50:>11.3f} {r.latency_ms_p95:>11.3f}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="向量量化基准测试")
+    parser.add_argument("--vectors", type=int, default=100000, help="向量数")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--latent-dim", type=int, default=64, help="生成向量的语义空间维度")
+    parser.add_argument("--clusters", type=int, default=200, help="聚类数")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--k", type=int, default=10, help="top-k")
+    parser.add_argument("--rescore-factor", type=int, default=10, help="重排候选倍数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    reports = main(args)
+    _print_report(reports)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: v for k, v in vars(args).items() if k != "json_path"},
+                "results": [asdict(r) for r in reports],
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json_path}")
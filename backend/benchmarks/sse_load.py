@@ -0,0 +1,293 @@
+"""SSE 端到端压测 - 对运行中的服务并发打开 POST /api/chat/stream 连接
+
+服务端应启用假模型（FAKE_LLM_ENABLED=true），本工具在请求中指定 provider=fake，
+逐行解析 data: 事件（conversation_id / thinking / tool / content / done / error），记录：
+- 首字节时间（TTFB）与首个文本事件时间（TTFT）
+- 事件间隔（inter-arrival）分布与卡顿（间隔超过阈值）
+- 错误率（HTTP 错误、连接异常、error 事件、未收到 done 即断开）
+
+结果写入 JSON 报告（附带 git 提交号），可用 --compare 与之前的报告对比。
+
+用法（在 backend 目录下，服务运行在 localhost:8000）:
+    python -m benchmarks.sse_load --levels 10,50,100 --json load-report.json
+    python -m benchmarks.sse_load --levels 10,50,100 --compare load-report.json
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+_TEXT_TYPES = ("thinking", "content")
+
+# 对比时展示的指标，以及数值越大是否越好
+_COMPARE_METRICS = {
+    "success_rate": True,
+    "ttfb_p50": False,
+    "ttft_p50": False,
+    "ttft_p95": False,
+    "gap_p95": False,
+    "gap_p99": False,
+    "gap_max": False,
+    "stalled_streams": False,
+    "events_per_sec": True,
+    "duration_p50": False,
+}
+
+
+@dataclass
+class StreamStats:
+    """单个 SSE 连接的统计"""
+    status: Optional[int] = None
+    ttfb: Optional[float] = None  # 收到响应头的时间（秒）
+    ttft: Optional[float] = None  # 收到首个文本事件的时间（秒）
+    duration: float = 0.0
+    gaps: List[float] = field(default_factory=list)  # 相邻事件的间隔（秒）
+    event_types: Counter = field(default_factory=Counter)
+    sse_bytes: int = 0
+    done: bool = False
+    error_kind: Optional[str] = None  # http / exception / error_event / incomplete
+    error: Optional[str] = None
+
+
+@dataclass
+class LevelResult:
+    """某一并发级别的汇总"""
+    concurrency: int
+    streams: int
+    success_rate: float
+    errors: Dict[str, int]
+    first_error: Optional[str]
+    ttfb_p50: float
+    ttfb_p95: float
+    ttft_p50: float
+    ttft_p95: float
+    ttft_p99: float
+    gap_p50: float
+    gap_p95: float
+    gap_p99: float
+    gap_max: float
+    stalls: int  # 超过阈值的事件间隔次数
+    stalled_streams: int  # 出现过卡顿的连接数
+    events_per_stream: float
+    events_per_sec: float  # 所有连接合计的事件速率
+    event_types: Dict[str, int]
+    duration_p50: float
+    duration_p95: float
+    wall_time: float
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+async def _run_stream(client: httpx.AsyncClient, url: str, payload: Dict) -> StreamStats:
+    """打开一个 SSE 连接并消费到结束"""
+    stats = StreamStats()
+    start = time.perf_counter()
+    last_event = None
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            stats.status = response.status_code
+            stats.ttfb = time.perf_counter() - start
+            if response.status_code != 200:
+                body = await response.aread()
+                stats.error_kind = "http"
+                stats.error = f"HTTP {response.status_code}: {body[:200].decode('utf-8', errors='replace')}"
+                return stats
+
+            async for line in response.aiter_lines():
+                stats.sse_bytes += len(line.encode("utf-8")) + 1
+                if not line.startswith("data: "):
+                    continue
+                now = time.perf_counter()
+                if last_event is not None:
+                    stats.gaps.append(now - last_event)
+                last_event = now
+
+                try:
+                    event = json.loads(line[6:])
+                except json.JSONDecodeError:
+                    stats.event_types["invalid"] += 1
+                    continue
+
+                event_type = event.get("type", "unknown")
+                stats.event_types[event_type] += 1
+                if event_type in _TEXT_TYPES and stats.ttft is None:
+                    stats.ttft = now - start
+                elif event_type == "done":
+                    stats.done = True
+                elif event_type == "error":
+                    stats.error_kind = "error_event"
+                    stats.error = event.get("message", "")
+
+        if stats.error_kind is None and not stats.done:
+            stats.error_kind = "incomplete"
+            stats.error = "连接在收到 done 事件前结束"
+    except Exception as e:
+        stats.error_kind = "exception"
+        stats.error = f"{type(e).__name__}: {e}"
+    finally:
+        stats.duration = time.perf_counter() - start
+    return stats
+
+
+async def run_level(args: argparse.Namespace, concurrency: int) -> LevelResult:
+    """以指定并发数打开连接，每个连接依次发起 requests_per_connection 个请求"""
+    url = f"{args.url.rstrip('/')}/api/chat/stream"
+    payload = {"message": args.message, "llm_config": {"provider": args.provider}}
+    if args.model:
+        payload["llm_config"]["model"] = args.model
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def worker() -> List[StreamStats]:
+            return [await _run_stream(client, url, payload) for _ in range(args.requests_per_connection)]
+
+        wall_start = time.perf_counter()
+        per_worker = await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall_time = time.perf_counter() - wall_start
+
+    streams = [s for stats in per_worker for s in stats]
+    ok = [s for s in streams if s.error_kind is None]
+    gaps = [g for s in streams for g in s.gaps]
+    stalls_per_stream = [sum(1 for g in s.gaps if g > args.stall_threshold) for s in streams]
+    event_types = Counter()
+    for s in streams:
+        event_types.update(s.event_types)
+    total_events = sum(event_types.values())
+
+    return LevelResult(
+        concurrency=concurrency,
+        streams=len(streams),
+        success_rate=round(len(ok) / len(streams), 4) if streams else 0.0,
+        errors=dict(Counter(s.error_kind for s in streams if s.error_kind)),
+        first_error=next((s.error for s in streams if s.error), None),
+        ttfb_p50=_percentile([s.ttfb for s in streams if s.ttfb is not None], 50),
+        ttfb_p95=_percentile([s.ttfb for s in streams if s.ttfb is not None], 95),
+        ttft_p50=_percentile([s.ttft for s in ok if s.ttft is not None], 50),
+        ttft_p95=_percentile([s.ttft for s in ok if s.ttft is not None], 95),
+        ttft_p99=_percentile([s.ttft for s in ok if s.ttft is not None], 99),
+        gap_p50=_percentile(gaps, 50),
+        gap_p95=_percentile(gaps, 95),
+        gap_p99=_percentile(gaps, 99),
+        gap_max=round(max(gaps, default=0.0), 4),
+        stalls=sum(stalls_per_stream),
+        stalled_streams=sum(1 for n in stalls_per_stream if n),
+        events_per_stream=round(total_events / len(streams), 1) if streams else 0.0,
+        events_per_sec=round(total_events / wall_time, 1) if wall_time else 0.0,
+        event_types=dict(event_types),
+        duration_p50=_percentile([s.duration for s in ok], 50),
+        duration_p95=_percentile([s.duration for s in ok], 95),
+        wall_time=round(wall_time, 3),
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_results(results: List[LevelResult], stall_threshold: float):
+    header = (
+        f"{'并发':>6} {'连接数':>6} {'成功率':>7} {'TTFB p50':>9} {'TTFT p50':>9} {'TTFT p95':>9} "
+        f"{'间隔 p95':>9} {'间隔 max':>9} {'卡顿流':>6} {'事件/s':>8}"
+    )
+    print(f"卡顿阈值: {stall_threshold}s")
+    print(header)
+    print("-" * 100)
+    for r in results:
+        print(
+            f"{r.concurrency:>6} {r.streams:>6} {r.success_rate:>7.1%} {r.ttfb_p50:>9.3f} {r.ttft_p50:>9.3f} "
+            f"{r.ttft_p95:>9.3f} {r.gap_p95:>9.3f} {r.gap_max:>9.3f} {r.stalled_streams:>6} {r.events_per_sec:>8.1f}"
+        )
+        if r.errors:
+            print(f"       错误: {r.errors}，首个错误: {r.first_error}")
+
+
+def _print_comparison(baseline: Dict, results: List[LevelResult]):
+    """与基线报告按并发级别逐项对比"""
+    baseline_levels = {r["concurrency"]: r for r in baseline.get("results", [])}
+    print(f"\n与基线对比（基线提交: {baseline.get('meta', {}).get('commit') or '未知'}）")
+    for r in results:
+        base = baseline_levels.get(r.concurrency)
+        if base is None:
+            print(f"  并发 {r.concurrency}: 基线中没有该级别")
+            continue
+        print(f"  并发 {r.concurrency}:")
+        current = asdict(r)
+        for metric, higher_is_better in _COMPARE_METRICS.items():
+            old, new = base.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            delta = new - old
+            pct = f"{delta / old:+.1%}" if old else "n/a"
+            better = (delta > 0) == higher_is_better if delta else None
+            mark = "" if better is None else (" ✓" if better else " ✗")
+            print(f"    {metric:<16} {old:>10.4g} -> {new:>10.4g}  ({pct}){mark}")
+
+
+async def main(args: argparse.Namespace) -> List[LevelResult]:
+    results = []
+    for concurrency in args.levels:
+        results.append(await run_level(args, concurrency))
+        if args.pause:
+            await asyncio.sleep(args.pause)
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="/api/chat/stream SSE 端到端压测")
+    parser.add_argument("--url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--levels", default="1,10,50,100", help="并发连接数，逗号分隔")
+    parser.add_argument("--requests-per-connection", type=int, default=1, help="每个连接依次发起的请求数")
+    parser.add_argument("--message", default="请介绍一下向量数据库的选型要点", help="发送的用户消息")
+    parser.add_argument("--provider", default="fake", help="LLM 提供商（服务端需 FAKE_LLM_ENABLED=true）")
+    parser.add_argument("--model", default=None, help="模型名称")
+    parser.add_argument("--stall-threshold", type=float, default=2.0, help="事件间隔超过该值（秒）视为卡顿")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求的读超时（秒）")
+    parser.add_argument("--pause", type=float, default=2.0, help="两个并发级别之间的间隔（秒）")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 报告")
+    parser.add_argument("--compare", help="与之前的 JSON 报告对比")
+    args = parser.parse_args(argv)
+    args.levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    _print_results(results, args.stall_threshold)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            _print_comparison(json.load(f), results)
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "config": {k: v for k, v in vars(args).items() if k not in ("json_path", "compare")},
+            },
+            "results": [asdict(r) for r in results],
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json_path}")
@@ -35,6 +35,7 @@ CREATE TABLE conversations (
 -- 创建索引
 CREATE INDEX idx_conversations_created_at ON conversations(created_at DESC);
 CREATE INDEX idx_conversations_updated_at ON conversations(updated_at DESC);
+CREATE INDEX ix_conversations_updated_at_id ON conversations(updated_at, id);
 
 COMMENT ON TABLE conversations IS '对话会话表，存储用户与AI的对话会话';
 COMMENT ON COLUMN conversations.id IS '会话ID，主键';
@@ -60,6 +61,7 @@ CREATE TABLE messages (
 CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX idx_messages_created_at ON messages(created_at DESC);
 CREATE INDEX idx_messages_role ON messages(role);
+CREATE INDEX ix_messages_conversation_id_created_at ON messages(conversation_id, created_at, id);
 
 COMMENT ON TABLE messages IS '消息表，存储对话中的每条消息';
 COMMENT ON COLUMN messages.id IS '消息ID，主键';
@@ -83,6 +85,7 @@ CREATE TABLE knowledge_bases (
 CREATE INDEX idx_knowledge_bases_name ON knowledge_bases(name);
 CREATE INDEX idx_knowledge_bases_collection_name ON knowledge_bases(collection_name);
 CREATE INDEX idx_knowledge_bases_created_at ON knowledge_bases(created_at DESC);
+CREATE INDEX ix_knowledge_bases_created_at_id ON knowledge_bases(created_at, id);
 
 COMMENT ON TABLE knowledge_bases IS '知识库表，存储知识库元信息';
 COMMENT ON COLUMN knowledge_bases.id IS '知识库ID，主键';
@@ -113,6 +116,7 @@ CREATE INDEX idx_documents_knowledge_base_id ON documents(knowledge_base_id);
 CREATE INDEX idx_documents_vector_id ON documents(vector_id);
 CREATE INDEX idx_documents_created_at ON documents(created_at DESC);
 CREATE INDEX idx_documents_title ON documents(title);
+CREATE INDEX ix_documents_knowledge_base_id_created_at ON documents(knowledge_base_id, created_at, id);
 
 COMMENT ON TABLE documents IS '文档表，存储知识库中的文档元信息';
 COMMENT ON COLUMN documents.id IS '文档ID，主键';
@@ -140,6 +144,8 @@ CREATE TABLE tasks (
 CREATE INDEX idx_tasks_status ON tasks(status);
 CREATE INDEX idx_tasks_created_at ON tasks(created_at DESC);
 CREATE INDEX idx_tasks_updated_at ON tasks(updated_at DESC);
+CREATE INDEX ix_tasks_created_at_id ON tasks(created_at, id);
+CREATE INDEX ix_tasks_status_created_at ON tasks(status, created_at, id);
 
 COMMENT ON TABLE tasks IS '任务表，存储AI任务规划信息';
 COMMENT ON COLUMN tasks.id IS '任务ID，主键';
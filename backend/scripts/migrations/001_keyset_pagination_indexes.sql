@@ -0,0 +1,40 @@
+-- ============================================
+-- 迁移 001：键集（游标）分页的复合索引
+-- ============================================
+-- 说明：列表接口按 (排序列, id) 倒序分页（WHERE (排序列, id) < (游标) ORDER BY 排序列 DESC, id DESC LIMIT n），
+--       以下复合索引让任意深度的页都只扫描 n 行；新库由 SQLAlchemy create_all 按 models.py 创建同名索引
+-- 用法：psql -U agentsys -d agentsys -f backend/scripts/migrations/001_keyset_pagination_indexes.sql
+-- 注意：CREATE INDEX CONCURRENTLY 不能在事务中执行，请勿使用 psql -1 / --single-transaction
+-- ============================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversations_updated_at_id
+    ON conversations (updated_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_conversation_id_created_at
+    ON messages (conversation_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_knowledge_bases_created_at_id
+    ON knowledge_bases (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_knowledge_base_id_created_at
+    ON documents (knowledge_base_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_created_at_id
+    ON tasks (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_status_created_at
+    ON tasks (status, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_role_presets_created_at_id
+    ON role_presets (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_role_presets_category_created_at
+    ON role_presets (category, created_at, id);
+
+-- 更新统计信息（近似总数 X-Total-Count-Approximate 读取 pg_class.reltuples）
+ANALYZE conversations;
+ANALYZE messages;
+ANALYZE knowledge_bases;
+ANALYZE documents;
+ANALYZE tasks;
+ANALYZE role_presets;
@@ -0,0 +1,32 @@
+-- ============================================
+-- 迁移 002：角色预设标签改为 JSONB + GIN 索引，标题三元组索引
+-- ============================================
+-- 说明：tags 原为 JSON 列，包含查询需要逐行解析且不能使用索引；改为 JSONB 后
+--       tags @> '["标签1","标签2"]' 使用 GIN（jsonb_path_ops）索引；
+--       标题模糊查询 title ILIKE '%关键词%' 使用 pg_trgm 三元组索引（关键词至少 3 个字符时生效）
+-- 用法：psql -U agentsys -d agentsys -f backend/scripts/migrations/002_role_preset_tags_jsonb.sql
+-- 注意：ALTER COLUMN TYPE 会重写 role_presets 表并在执行期间持有排他锁；
+--       CREATE INDEX CONCURRENTLY 不能在事务中执行，请勿使用 psql -1 / --single-transaction
+-- ============================================
+
+-- pg_trgm 在 PostgreSQL 13+ 中为可信扩展，数据库所有者即可创建
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. tags 列改为 JSONB（已是 JSONB 时跳过）
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'role_presets' AND column_name = 'tags') = 'json' THEN
+        ALTER TABLE role_presets ALTER COLUMN tags TYPE JSONB USING tags::jsonb;
+    END IF;
+END $$;
+
+-- 2. 标签包含查询的 GIN 索引（jsonb_path_ops 只支持 @>，体积更小、查询更快）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_role_presets_tags_gin
+    ON role_presets USING gin (tags jsonb_path_ops);
+
+-- 3. 标题模糊查询的三元组索引
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_role_presets_title_trgm
+    ON role_presets USING gin (title gin_trgm_ops);
+
+ANALYZE role_presets;
@@ -0,0 +1,25 @@
+"""LLM 准入控制 - 配置重新加载后更新限制"""
+from app.llm.admission import LLMAdmission, LLMLimits
+
+
+def _limits(max_concurrency: int, burst: int = 10) -> LLMLimits:
+    return LLMLimits(requests_per_second=1.0, burst=burst, max_concurrency=max_concurrency, max_queue_wait=10.0)
+
+
+def test_limits_reloaded_when_config_version_changes():
+    admission = LLMAdmission()
+    current = {"limits": _limits(2), "loads": 0}
+
+    def load():
+        current["loads"] += 1
+        return current["limits"]
+
+    limiter = admission.get("openai", "gpt", load, version=1)
+    assert admission.get("openai", "gpt", load, version=1) is limiter
+    assert current["loads"] == 1
+
+    current["limits"] = _limits(5, burst=2)
+    assert admission.get("openai", "gpt", load, version=2) is limiter
+    assert current["loads"] == 2
+    assert limiter.limits.max_concurrency == 5
+    assert limiter._tokens <= 2
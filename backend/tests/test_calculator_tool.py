@@ -0,0 +1,74 @@
+"""计算器工具的规模限制（防止短表达式占满 CPU 或内存）"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.tools import calculator_tool
+from app.services.tools.calculator_tool import (
+    MAX_ARRAY_SIZE,
+    MAX_ELEMENTWISE_SIZE,
+    MAX_FACTORIAL,
+    MAX_INT_BITS,
+    CalculatorError,
+    calculate,
+    evaluate,
+)
+
+# 广播后为 1000 × 1000 = 1e6 个元素
+_ROW = "[range(1000)]"
+_COLUMN = "[" + ", ".join(["[1]"] * 1000) + "]"
+
+
+def _assert_rejected_quickly(expression: str):
+    start = time.perf_counter()
+    with pytest.raises(CalculatorError):
+        evaluate(expression)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_basic_expressions():
+    assert calculate("2 + 3 * 4") == "计算结果: 14"
+    assert calculate("sum(range(1, 101))") == "计算结果: 5050"
+    assert calculate("sqrt([1, 4, 9])") == "计算结果: [1, 2, 3]"
+
+
+def test_elementwise_broadcast_is_capped_before_evaluation():
+    # 每个元素一次 Python 调用：超过 MAX_ELEMENTWISE_SIZE 时不开始计算
+    _assert_rejected_quickly(f"factorial(range({MAX_ELEMENTWISE_SIZE + 1}) * 0 + 1000)")
+    _assert_rejected_quickly(f"atan2({_ROW}, {_COLUMN})")
+    _assert_rejected_quickly(f"hypot({_ROW}, {_COLUMN})")
+    _assert_rejected_quickly(f"gcd({_ROW}, {_COLUMN})")
+    assert evaluate(f"hypot(range({MAX_ELEMENTWISE_SIZE}), 0)").size == MAX_ELEMENTWISE_SIZE
+
+
+def test_factorial_result_fits_int_limit():
+    assert evaluate(f"factorial({MAX_FACTORIAL})").bit_length() <= MAX_INT_BITS
+    _assert_rejected_quickly(f"factorial({MAX_FACTORIAL + 1})")
+
+
+def test_binary_operator_broadcast_is_capped():
+    _assert_rejected_quickly(f"{_ROW} * {_COLUMN}")
+    _assert_rejected_quickly(f"{_ROW} ** {_COLUMN}")
+    _assert_rejected_quickly(f"log({_ROW}, {_COLUMN})")
+
+
+def test_nested_list_size_is_capped():
+    items = ", ".join(["range(1000)"] * (MAX_ARRAY_SIZE // 1000 + 1))
+    _assert_rejected_quickly(f"[{items}]")
+
+
+def test_range_size_is_capped():
+    _assert_rejected_quickly(f"range({MAX_ARRAY_SIZE + 1})")
+    assert evaluate(f"range({MAX_ARRAY_SIZE})").size == MAX_ARRAY_SIZE
+
+
+def test_array_result_size_is_checked(monkeypatch):
+    monkeypatch.setattr(calculator_tool, "MAX_ARRAY_SIZE", 10)
+    with pytest.raises(CalculatorError):
+        evaluate("sqrt([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11])")
+
+
+def test_tool_coroutine_runs_in_process_pool():
+    tool = calculator_tool.create_calculator_tool()
+    assert asyncio.run(tool.coroutine("sum(range(1, 101))")) == "计算结果: 5050"
@@ -0,0 +1,151 @@
+"""流式事件日志：文本事件合并后仍能按 Last-Event-ID 精确续传"""
+import asyncio
+
+from app.services.streaming.event_log import EventLogStore, TurnEventLog
+
+
+def _log(max_events: int = 20, max_text_chars: int = 1024) -> TurnEventLog:
+    return TurnEventLog("test", max_events, grace_period=30.0, max_text_chars=max_text_chars)
+
+
+def _text(items):
+    return "".join(event.get("content", "") for _, event in items)
+
+
+def test_long_answer_fits_in_log_and_replays_from_start():
+    log = _log(max_events=20)
+    log.append({"type": "stream_id", "stream_id": "test"})
+    for i in range(10000):
+        log.append({"type": "content", "content": "字"})
+    log.append({"type": "done"})
+
+    items = log.events_after(0)
+    assert items[0][1]["type"] == "stream_id"
+    assert _text(items) == "字" * 10000
+    assert items[-1] == (10002, {"type": "done"})
+
+
+def test_resume_inside_text_run_skips_received_tokens():
+    log = _log()
+    for i in range(1, 11):
+        log.append({"type": "content", "content": str(i % 10)})
+    log.append({"type": "tool", "tool": "calculator"})
+    log.append({"type": "content", "content": "x"})
+
+    items = log.events_after(4)
+    assert items[0] == (10, {"type": "content", "content": "567890"})
+    assert items[1][0] == 11
+    assert items[2] == (12, {"type": "content", "content": "x"})
+
+    raw = log.events_after(8, coalesce=False)
+    assert [seq for seq, _ in raw] == [9, 10, 11, 12]
+
+
+def test_text_run_is_split_at_max_chars():
+    log = _log(max_text_chars=4)
+    for _ in range(10):
+        log.append({"type": "thinking", "content": "ab"})
+    assert [len(event["content"]) for _, event in log.events_after(0)] == [4, 4, 4, 4, 4]
+
+
+def test_live_subscriber_receives_every_token_once():
+    async def run():
+        log = _log()
+        received = []
+
+        async def consume():
+            async for _, event in log.subscribe():
+                received.append(event.get("content", ""))
+
+        task = asyncio.create_task(consume())
+        for i in range(50):
+            log.append({"type": "content", "content": str(i % 10)})
+            if i % 7 == 0:
+                await asyncio.sleep(0)
+        log.finish()
+        await task
+        return "".join(received)
+
+    assert asyncio.run(run()) == "".join(str(i % 10) for i in range(50))
+
+
+class _RecordingRedis:
+    """记录镜像写入的最小 Redis 客户端（只实现镜像用到的命令）"""
+
+    def __init__(self):
+        self.lists = {}
+        self.keys = set()
+        self.rpush_calls = 0
+
+    def pipeline(self):
+        client = self
+        commands = []
+
+        class Pipeline:
+            def rpush(self, key, *values):
+                commands.append(lambda: client._rpush(key, values))
+                return self
+
+            def expire(self, key, ttl):
+                return self
+
+            async def execute(self):
+                for command in commands:
+                    command()
+
+        return Pipeline()
+
+    def _rpush(self, key, values):
+        self.rpush_calls += 1
+        self.lists.setdefault(key, []).extend(values)
+        self.keys.add(key)
+
+    async def set(self, key, value, ex=None):
+        self.keys.add(key)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.keys.discard(key)
+
+
+def _mirror(log: TurnEventLog, produce):
+    async def run():
+        store = EventLogStore()
+        client = _RecordingRedis()
+        store._redis = lambda: client
+        mirror = asyncio.create_task(store._mirror_to_redis(log))
+        await produce()
+        log.finish()
+        await mirror
+        return client
+
+    return asyncio.run(run())
+
+
+def test_redis_mirror_writes_backlog_in_one_push():
+    log = _log()
+
+    async def produce():
+        for i in range(100):
+            log.append({"type": "content", "content": str(i % 10)})
+            if i % 25 == 24:
+                await asyncio.sleep(0)
+
+    client = _mirror(log, produce)
+    key = "chat:stream:test"
+    assert len(client.lists[key]) == 100
+    assert client.rpush_calls <= 4
+    assert key + ":done" in client.keys
+
+
+def test_redis_mirror_dropped_on_gap_without_done_marker():
+    log = _log(max_events=3)
+
+    async def produce():
+        for i in range(10):
+            log.append({"type": "tool", "tool": str(i)})
+
+    client = _mirror(log, produce)
+    assert "chat:stream:test" not in client.keys
+    assert "chat:stream:test:done" not in client.keys
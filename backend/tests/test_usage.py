@@ -0,0 +1,41 @@
+"""LLM 用量统计 - 两种用量格式（usage_metadata 与 token_usage）的解析"""
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation, LLMResult
+from app.llm.usage import prompt_usage
+
+
+def test_usage_metadata():
+    message = AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": 120,
+            "output_tokens": 5,
+            "total_tokens": 125,
+            "input_token_details": {"cache_read": 96},
+        },
+    )
+    usage = prompt_usage(LLMResult(generations=[[ChatGeneration(message=message)]]))
+    assert (usage.prompt_tokens, usage.cached_tokens) == (120, 96)
+
+
+def test_token_usage_in_generation_info():
+    generation = Generation(
+        text="ok",
+        generation_info={"token_usage": {"prompt_tokens": 80, "prompt_tokens_details": {"cached_tokens": 64}}},
+    )
+    usage = prompt_usage(LLMResult(generations=[[generation]]))
+    assert (usage.prompt_tokens, usage.cached_tokens) == (80, 64)
+
+
+def test_token_usage_in_llm_output():
+    result = LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="ok"))]],
+        llm_output={"token_usage": {"input_tokens": 50, "cached_tokens": 10}},
+    )
+    usage = prompt_usage(result)
+    assert (usage.prompt_tokens, usage.cached_tokens) == (50, 10)
+
+
+def test_no_usage():
+    result = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="ok"))]])
+    assert prompt_usage(result) is None
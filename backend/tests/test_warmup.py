@@ -0,0 +1,52 @@
+"""启动预热 - 必需阶段失败后的重试与就绪状态"""
+import asyncio
+from app.core.config import settings
+from app.services import warmup
+
+
+def _reset(monkeypatch):
+    monkeypatch.setattr(warmup, "warmup_state", warmup.WarmupState())
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", False)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_MAX_INTERVAL", 0.02)
+
+
+def test_required_stage_retried_until_ready(monkeypatch):
+    _reset(monkeypatch)
+    calls = []
+    seen_failed = []
+
+    def create_tables():
+        calls.append(1)
+        seen_failed.append(warmup.warmup_state.failed)
+        if len(calls) < 3:
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(warmup, "_create_tables", create_tables)
+    asyncio.run(warmup.run_warmup())
+
+    state = warmup.warmup_state
+    assert len(calls) == 3
+    assert seen_failed == [False, True, True]
+    assert state.ready and not state.failed
+    assert state.stages["database_tables"]["status"] == "ok"
+    assert state.stages["database_tables"]["attempts"] == 3
+
+
+def test_timed_out_stage_is_retried(monkeypatch):
+    _reset(monkeypatch)
+    monkeypatch.setattr(settings, "WARMUP_TIMEOUT", 0.05)
+    calls = []
+
+    async def slow_then_fast():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+
+    async def run():
+        await warmup._run_required_stage("checkpointer", slow_then_fast)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert warmup.warmup_state.stages["checkpointer"]["status"] == "ok"
+    assert warmup.warmup_state.failed